@@ -0,0 +1,87 @@
+"""
+긴 시계열을 그리기 전에 점 개수를 줄이는 min-max 데시메이션.
+
+구간(bucket)마다 최솟값과 최댓값 두 점만 남기므로, 수백만 샘플을 몇 천 개로 줄여도
+피크(중력파 chirp 등)는 그대로 보입니다. 원본 데이터는 분석용으로 그대로 두고,
+화면에 그릴 때만 사용합니다.
+"""
+import numpy as np
+
+
+def target_points(figsize_inches, dpi=100):
+    """그림 폭(px)에 맞는 출력 점 개수. 픽셀 하나당 최소/최대 두 점이면 충분합니다."""
+    return int(figsize_inches[0] * dpi) * 2
+
+
+def minmax_decimate(x, y, n_out):
+    """
+    (x, y)를 최대 `n_out`개 점으로 줄입니다.
+    각 구간의 최솟값/최댓값 위치를 원래 순서대로 남기며, 전부 NumPy 벡터 연산입니다.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(y)
+    n_buckets = max(n_out // 2, 1)
+    if n <= n_out or n_buckets < 2:
+        return x, y
+
+    size = n // n_buckets
+    body = y[:size * n_buckets].reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    idx_min = body.argmin(axis=1) + offsets
+    idx_max = body.argmax(axis=1) + offsets
+    idx = np.sort(np.concatenate([idx_min, idx_max]))
+
+    # 나누어 떨어지지 않고 남는 끝부분 샘플도 버리지 않도록 따로 처리합니다.
+    tail = size * n_buckets
+    if tail < n:
+        rest = y[tail:]
+        idx = np.concatenate([idx, np.sort([tail + rest.argmin(), tail + rest.argmax()])])
+    return x[idx], y[idx]
+
+
+if __name__ == "__main__":
+    # 길이별 렌더링 시간과 메모리 비교 (16384 Hz 합성 chirp 신호)
+    import io
+    import time
+    import tracemalloc
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    rate = 16384
+    figsize = (10, 4)
+
+    def synthetic_strain(duration):
+        t = np.arange(int(duration * rate)) / rate
+        rng = np.random.default_rng(0)
+        y = rng.normal(0, 1e-21, len(t))
+        # 끝부분 0.2초 동안 주파수가 올라가는 chirp를 넣습니다.
+        tc = duration - 0.5
+        window = (t > tc - 0.2) & (t < tc)
+        tau = tc - t[window]
+        y[window] += 5e-21 * np.sin(2 * np.pi * (30 + 200 * (1 - tau / 0.2)) * t[window])
+        return t, y
+
+    def render(x, y):
+        fig, ax = plt.subplots(figsize=figsize)
+        ax.plot(x, y, color="teal", linewidth=0.5)
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png")
+        plt.close(fig)
+        return buf.getbuffer().nbytes
+
+    for duration in (32, 128, 600):
+        t, y = synthetic_strain(duration)
+        for label, decimated in (("full", False), ("minmax", True)):
+            if not decimated and duration > 128:
+                continue
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            xs, ys = minmax_decimate(t, y, target_points(figsize)) if decimated else (t, y)
+            render(xs, ys)
+            elapsed = time.perf_counter() - t0
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{duration:4d}s {label:>6}: {len(xs):9,d} points, {elapsed * 1000:8.1f} ms, peak {peak / 2**20:7.1f} MiB")
@@ -0,0 +1,194 @@
+"""
+렌더링된 그림을 바이트로 저장해 두는 캐시.
+
+- matplotlib 그림은 PNG/SVG 바이트로, Plotly 그림은 JSON 문자열로 저장합니다.
+- 같은 키(데이터와 그림 설정)로 다시 요청하면 matplotlib/Plotly를 전혀 거치지 않고 저장된 결과를 돌려줍니다.
+  Plotly 그림은 `st.plotly_chart`가 dict를 받으면 `go.Figure(**spec)`로 전부 다시 검증하므로,
+  검증이 끝난 Figure로 취급되는 `CachedFigure`로 감싸서 돌려줍니다.
+- 전체 크기가 `max_bytes`를 넘으면 가장 오래 사용하지 않은 항목부터 버립니다 (LRU).
+- 새로 그린 matplotlib 그림은 바이트로 저장한 직후 `plt.close`로 닫아서 세션이 늘어나도 메모리가 쌓이지 않습니다.
+"""
+import io
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from lazy_imports import lazy_import
+from metrics import span
+
+plt = lazy_import("matplotlib.pyplot")
+go = lazy_import("plotly.graph_objects")
+
+
+class FigureCache:
+    def __init__(self, max_bytes=128 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size_bytes(self):
+        return self._size
+
+    def get(self, key):
+        with self._lock:
+            payload = self._items.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, key, payload):
+        size = len(payload)
+        if size > self.max_bytes:
+            return payload
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = payload
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+        return payload
+
+    def matplotlib(self, key, build, fmt="png", dpi=150):
+        """
+        `build()`가 돌려주는 matplotlib Figure를 `fmt` 바이트로 렌더링해 캐시합니다.
+        캐시에 있으면 `build`를 호출하지 않습니다.
+        """
+        key = ("matplotlib", fmt, dpi, key)
+        with span("figure.matplotlib") as s:
+            payload = self.get(key)
+            s.cache(hit=payload is not None)
+            if payload is None:
+                fig = build()
+                try:
+                    buf = io.BytesIO()
+                    fig.savefig(buf, format=fmt, dpi=dpi, bbox_inches="tight")
+                finally:
+                    plt.close(fig)
+                payload = self.put(key, buf.getvalue())
+            s.add(bytes=len(payload))
+        return payload
+
+    def plotly(self, key, build):
+        """
+        `build()`가 돌려주는 Plotly Figure를 JSON 문자열로 캐시하고, `st.plotly_chart`에 바로 넘길 수 있는
+        `CachedFigure`를 돌려줍니다.
+        """
+        key = ("plotly", key)
+        with span("figure.plotly") as s:
+            payload = self.get(key)
+            s.cache(hit=payload is not None)
+            if payload is None:
+                payload = self.put(key, build().to_json().encode())
+            s.add(bytes=len(payload))
+            return _cached_figure_class()(json.loads(payload))
+
+
+@lru_cache(maxsize=None)
+def _cached_figure_class():
+    # 클래스를 정의하려면 plotly를 불러와야 하므로 Plotly 그림을 처음 돌려줄 때 만듭니다.
+    class CachedFigure(go.Figure):
+        """
+        이미 검증된 그림 스펙(dict)을 감싼 Figure. `st.plotly_chart`는 Figure 인스턴스면 `to_dict()`만 부르고
+        검증을 건너뛰므로, 트레이스 객체를 다시 만들지 않습니다. 스펙은 `to_dict()`로만 읽습니다.
+        """
+
+        def __init__(self, spec):
+            # Figure.__init__은 모든 트레이스를 다시 만들고 검증하므로 부르지 않습니다.
+            self._spec = spec
+
+        def to_dict(self):
+            return self._spec
+
+        def to_plotly_json(self):
+            return self._spec
+
+    return CachedFigure
+
+
+@lru_cache(maxsize=None)
+def get_shared_cache():
+    """프로세스 전체(모든 페이지, 모든 세션)가 함께 쓰는 그림 캐시."""
+    return FigureCache()
+
+
+if __name__ == "__main__":
+    # 1,000번의 rerun을 흉내 내서 캐시 사용/미사용 시 지연 시간과 메모리를 비교합니다.
+    import time
+    import tracemalloc
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    # 캐시를 쓰지 않는 경우 일부러 그림을 닫지 않으므로 경고를 끕니다.
+    plt.rcParams["figure.max_open_warning"] = 0
+
+    rng = np.random.default_rng(0)
+    datasets = [rng.normal(size=2000) for _ in range(5)]
+
+    def build(i):
+        fig, ax = plt.subplots(figsize=(10, 4))
+        ax.plot(datasets[i], linewidth=0.5)
+        return fig
+
+    def rerun_uncached(i):
+        # 예전 페이지처럼 매번 그리고, 그림을 닫지 않습니다.
+        fig = build(i)
+        fig.savefig(io.BytesIO(), format="png", dpi=150, bbox_inches="tight")
+
+    cache = FigureCache()
+    for label, n, fn in (("uncached", 100, rerun_uncached),
+                         ("cached", 1000, lambda i: cache.matplotlib(("bench", i), lambda: build(i)))):
+        tracemalloc.start()
+        latencies = []
+        for r in range(n):
+            t0 = time.perf_counter()
+            fn(r % len(datasets))
+            latencies.append(time.perf_counter() - t0)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        latencies = np.array(latencies) * 1000
+        print(f"{label:>8} x{n}: p50 {np.percentile(latencies, 50):7.2f} ms, p99 {np.percentile(latencies, 99):7.2f} ms, "
+              f"retained {current / 2**20:6.1f} MiB, open figures {len(plt.get_fignums())}")
+        plt.close("all")
+    print(f"cache: {cache.hits} hits, {cache.misses} misses, {cache.size_bytes / 1024:.0f} KiB")
+
+    # Plotly: 실제 `st.plotly_chart` 경로(검증 + JSON 직렬화)까지 포함해 잽니다 (스크립트 실행 밖이라 화면에는 그리지 않음).
+    import logging
+
+    import plotly.graph_objects as go
+    import streamlit as st
+
+    logging.disable(logging.WARNING)   # bare mode 경고(ScriptRunContext 없음)를 숨깁니다
+    for n_traces in (10, 100, 500):
+        walks = rng.normal(size=(780, n_traces)).cumsum(axis=0)
+
+        def build_plotly():
+            fig = go.Figure()
+            for i in range(n_traces):
+                fig.add_trace(go.Scatter(y=walks[:, i], mode="lines", name=f"T{i:03d}"))
+            return fig
+
+        cache.plotly(("bench", n_traces), build_plotly)
+        payload = cache.get(("plotly", ("bench", n_traces)))
+        for label, make in (("uncached", build_plotly),
+                            ("dict", lambda: json.loads(payload)),   # 이전 방식: st.plotly_chart가 dict를 다시 검증
+                            ("cached", lambda: cache.plotly(("bench", n_traces), build_plotly))):
+            latencies = []
+            for _ in range(5):
+                t0 = time.perf_counter()
+                st.plotly_chart(make(), width="stretch")
+                latencies.append(time.perf_counter() - t0)
+            print(f"plotly {n_traces:3d} traces {label:>8}: st.plotly_chart p50 {np.median(latencies) * 1000:7.1f} ms")
@@ -0,0 +1,473 @@
+"""
+날짜 x 티커 가격 행렬에 대한 기술적 지표 엔진.
+
+- 이동평균(SMA), 볼린저 밴드, RSI(Wilder), 최고점 대비 낙폭(drawdown), 종목 간 이동 상관계수 행렬을
+  `fit()` 한 번에 모든 종목에 대해 벡터화 연산으로 계산합니다.
+- 계산하면서 지표마다 이동 구간 상태(최근 구간의 링 버퍼와 합, RSI 평균 상승/하락폭, 최고가,
+  상관계수용 종목 쌍별 합)를 남겨 두므로, 새 봉 하나는 `update()`가 이 상태만 고쳐서 이어 붙입니다.
+  비용은 전체 이력 길이와 무관합니다 (종목당 O(1), 상관계수 행렬은 종목 쌍당 O(1)).
+- `sync(wide)`는 새 가격 행렬이 지금까지 본 이력 뒤에 봉 몇 개만 덧붙인 것이면 `update()`로, 아니면 `fit()`으로
+  맞춘 뒤 그 시점의 결과(`Indicators`)를 돌려줍니다. 페이지는 엔진 하나를 `st.cache_resource`로 공유합니다.
+  - 페이지의 조회 구간은 날마다 앞으로 움직이므로, 시작일이 뒤로 옮겨지면 엔진의 이력을 그 날짜부터로 줄이고
+    시작일에 따라 달라지는 값(이동평균의 앞부분, RSI, 최고점 대비 낙폭)만 그 구간으로 다시 계산합니다(`_trim()`).
+    그래서 결과는 언제나 `wide`를 처음부터 fit()한 것과 같고, 프로세스가 얼마나 오래 돌았는지와 무관합니다.
+  - 장중에 받은 일부 봉이 마감 뒤 바뀌어 들어오면, 마지막 봉 하나는 되돌린(`_pop()`) 뒤 다시 반영합니다.
+"""
+import threading
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from lazy_imports import lazy_import
+from metrics import span
+from price_matrix import log_returns, rolling_stats
+
+pd = lazy_import("pandas")
+
+# sync()에서 덧붙은 봉이 이보다 많으면 봉마다 update()하는 대신 한 번에 다시 계산합니다.
+MAX_INCREMENTAL_ROWS = 64
+
+
+@dataclass(frozen=True)
+class Indicators:
+    frames: dict = field(default_factory=dict)   # 지표 이름 -> 날짜 x 티커 DataFrame
+    correlation: object = None                   # 티커 x 티커 DataFrame (마지막 봉 기준 이동 상관계수)
+
+    def latest(self):
+        """티커 x 지표 이름 형태의 마지막 봉 값."""
+        return pd.DataFrame({name: frame.iloc[-1] for name, frame in self.frames.items() if len(frame)})
+
+
+class _RollingWindow:
+    """종목별 최근 `window`개 값의 링 버퍼와 합/제곱합/유효 개수. 값 하나를 넣고 빼는 비용은 O(1)입니다."""
+
+    def __init__(self, window, tail):
+        self.window = window
+        self.buf = np.zeros((window, tail.shape[1]))
+        self.valid = np.zeros((window, tail.shape[1]), dtype=bool)
+        k = min(window, len(tail))
+        if k:
+            # 가장 오래된 값이 다음에 덮어쓸 자리(pos=0)에 오도록 뒤쪽부터 채웁니다.
+            self.valid[window - k:] = ~np.isnan(tail[-k:])
+            self.buf[window - k:] = np.where(self.valid[window - k:], tail[-k:], 0.0)
+        self.pos = 0
+        self._undo = None
+        self._resum()
+
+    def _resum(self):
+        self.s1 = self.buf.sum(axis=0)
+        self.s2 = (self.buf ** 2).sum(axis=0)
+        self.cnt = self.valid.sum(axis=0)
+
+    def push(self, x):
+        valid = ~np.isnan(x)
+        filled = np.where(valid, x, 0.0)
+        old = self.buf[self.pos].copy()
+        self._undo = (self.pos, old, self.valid[self.pos].copy())
+        self.s1 += filled - old
+        self.s2 += filled ** 2 - old ** 2
+        self.cnt += valid.astype(np.int64) - self.valid[self.pos]
+        self.buf[self.pos] = filled
+        self.valid[self.pos] = valid
+        self.pos = (self.pos + 1) % self.window
+        if self.pos == 0:
+            # 더하고 빼는 오차가 쌓이지 않도록 한 바퀴 돌 때마다 버퍼에서 다시 합합니다 (봉당 분할 상환 O(1)).
+            self._resum()
+        return self.stats()
+
+    def pop(self):
+        """마지막 push()를 되돌립니다 (한 번만)."""
+        pos, old, old_valid = self._undo
+        self._undo = None
+        self.s1 += old - self.buf[pos]
+        self.s2 += old ** 2 - self.buf[pos] ** 2
+        self.cnt += old_valid.astype(np.int64) - self.valid[pos]
+        self.buf[pos] = old
+        self.valid[pos] = old_valid
+        self.pos = pos
+
+    def stats(self):
+        """(이동평균, 이동표준편차). `price_matrix.rolling_stats`와 같게 구간이 꽉 찬 종목만 값이 있습니다."""
+        w = self.window
+        full = self.cnt == w
+        mean = self.s1 / w
+        var = np.maximum(self.s2 / w - mean ** 2, 0.0) * w / max(w - 1, 1)
+        return np.where(full, mean, np.nan), np.where(full, np.sqrt(var), np.nan)
+
+
+class _RollingCorrelation:
+    """
+    최근 `window`개 수익률의 종목 쌍별 합(둘 다 값이 있는 행만)을 유지합니다.
+    새 행 하나는 외적(outer product) 몇 번으로 반영하므로 구간 길이와 무관하게 O(종목 수²)입니다.
+    """
+
+    def __init__(self, window, tail, min_periods):
+        self.window = window
+        self.min_periods = min_periods
+        self.buf = np.zeros((window, tail.shape[1]))
+        self.valid = np.zeros((window, tail.shape[1]), dtype=bool)
+        k = min(window, len(tail))
+        if k:
+            self.valid[window - k:] = ~np.isnan(tail[-k:])
+            self.buf[window - k:] = np.where(self.valid[window - k:], tail[-k:], 0.0)
+        self.pos = 0
+        self._undo = None
+        self._resum()
+
+    def _resum(self):
+        x, v = self.buf, self.valid.astype(float)
+        self.n = v.T @ v             # n[i, j]: i, j 모두 값이 있는 행 수
+        self.sx = x.T @ v            # sx[i, j]: 그 행들에서 i의 합
+        self.sxx = (x * x).T @ v     # sxx[i, j]: 그 행들에서 i의 제곱합
+        self.sxy = x.T @ x           # sxy[i, j]: 그 행들에서 i * j의 합
+
+    def push(self, r):
+        valid = ~np.isnan(r)
+        x, v = np.where(valid, r, 0.0), valid.astype(float)
+        ox, ov = self.buf[self.pos].copy(), self.valid[self.pos].copy()
+        self._undo = (self.pos, ox, ov)
+        self._add(x, valid.astype(float), ox, ov.astype(float))
+        self.buf[self.pos] = x
+        self.valid[self.pos] = valid
+        self.pos = (self.pos + 1) % self.window
+        if self.pos == 0:
+            self._resum()
+
+    def pop(self):
+        """마지막 push()를 되돌립니다 (한 번만)."""
+        pos, ox, ov = self._undo
+        self._undo = None
+        self._add(ox, ov.astype(float), self.buf[pos], self.valid[pos].astype(float))
+        self.buf[pos] = ox
+        self.valid[pos] = ov
+        self.pos = pos
+
+    def _add(self, x, v, ox, ov):
+        """행 (ox, ov)를 빼고 (x, v)를 더합니다."""
+        self.n += np.outer(v, v) - np.outer(ov, ov)
+        self.sx += np.outer(x, v) - np.outer(ox, ov)
+        self.sxx += np.outer(x * x, v) - np.outer(ox * ox, ov)
+        self.sxy += np.outer(x, x) - np.outer(ox, ox)
+
+    def matrix(self):
+        """쌍별(pairwise-complete) 피어슨 상관계수 행렬. 겹치는 행이 `min_periods`보다 적으면 NaN."""
+        n = self.n
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cov = self.sxy - self.sx * self.sx.T / n
+            var = self.sxx - self.sx ** 2 / n
+            corr = cov / np.sqrt(var * var.T)
+        corr[(n < self.min_periods) | ~np.isfinite(corr)] = np.nan
+        return np.clip(corr, -1.0, 1.0)
+
+
+def _rsi(avg_gain, avg_loss):
+    total = avg_gain + avg_loss
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(total > 0, 100.0 * avg_gain / total, 50.0)
+
+
+class IndicatorEngine:
+    def __init__(self, sma_windows=(20, 50, 200), bollinger_window=20, bollinger_k=2.0, rsi_period=14,
+                 corr_window=60, corr_min_periods=None):
+        self.sma_windows = tuple(sorted(set(sma_windows) | {bollinger_window}))
+        self.bollinger_window = bollinger_window
+        self.bollinger_k = bollinger_k
+        self.rsi_period = rsi_period
+        self.corr_window = corr_window
+        self.corr_min_periods = corr_min_periods or max(2, corr_window // 2)
+        self.columns = None
+        self._len = 0
+        self._undo = None
+        self._lock = threading.Lock()
+
+    @property
+    def names(self):
+        return [f"sma_{w}" for w in self.sma_windows] + ["bb_upper", "bb_lower", "rsi", "drawdown"]
+
+    def __len__(self):
+        return self._len
+
+    def fit(self, wide):
+        """가격 행렬 전체로 모든 지표를 한 번에 계산하고, 이후 update()에 쓸 상태를 만듭니다."""
+        with self._lock:
+            self._fit(wide)
+        return self
+
+    def _fit(self, wide):
+        with span("indicators.fit") as s:
+            values = wide.to_numpy(dtype=float)
+            if values.ndim != 2:
+                values = values.reshape(len(values), -1)
+            out = {}
+            for w in self.sma_windows:
+                mean, std = rolling_stats(wide, w)
+                out[f"sma_{w}"] = mean.to_numpy()
+                if w == self.bollinger_window:
+                    band = self.bollinger_k * std.to_numpy()
+                    out["bb_upper"] = out[f"sma_{w}"] + band
+                    out["bb_lower"] = out[f"sma_{w}"] - band
+
+            out["rsi"], out["drawdown"], state = self._from_start(values)
+
+            # 상태는 마지막 봉 직전까지로 만들고 마지막 봉은 _update()로 반영합니다.
+            # 그래야 장중의 일부 봉이 바뀌어 들어왔을 때 그 봉을 _pop()으로 되돌릴 수 있습니다.
+            n, n_cols = values.shape
+            self._windows = {w: _RollingWindow(w, values[:-1]) for w in self.sma_windows}
+            self._last = values[-2].copy() if n >= 2 else np.full(n_cols, np.nan)
+            self._set_state(state, n - 2)
+            returns = log_returns(wide).to_numpy()[:-1]
+            self._corr = _RollingCorrelation(self.corr_window, returns, self.corr_min_periods)
+            self._undo = None
+
+            self.columns = wide.columns
+            capacity = n + 256
+            self._dates = np.empty(capacity, dtype="datetime64[ns]")
+            self._dates[:n] = wide.index.to_numpy(dtype="datetime64[ns]")
+            self._prices = np.empty((capacity, n_cols))
+            self._prices[:n] = values
+            self._data = {}
+            for name in self.names:
+                self._data[name] = np.empty((capacity, n_cols))
+                self._data[name][:n] = out[name]
+            self._len = max(n - 1, 0)
+            if n:
+                self._update(wide.index[-1], values[-1])
+            s.add(rows=values.size)
+
+    def _from_start(self, values):
+        """
+        구간의 시작부터 누적되는 지표. 반환값: (RSI, 최고점 대비 낙폭, 행마다의 RSI/최고가 상태)
+        """
+        # RSI: 평균 상승/하락폭을 Wilder 방식(alpha=1/period 지수 평균)으로 구합니다.
+        # ignore_na=True이므로 값이 없는 날(상장 전, 휴장)은 건너뛰고 이어서 평균합니다.
+        diff = np.full_like(values, np.nan)
+        diff[1:] = values[1:] - values[:-1]
+        has_diff = ~np.isnan(diff)
+        gain = np.where(has_diff, np.maximum(diff, 0.0), np.nan)
+        loss = np.where(has_diff, np.maximum(-diff, 0.0), np.nan)
+        ewm = dict(alpha=1 / self.rsi_period, adjust=False, ignore_na=True)
+        avg_gain = pd.DataFrame(gain).ewm(**ewm).mean().to_numpy()
+        avg_loss = pd.DataFrame(loss).ewm(**ewm).mean().to_numpy()
+        rsi_count = np.cumsum(has_diff, axis=0)
+        rsi = _rsi(np.nan_to_num(avg_gain), np.nan_to_num(avg_loss))
+        rsi[(rsi_count < self.rsi_period) | np.isnan(values)] = np.nan
+
+        # 최고점 대비 낙폭: 값이 없는 날을 건너뛰는 누적 최댓값(fmax) 기준
+        peak = np.fmax.accumulate(values, axis=0) if len(values) else values
+        with np.errstate(divide="ignore", invalid="ignore"):
+            drawdown = values / peak - 1.0
+        return rsi, drawdown, (avg_gain, avg_loss, rsi_count, peak)
+
+    def _set_state(self, state, row):
+        """`_from_start()` 상태의 `row`번째 행을 update()가 이어 쓸 상태로 삼습니다 (row < 0이면 빈 상태)."""
+        avg_gain, avg_loss, rsi_count, peak = state
+        n_cols = avg_gain.shape[1]
+        empty = np.full(n_cols, np.nan)
+        self._avg_gain = avg_gain[row].copy() if row >= 0 else empty.copy()
+        self._avg_loss = avg_loss[row].copy() if row >= 0 else empty.copy()
+        self._rsi_count = rsi_count[row].copy() if row >= 0 else np.zeros(n_cols, dtype=np.int64)
+        self._peak = peak[row].copy() if row >= 0 else empty.copy()
+
+    def _trim(self, offset):
+        """
+        이력을 `offset`번째 봉부터로 줄이고, 시작일에 따라 달라지는 값을 그 구간만으로 다시 계산합니다.
+        이동평균은 구간 앞쪽 `window - 1`개 봉만 비우면 되고, RSI와 낙폭은 구간 전체를 다시 누적합니다.
+        """
+        with span("indicators.trim") as s:
+            # 이전 결과는 배열을 잘라(view) 넘겼으므로 새 배열로 옮긴 뒤 고칩니다. 앞쪽 이력의 메모리도 놓아줍니다.
+            self._dates = self._dates[offset:].copy()
+            self._prices = self._prices[offset:].copy()
+            self._data = {name: data[offset:].copy() for name, data in self._data.items()}
+            self._len -= offset
+            n = self._len
+            for w in self.sma_windows:
+                self._data[f"sma_{w}"][:w - 1] = np.nan
+                if w == self.bollinger_window:
+                    self._data["bb_upper"][:w - 1] = np.nan
+                    self._data["bb_lower"][:w - 1] = np.nan
+            rsi, drawdown, state = self._from_start(self._prices[:n])
+            self._data["rsi"][:n] = rsi
+            self._data["drawdown"][:n] = drawdown
+            self._set_state(state, n - 1)
+            self._undo = None
+            s.add(rows=rsi.size)
+
+    def update(self, timestamp, prices):
+        """새 봉 하나(티커별 가격)를 반영합니다. 비용은 이력 길이와 무관합니다."""
+        with self._lock:
+            self._update(timestamp, prices)
+        return self
+
+    def _update(self, timestamp, prices):
+        if isinstance(prices, pd.Series):
+            prices = prices.reindex(self.columns)
+        x = np.asarray(prices, dtype=float).reshape(-1)
+        self._undo = (self._last, self._avg_gain, self._avg_loss, self._rsi_count, self._peak)
+        row = {}
+        for w, window in self._windows.items():
+            mean, std = window.push(x)
+            row[f"sma_{w}"] = mean
+            if w == self.bollinger_window:
+                row["bb_upper"] = mean + self.bollinger_k * std
+                row["bb_lower"] = mean - self.bollinger_k * std
+
+        diff = x - self._last
+        ok = ~np.isnan(diff)
+        gain, loss = np.maximum(diff, 0.0), np.maximum(-diff, 0.0)
+        alpha = 1 / self.rsi_period
+        first = ok & (self._rsi_count == 0)
+        avg_gain = np.where(first, gain, self._avg_gain + alpha * (gain - self._avg_gain))
+        avg_loss = np.where(first, loss, self._avg_loss + alpha * (loss - self._avg_loss))
+        self._avg_gain = np.where(ok, avg_gain, self._avg_gain)
+        self._avg_loss = np.where(ok, avg_loss, self._avg_loss)
+        self._rsi_count = self._rsi_count + ok
+        rsi = _rsi(np.nan_to_num(self._avg_gain), np.nan_to_num(self._avg_loss))
+        rsi[(self._rsi_count < self.rsi_period) | np.isnan(x)] = np.nan
+        row["rsi"] = rsi
+
+        self._peak = np.fmax(self._peak, x)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            row["drawdown"] = x / self._peak - 1.0
+            self._corr.push(np.log(x / self._last))
+        self._last = x
+
+        if self._len == len(self._dates):
+            # 배열 크기를 두 배씩 늘리므로 봉 하나를 붙이는 비용은 분할 상환 O(1)입니다.
+            capacity = 2 * len(self._dates)
+            self._dates = np.concatenate([self._dates, np.empty(capacity - len(self._dates), self._dates.dtype)])
+            self._prices = self._grow(self._prices, capacity)
+            self._data = {name: self._grow(data, capacity) for name, data in self._data.items()}
+        self._dates[self._len] = np.datetime64(pd.Timestamp(timestamp).to_datetime64(), "ns")
+        self._prices[self._len] = x
+        for name, values in row.items():
+            self._data[name][self._len] = values
+        self._len += 1
+
+    def _grow(self, data, capacity):
+        grown = np.empty((capacity, data.shape[1]))
+        grown[:self._len] = data[:self._len]
+        return grown
+
+    def _pop(self):
+        """마지막 봉을 되돌립니다 (한 번만). 장중에 받은 일부 봉이 마감 뒤 바뀌어 들어온 경우에 씁니다."""
+        for window in self._windows.values():
+            window.pop()
+        self._corr.pop()
+        self._last, self._avg_gain, self._avg_loss, self._rsi_count, self._peak = self._undo
+        self._undo = None
+        self._len -= 1
+        # 이전 결과는 배열을 잘라(view) 넘겼으므로, 그 마지막 행을 덮어쓰지 않도록 새 배열로 옮깁니다.
+        self._dates = self._dates.copy()
+        self._prices = self._prices.copy()
+        self._data = {name: data.copy() for name, data in self._data.items()}
+
+    def _align(self, wide):
+        """
+        `wide`가 지금까지 본 이력의 한 지점에서 시작해 이력의 마지막 봉까지 같은 날짜로 이어지고, 그 뒤에 봉만
+        덧붙은 것인지 봅니다. 반환값: (이력에서 `wide` 첫 봉의 위치, 이미 반영된 `wide`의 행 수, 마지막 봉이
+        바뀌었는지) 또는 증분으로 맞출 수 없으면 None.
+        """
+        n = self._len
+        if self.columns is None or n == 0 or len(wide) == 0 or not wide.columns.equals(self.columns):
+            return None
+        dates = self._dates[:n]
+        offset = int(np.searchsorted(dates, wide.index[:1].to_numpy(dtype="datetime64[ns]"))[0])
+        seen = n - offset
+        if offset == n or len(wide) < seen:
+            return None
+        if not np.array_equal(wide.index[:seen].to_numpy(dtype="datetime64[ns]"), dates[offset:]):
+            return None
+        revised = not np.array_equal(wide.iloc[seen - 1].to_numpy(dtype=float), self._last, equal_nan=True)
+        if revised and (self._undo is None or seen == 1):
+            return None
+        if len(wide) - seen + revised > MAX_INCREMENTAL_ROWS:
+            return None
+        if offset and seen - revised <= max(*self.sma_windows, self.corr_window):
+            # 남는 이력이 이동 구간보다 짧으면 링 버퍼에 새 시작일 앞의 값이 남으므로 다시 계산합니다.
+            return None
+        return offset, seen, revised
+
+    def sync(self, wide):
+        """
+        엔진을 `wide`에 맞추고 `wide` 구간의 결과를 돌려줍니다.
+        뒤에 덧붙은(또는 바뀐 마지막) 봉이 `MAX_INCREMENTAL_ROWS`개 이하면 봉마다 update()하고, 아니면 다시 fit()합니다.
+        """
+        with self._lock:
+            aligned = self._align(wide)
+            if aligned is None:
+                self._fit(wide)
+            else:
+                offset, seen, revised = aligned
+                if revised:
+                    self._pop()
+                    seen -= 1
+                if offset:
+                    self._trim(offset)
+                if len(wide) > seen:
+                    with span("indicators.update") as s:
+                        for timestamp, row in zip(wide.index[seen:], wide.iloc[seen:].to_numpy(dtype=float)):
+                            self._update(timestamp, row)
+                        s.add(rows=len(wide) - seen)
+            return self._result()
+
+    def result(self):
+        with self._lock:
+            return self._result()
+
+    def _result(self):
+        # 이미 채운 행은 다시 쓰지 않으므로 (_pop()과 _trim()은 새 배열로 옮긴 뒤 고칩니다) 복사하지 않고 잘라서(view) 넘깁니다.
+        index = pd.DatetimeIndex(self._dates[:self._len], name="Date")
+        frames = {name: pd.DataFrame(data[:self._len], index=index, columns=self.columns)
+                  for name, data in self._data.items()}
+        correlation = pd.DataFrame(self._corr.matrix(), index=self.columns, columns=self.columns)
+        return Indicators(frames, correlation)
+
+
+def compute_indicators(wide, **params):
+    """모든 지표를 한 번에 계산합니다 (상태를 남길 필요가 없을 때)."""
+    return IndicatorEngine(**params).fit(wide).result()
+
+
+if __name__ == "__main__":
+    # 새 봉 하나가 들어올 때 전체 재계산(fit)과 증분 갱신(update)의 비용 비교, 그리고 두 결과가 같은지 확인
+    import time
+
+    from stock_fetch import fake_ohlcv
+
+    def fake_wide(n_tickers, years):
+        end = pd.Timestamp("2025-01-01")
+        start = end - pd.Timedelta(days=years * 365)
+        wide = pd.concat({f"T{i:03d}": fake_ohlcv(f"T{i:03d}", start, end)["Adj Close"]
+                          for i in range(n_tickers)}, axis=1)
+        # 상장일이 다른 종목과 중간에 값이 빠진 날도 섞습니다.
+        values = wide.to_numpy()
+        for i in range(0, n_tickers, 5):
+            values[: (i * 37) % (len(values) // 2), i] = np.nan
+        values[len(values) // 3, 1::7] = np.nan
+        return pd.DataFrame(values, index=wide.index, columns=wide.columns)
+
+    new_bars = 250
+    for n_tickers, years in ((10, 5), (10, 20), (300, 5), (300, 20)):
+        wide = fake_wide(n_tickers, years)
+        history, tail = wide.iloc[:-new_bars], wide.iloc[-new_bars:]
+
+        repeats = 3
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            reference = compute_indicators(wide)
+        full = (time.perf_counter() - t0) / repeats
+
+        engine = IndicatorEngine().fit(history)
+        t0 = time.perf_counter()
+        for timestamp, row in zip(tail.index, tail.to_numpy()):
+            engine.update(timestamp, row)
+        incremental = (time.perf_counter() - t0) / new_bars
+        result = engine.result()
+
+        error = max(np.nanmax(np.abs(result.frames[name].to_numpy() - frame.to_numpy()) /
+                              np.maximum(np.abs(frame.to_numpy()), 1.0), initial=0.0)
+                    for name, frame in reference.frames.items())
+        corr_error = np.nanmax(np.abs(result.correlation.to_numpy() - reference.correlation.to_numpy()))
+        print(f"{n_tickers:3d} tickers x {len(wide):5d} bars: full recompute {full * 1000:8.2f} ms/bar, "
+              f"incremental {incremental * 1000:6.3f} ms/bar ({full / incremental:6.0f}x), "
+              f"max rel. diff {error:.1e}, corr diff {corr_error:.1e}")
@@ -0,0 +1,95 @@
+"""
+무거운 라이브러리(gwpy/astropy, matplotlib, scipy, pandas, yfinance, folium 등)를 필요할 때 불러오는 도구.
+
+- `lazy_import("matplotlib.pyplot")`는 모듈 대신 가벼운 대리 객체를 돌려주고,
+  속성에 처음 접근할 때(예: `plt.subplots`) 실제로 import합니다.
+  앱 모듈과 페이지는 무거운 라이브러리를 모두 이 방식으로 모듈 맨 위에서 미룹니다 (함수 안 import 대신).
+  하위 모듈은 따로 감쌉니다: `folium_plugins = lazy_import("folium.plugins")`.
+- `is_available("gwpy")`는 import하지 않고 설치 여부만 확인합니다.
+- `start_warm_up()`은 환경 변수 `WARM_UP_IMPORTS=1`일 때 서버가 뜬 뒤 백그라운드 스레드에서
+  `HEAVY_MODULES`를 미리 불러옵니다. 첫 페이지는 기다리지 않고, 나중에 여는 페이지는 이미 불러온 모듈을 씁니다.
+"""
+import importlib
+import importlib.util
+import os
+import threading
+import time
+
+# 페이지별로 미뤄서 불러오는 무거운 모듈 (워밍업 순서이기도 합니다)
+HEAVY_MODULES = {
+    "main.py": ["folium", "scipy.spatial", "PIL.Image"],
+    "pages/00_주식데이터시각화.py": ["pandas", "plotly.graph_objects", "yfinance", "pyarrow.parquet"],
+    "pages/00_ASML주가데이터시각화.py": ["pandas", "plotly.graph_objects", "yfinance", "pyarrow.parquet"],
+    "pages/00_LIGO data.py": ["matplotlib.pyplot", "scipy.signal", "scipy.fft", "h5py",
+                             "gwpy.timeseries", "gwpy.frequencyseries", "gwpy.spectrogram"],
+}
+
+_warm_up_thread = None
+_warm_up_guard = threading.Lock()
+warm_up_log = []
+
+
+class _LazyModule:
+    """처음 속성에 접근할 때 모듈을 import하는 대리 객체."""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self._name)
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name):
+    """모듈을 바로 import하지 않고, 처음 사용할 때 import하는 대리 객체를 돌려줍니다."""
+    return _LazyModule(name)
+
+
+def is_available(name):
+    """모듈을 import하지 않고 설치되어 있는지만 확인합니다."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def _warm_up(modules, delay):
+    if delay:
+        time.sleep(delay)
+    for name in modules:
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:  # 설치되지 않은 선택적 의존성은 건너뜁니다
+            warm_up_log.append((name, None, repr(e)))
+            continue
+        warm_up_log.append((name, time.perf_counter() - t0, None))
+
+
+def start_warm_up(modules=None, delay=1.0, force=False):
+    """
+    무거운 모듈을 백그라운드 스레드에서 미리 불러옵니다. 프로세스당 한 번만 실행됩니다.
+    `WARM_UP_IMPORTS=1`이 아니면(또는 force=False이면) 아무것도 하지 않습니다.
+    """
+    global _warm_up_thread
+    if not (force or os.environ.get("WARM_UP_IMPORTS") == "1"):
+        return None
+    with _warm_up_guard:
+        if _warm_up_thread is None:
+            if modules is None:
+                modules = list(dict.fromkeys(m for names in HEAVY_MODULES.values() for m in names))
+            _warm_up_thread = threading.Thread(
+                target=_warm_up, args=(modules, delay), name="import-warm-up", daemon=True)
+            _warm_up_thread.start()
+    return _warm_up_thread
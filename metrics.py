@@ -0,0 +1,341 @@
+"""
+단계별 성능 측정(span)과 내보내기.
+
+    with span("prices.download") as s:
+        frames = ...
+        s.add(rows=..., bytes=...)
+        s.cache(hit=False)
+
+    @timed("prices.to_wide")
+    def to_wide(...): ...
+
+- 단계(stage)마다 지연 시간 히스토그램, 처리한 행 수, 가져온 바이트 수, 캐시 적중/실패 횟수를 모읍니다.
+- `METRICS_ENABLED=1`일 때만 측정합니다. 꺼져 있으면 `span`은 아무 일도 하지 않는 공용 객체를,
+  `timed`는 원래 함수를 그대로 호출하므로 비용이 거의 없습니다.
+- `METRICS_PORT`를 주면 http://localhost:PORT/metrics 에서 Prometheus 텍스트 형식으로,
+  `METRICS_JSONL`을 주면 span마다 한 줄씩 JSON으로 내보냅니다 (둘 중 하나만 있어도 측정이 켜집니다).
+- `debug_panel()`을 페이지 끝에서 호출하면 사이드바에 현재 세션의 최근 span 목록을 보여줍니다.
+  세션별 기록은 최근에 기록한 `MAX_SESSIONS`개 세션만 남기므로, 세션이 계속 바뀌어도 메모리가 늘지 않습니다.
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import wraps
+
+# 지연 시간 히스토그램 구간 경계 (초)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 세션별 최근 span 기록을 남길 세션 수와 세션당 기록 수
+MAX_SESSIONS = 256
+SESSION_EVENTS = 200
+
+_enabled = False
+_lock = threading.Lock()
+_stages = {}
+_sessions = OrderedDict()   # 세션 ID -> 최근 span 기록 (마지막에 기록한 세션이 맨 뒤)
+_jsonl = None
+_server = None
+
+
+class _Stage:
+    __slots__ = ("buckets", "count", "total", "rows", "bytes", "hits", "misses")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+
+class Span:
+    __slots__ = ("name", "rows", "bytes", "hit", "start", "elapsed")
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.bytes = 0
+        self.hit = None
+
+    def add(self, rows=0, bytes=0):
+        self.rows += rows
+        self.bytes += bytes
+        return self
+
+    def cache(self, hit):
+        self.hit = bool(hit)
+        return self
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.start
+        _record(self, error=exc_type is not None)
+        return False
+
+
+class _NoopSpan:
+    """측정이 꺼져 있을 때 쓰는 공용 span. 아무것도 기록하지 않습니다."""
+
+    __slots__ = ()
+
+    def add(self, rows=0, bytes=0):
+        return self
+
+    def cache(self, hit):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def enabled():
+    return _enabled
+
+
+def span(name):
+    """단계 하나를 측정하는 context manager. 측정이 꺼져 있으면 아무 일도 하지 않습니다."""
+    if not _enabled:
+        return _NOOP
+    return Span(name)
+
+
+def timed(name=None):
+    """함수 호출 전체를 span으로 측정하는 데코레이터. 이름을 생략하면 `모듈.함수` 이름을 씁니다."""
+    def decorator(fn):
+        stage = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+_get_ctx = None
+
+
+def _session_id():
+    global _get_ctx
+    if _get_ctx is None:
+        try:
+            from streamlit.runtime.scriptrunner import get_script_run_ctx
+        except ImportError:
+            return None
+        _get_ctx = get_script_run_ctx
+    ctx = _get_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+
+def _record(s, error=False):
+    event = {"ts": time.time(), "stage": s.name, "seconds": s.elapsed, "rows": s.rows, "bytes": s.bytes,
+             "cache": None if s.hit is None else ("hit" if s.hit else "miss"), "error": error}
+    session = _session_id()
+    with _lock:
+        stage = _stages.get(s.name)
+        if stage is None:
+            stage = _stages[s.name] = _Stage()
+        stage.buckets[bisect.bisect_left(BUCKETS, s.elapsed)] += 1
+        stage.count += 1
+        stage.total += s.elapsed
+        stage.rows += s.rows
+        stage.bytes += s.bytes
+        if s.hit is True:
+            stage.hits += 1
+        elif s.hit is False:
+            stage.misses += 1
+        if session is not None:
+            events = _sessions.get(session)
+            if events is None:
+                events = _sessions[session] = deque(maxlen=SESSION_EVENTS)
+                while len(_sessions) > MAX_SESSIONS:
+                    _sessions.popitem(last=False)
+            else:
+                _sessions.move_to_end(session)
+            events.append(event)
+        if _jsonl is not None:
+            _jsonl.write(json.dumps({**event, "session": session}) + "\n")
+            _jsonl.flush()
+
+
+def snapshot():
+    """단계별 집계 결과: 단계 이름 -> dict(count, seconds, rows, bytes, hits, misses, buckets)"""
+    with _lock:
+        return {name: {"count": s.count, "seconds": s.total, "rows": s.rows, "bytes": s.bytes,
+                       "hits": s.hits, "misses": s.misses, "buckets": list(s.buckets)}
+                for name, s in _stages.items()}
+
+
+def session_events(session_id=None):
+    """세션의 최근 span 기록 (최신 순서가 마지막). 세션을 생략하면 현재 Streamlit 세션."""
+    session_id = session_id or _session_id()
+    with _lock:
+        return list(_sessions.get(session_id, ()))
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _sessions.clear()
+
+
+def prometheus_text():
+    """집계 결과를 Prometheus 텍스트 형식(0.0.4)으로 돌려줍니다."""
+    lines = [
+        "# HELP app_stage_latency_seconds Latency of instrumented stages.",
+        "# TYPE app_stage_latency_seconds histogram",
+    ]
+    stages = snapshot()
+    for name, s in sorted(stages.items()):
+        cumulative = 0
+        for bound, n in zip((*BUCKETS, "+Inf"), s["buckets"]):
+            cumulative += n
+            lines.append(f'app_stage_latency_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'app_stage_latency_seconds_sum{{stage="{name}"}} {s["seconds"]:.9f}')
+        lines.append(f'app_stage_latency_seconds_count{{stage="{name}"}} {s["count"]}')
+    for metric, field, help_text in (("app_stage_rows_total", "rows", "Rows processed by stage."),
+                                     ("app_stage_bytes_total", "bytes", "Bytes fetched or produced by stage.")):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        lines += [f'{metric}{{stage="{name}"}} {s[field]}' for name, s in sorted(stages.items())]
+    lines += ["# HELP app_stage_cache_total Cache lookups by stage and result.", "# TYPE app_stage_cache_total counter"]
+    for name, s in sorted(stages.items()):
+        if s["hits"] or s["misses"]:
+            lines.append(f'app_stage_cache_total{{stage="{name}",result="hit"}} {s["hits"]}')
+            lines.append(f'app_stage_cache_total{{stage="{name}",result="miss"}} {s["misses"]}')
+    return "\n".join(lines) + "\n"
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """`/metrics`에서 Prometheus 텍스트를 제공하는 HTTP 서버를 백그라운드 스레드로 띄웁니다 (프로세스당 한 번)."""
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, int(port)), Handler)
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
+
+
+def enable(jsonl_path=None, port=None):
+    """측정을 켭니다. jsonl_path/port를 주면 해당 방식으로도 내보냅니다."""
+    global _enabled, _jsonl
+    if jsonl_path and _jsonl is None:
+        _jsonl = open(jsonl_path, "a", encoding="utf-8")
+        atexit.register(close_jsonl)
+    if port:
+        try:
+            start_http_server(port)
+        except OSError:
+            # Streamlit이 스크립트를 다시 불러오는 등으로 이미 다른 곳에서 포트를 쓰고 있으면 건너뜁니다.
+            pass
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def close_jsonl():
+    """JSONL 파일을 닫습니다. 인터프리터가 끝날 때 자동으로 불립니다."""
+    global _jsonl
+    with _lock:
+        if _jsonl is not None:
+            _jsonl.close()
+            _jsonl = None
+
+
+def debug_panel():
+    """측정이 켜져 있으면 사이드바에 현재 세션의 최근 span 목록과 단계별 합계를 보여줍니다."""
+    if not _enabled:
+        return
+    import streamlit as st
+
+    if not st.sidebar.checkbox("성능 측정 패널", value=False, key="_metrics_debug_panel"):
+        return
+    events = session_events()
+    with st.sidebar.expander("이 세션의 최근 단계", expanded=True):
+        st.dataframe(
+            [{"단계": e["stage"], "ms": round(e["seconds"] * 1000, 2), "행": e["rows"],
+              "KiB": round(e["bytes"] / 1024, 1), "캐시": e["cache"] or ""} for e in reversed(events[-50:])],
+            hide_index=True,
+        )
+    with st.sidebar.expander("전체 단계별 합계 (프로세스)"):
+        st.dataframe(
+            [{"단계": name, "호출": s["count"], "평균 ms": round(s["seconds"] / s["count"] * 1000, 2),
+              "행": s["rows"], "MiB": round(s["bytes"] / 2 ** 20, 2), "적중": s["hits"], "실패": s["misses"]}
+             for name, s in sorted(snapshot().items())],
+            hide_index=True,
+        )
+
+
+if os.environ.get("METRICS_ENABLED") == "1" or os.environ.get("METRICS_JSONL") or os.environ.get("METRICS_PORT"):
+    enable(os.environ.get("METRICS_JSONL"), os.environ.get("METRICS_PORT"))
+
+
+if __name__ == "__main__":
+    # 꺼져 있을 때/켜져 있을 때 span 하나의 비용 측정
+    n = 200_000
+
+    def work(x):
+        return x + 1
+
+    @timed("bench.decorated")
+    def decorated(x):
+        return x + 1
+
+    def bench(label, fn):
+        t0 = time.perf_counter()
+        for i in range(n):
+            fn(i)
+        per_call = (time.perf_counter() - t0) / n
+        print(f"{label:>28}: {per_call * 1e9:7.0f} ns/call")
+        return per_call
+
+    def with_span(i):
+        with span("bench.span") as s:
+            s.add(rows=1)
+            return work(i)
+
+    disable()
+    base = bench("bare function", work)
+    off_span = bench("span (disabled)", with_span)
+    off_deco = bench("@timed (disabled)", decorated)
+    enable()
+    on_span = bench("span (enabled)", with_span)
+    on_deco = bench("@timed (enabled)", decorated)
+    print(f"disabled overhead: span {(off_span - base) * 1e9:.0f} ns, @timed {(off_deco - base) * 1e9:.0f} ns per call")
+    print("\n".join(line for line in prometheus_text().splitlines() if "_count" in line))
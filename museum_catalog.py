@@ -0,0 +1,184 @@
+"""
+박물관 카탈로그: 데이터 파일을 읽어 열(column) 단위 배열과 검색용 인덱스를 만듭니다.
+
+- 위치: 위도/경도를 단위 구 위의 3차원 좌표로 바꿔 KD-tree(scipy cKDTree)에 넣고,
+  "X km 이내" / "가장 가까운 N곳" 질의를 처리합니다.
+- 태그: `fields` 해시태그와 `curriculum` 항목(전체 문자열과 '-'로 나눈 과목/단원/주제)에 대한
+  역색인(inverted index)으로 필터링합니다.
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from lazy_imports import lazy_import
+from metrics import timed
+
+scipy_spatial = lazy_import("scipy.spatial")
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_PATH = Path(os.environ.get("MUSEUM_DATA", Path(__file__).parent / "museums.json"))
+
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _km_to_chord(km):
+    return 2 * np.sin(np.minimum(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+def _chord_to_km(chord):
+    return 2 * np.arcsin(np.clip(chord / 2, 0, 1)) * EARTH_RADIUS_KM
+
+
+def curriculum_terms(entry):
+    """교과 연계 항목 하나에서 색인할 용어들: 전체 문자열과 '-'로 나눈 각 부분."""
+    parts = [part.strip() for part in entry.split("-") if part.strip()]
+    return {entry, *parts}
+
+
+class MuseumCatalog:
+    def __init__(self, museums):
+        """museums: 이름 -> 정보 딕셔너리 (main.py에서 쓰던 것과 같은 형태)"""
+        self.names = list(museums)
+        self.records = [museums[name] for name in self.names]
+        self.lat = np.array([r["lat"] for r in self.records], dtype=np.float64)
+        self.lon = np.array([r["lon"] for r in self.records], dtype=np.float64)
+        self._tree = scipy_spatial.cKDTree(_unit_vectors(self.lat, self.lon)) if self.names else None
+
+        tags, terms, subjects = {}, {}, set()
+        for i, record in enumerate(self.records):
+            for tag in record.get("fields", []):
+                tags.setdefault(tag, []).append(i)
+            for entry in record.get("curriculum", []):
+                subjects.add(entry.split("-")[0].strip())
+                for term in curriculum_terms(entry):
+                    terms.setdefault(term, []).append(i)
+        self._tags = {k: np.unique(v) for k, v in tags.items()}
+        self._terms = {k: np.unique(v) for k, v in terms.items()}
+        self._all = np.arange(len(self.names))
+        # 사이드바가 rerun마다 읽는 선택지 목록은 색인을 만들 때 한 번만 정렬해 둡니다.
+        self.tags = sorted(self._tags)
+        self.subjects = sorted(subjects)   # 교과 연계 항목의 첫 부분(과목명) 목록
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def __len__(self):
+        return len(self.names)
+
+    def within(self, lat, lon, radius_km):
+        """(lat, lon)에서 radius_km 이내인 박물관 인덱스 (정렬됨)."""
+        if self._tree is None:
+            return self._all
+        idx = self._tree.query_ball_point(_unit_vectors([lat], [lon])[0], _km_to_chord(radius_km))
+        return np.sort(np.asarray(idx, dtype=np.intp))
+
+    def nearest(self, lat, lon, n=5):
+        """(lat, lon)에서 가까운 순서로 최대 n곳. 반환값: (인덱스 배열, 거리(km) 배열)"""
+        if self._tree is None or n <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        n = min(n, len(self))
+        dist, idx = self._tree.query(_unit_vectors([lat], [lon])[0], k=n)
+        return np.atleast_1d(idx), _chord_to_km(np.atleast_1d(dist))
+
+    def distances(self, lat, lon, indices):
+        """(lat, lon)에서 인덱스 목록의 각 박물관까지의 거리(km)."""
+        target = _unit_vectors([lat], [lon])[0]
+        vectors = _unit_vectors(self.lat[indices], self.lon[indices])
+        return _chord_to_km(np.linalg.norm(vectors - target, axis=1))
+
+    def with_tags(self, tags, match_all=True):
+        """해시태그가 모두(match_all) 또는 하나라도 붙은 박물관 인덱스."""
+        return self._lookup(self._tags, tags, match_all)
+
+    def with_curriculum(self, terms, match_all=True):
+        """교과 연계 항목(전체 문자열, 과목, 단원, 주제 중 하나)과 일치하는 박물관 인덱스."""
+        return self._lookup(self._terms, terms, match_all)
+
+    def _lookup(self, index, keys, match_all):
+        empty = np.empty(0, dtype=np.intp)
+        postings = [index.get(key, empty) for key in keys]
+        if not postings:
+            return self._all
+        if match_all:
+            return self._intersect(postings)
+        return np.unique(np.concatenate(postings))
+
+    def _intersect(self, arrays):
+        # 가장 작은 결과에서 시작해서 나머지 조건을 불리언 마스크로 거릅니다. 마스크는 박물관 수(N) 크기라
+        # 조건마다 O(N)이지만, 10만 곳에서도 수십 µs로 정렬 배열 이진 탐색(searchsorted)보다 빠릅니다.
+        arrays = sorted(arrays, key=len)
+        result = arrays[0]
+        for other in arrays[1:]:
+            if not len(result):
+                break
+            mask = np.zeros(len(self), dtype=bool)
+            mask[other] = True
+            result = result[mask[result]]
+        return result
+
+    @timed("museums.query")
+    def query(self, tags=(), curriculum=(), near=None, radius_km=None):
+        """
+        조건을 모두 만족하는 박물관 인덱스 (정렬됨). 조건이 없으면 전체.
+        near=(lat, lon)과 radius_km를 함께 주면 거리 조건을 적용합니다.
+        """
+        conditions = []
+        if tags:
+            conditions.append(self.with_tags(tags))
+        if curriculum:
+            conditions.append(self.with_curriculum(curriculum))
+        if near is not None and radius_km is not None:
+            conditions.append(self.within(*near, radius_km))
+        if not conditions:
+            return self._all
+        return self._intersect(conditions)
+
+    def subset(self, indices):
+        """인덱스 목록에 해당하는 박물관을 이름 -> 정보 딕셔너리로 돌려줍니다."""
+        return {self.names[i]: self.records[i] for i in indices}
+
+
+if __name__ == "__main__":
+    # 합성 카탈로그(10만 곳)에서의 질의 지연 시간 측정
+    import time
+
+    rng = np.random.default_rng(0)
+    n = 100_000
+    tag_pool = [f"#분야{i}" for i in range(200)]
+    subject_pool = ["물리학I", "화학I", "생명과학I", "지구과학I", "물리학II", "화학II"]
+    museums = {
+        f"박물관 {i}": {
+            "lat": float(rng.uniform(36, 60)), "lon": float(rng.uniform(-10, 30)),
+            "fields": list(rng.choice(tag_pool, 5, replace=False)),
+            "curriculum": [f"{rng.choice(subject_pool)}-단원{rng.integers(10)}-주제{rng.integers(50)}"
+                           for _ in range(3)],
+        }
+        for i in range(n)
+    }
+
+    t0 = time.perf_counter()
+    catalog = MuseumCatalog(museums)
+    print(f"build index for {n:,} museums: {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    def bench(label, fn, repeat=1000):
+        fn()
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            result = fn()
+        elapsed = (time.perf_counter() - t0) / repeat
+        size = len(result[0]) if isinstance(result, tuple) else len(result)
+        print(f"{label:>28}: {elapsed * 1e6:8.1f} us ({size} results)")
+
+    bench("within 10 km", lambda: catalog.within(48.86, 2.35, 10))
+    bench("nearest 10", lambda: catalog.nearest(48.86, 2.35, 10))
+    bench("tag", lambda: catalog.with_tags(["#분야7"]))
+    bench("tag AND tag", lambda: catalog.with_tags(["#분야7", "#분야8"]))
+    bench("curriculum subject", lambda: catalog.with_curriculum(["화학I"]))
+    bench("tag + subject + 10 km", lambda: catalog.query(["#분야7"], ["화학I"], (48.86, 2.35), 10))
@@ -0,0 +1,142 @@
+"""
+박물관 지도 HTML을 만드는 모듈.
+
+- 박물관 수가 적으면 지금처럼 마커마다 팝업을 붙인 일반 마커를 씁니다.
+- 많아지면(수천 개) FastMarkerCluster를 사용합니다. 마커 데이터는 배열 하나로 보내고,
+  마커와 팝업 HTML은 브라우저에서 필요할 때 만들며, 가까운 마커는 클러스터로 묶어서 그립니다.
+- 페이지(main.py)는 결과 HTML을 `st.cache_data`로 캐시해서 rerun마다 folium 객체를 다시 만들지 않습니다.
+  캐시 키는 데이터 파일의 수정 시각과 검색 결과(인덱스 목록)입니다.
+"""
+import html
+
+from lazy_imports import lazy_import
+from metrics import span
+
+folium = lazy_import("folium")
+folium_plugins = lazy_import("folium.plugins")
+
+# 이 개수보다 많으면 클러스터 레이어를 사용합니다.
+CLUSTER_THRESHOLD = 200
+
+MAP_CENTER = [49.0, 10.0]
+MAP_ZOOM = 4
+
+# FastMarkerCluster 콜백: row = [lat, lon, 이름, 이미지, 홈페이지, 설립 연도, 규모, 방문객 수, 주력 분야, 교과 연계(<li> 목록)]
+_MARKER_CALLBACK = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    var html = '<h4>' + row[2] + '</h4>'
+        + '<img src="' + row[3] + '" alt="' + row[2] + '" width="200"><br>'
+        + '<p><b>공식 홈페이지:</b> <a href="' + row[4] + '" target="_blank">' + row[4] + '</a></p>'
+        + '<p><b>설립 연도:</b> ' + row[5] + '</p>'
+        + '<p><b>규모:</b> ' + row[6] + '</p>'
+        + '<p><b>연간 방문객 수:</b> ' + row[7] + '</p>'
+        + '<p><b>주력 분야:</b> ' + row[8] + '</p>'
+        + '<p><b>2025년 고등학교 과학교과 연계:</b></p><ul>' + row[9] + '</ul>';
+    marker.bindPopup(html, {maxWidth: 300});
+    marker.bindTooltip(row[2]);
+    return marker;
+}
+"""
+
+
+def popup_html(name, info, image_src=None):
+    image = image_src(info['image']) if image_src else info['image']
+    popup = f"""
+    <h4>{name}</h4>
+    <img src="{image}" alt="{name}" width="200"><br>
+    <p><b>공식 홈페이지:</b> <a href="{info['homepage']}" target="_blank">{info['homepage']}</a></p>
+    <p><b>설립 연도:</b> {info['established']}</p>
+    <p><b>규모:</b> {info['size']}</p>
+    <p><b>연간 방문객 수:</b> {info['visitors']}</p>
+    <p><b>주력 분야:</b> {" ".join(info['fields'])}</p>
+    <p><b>2025년 고등학교 과학교과 연계:</b></p>
+    <ul>
+    """
+    for item in info['curriculum']:
+        popup += f"<li>{item}</li>"
+    popup += "</ul>"
+    return popup
+
+
+def _marker_row(name, info, image_src=None):
+    esc = html.escape
+    image = image_src(info['image']) if image_src else info['image']
+    return [
+        info['lat'], info['lon'], esc(name), esc(image), esc(info['homepage']),
+        esc(info['established']), esc(info['size']), esc(info['visitors']),
+        esc(" ".join(info['fields'])), "".join(f"<li>{esc(item)}</li>" for item in info['curriculum']),
+    ]
+
+
+def build_map(museums, cluster_threshold=CLUSTER_THRESHOLD, image_src=None):
+    """image_src: 원본 이미지 URL -> 팝업에 넣을 이미지 주소 (예: 썸네일 캐시). 없으면 원본 URL을 씁니다."""
+    m = folium.Map(location=MAP_CENTER, zoom_start=MAP_ZOOM)
+    if len(museums) <= cluster_threshold:
+        for name, info in museums.items():
+            folium.Marker(
+                location=[info['lat'], info['lon']],
+                popup=folium.Popup(popup_html(name, info, image_src), max_width=300),
+                tooltip=name
+            ).add_to(m)
+    else:
+        folium_plugins.FastMarkerCluster(
+            [_marker_row(name, info, image_src) for name, info in museums.items()],
+            callback=_MARKER_CALLBACK,
+        ).add_to(m)
+    return m
+
+
+def build_map_html(museums, cluster_threshold=CLUSTER_THRESHOLD, image_src=None):
+    """지도를 완성된 HTML 문서 문자열로 렌더링합니다 (folium_static이 내부에서 하는 것과 같은 형태)."""
+    with span("museums.map_html") as s:
+        page = build_map(museums, cluster_threshold, image_src).get_root().render()
+        s.add(rows=len(museums), bytes=len(page))
+    return page
+
+
+if __name__ == "__main__":
+    # 박물관 수별 지도 생성 시간, main.py와 같은 `st.cache_data` 경로로 캐시된 rerun 시간, HTML 크기 측정
+    import logging
+    import random
+    import time
+
+    import folium  # 첫 측정에 import 시간이 섞이지 않도록 미리 불러옵니다
+    import numpy as np
+    import streamlit as st
+
+    logging.disable(logging.WARNING)   # bare mode 경고(ScriptRunContext 없음)를 숨깁니다
+
+    def synthetic_museums(n):
+        rng = random.Random(0)
+        return {
+            f"박물관 {i}": {
+                "lat": rng.uniform(36, 60), "lon": rng.uniform(-10, 30),
+                "image": f"https://example.org/images/{i}.jpg",
+                "homepage": f"https://example.org/museum/{i}",
+                "established": str(rng.randint(1800, 2020)),
+                "size": f"약 {rng.randint(1, 100) * 1000:,}평방미터",
+                "visitors": f"약 {rng.randint(1, 300) * 10000:,} 명/년",
+                "fields": ["#물리", "#화학", "#생명과학"],
+                "curriculum": ["물리학I-역학과 에너지", "화학I-물질의 특성"],
+            }
+            for i in range(n)
+        }
+
+    @st.cache_data(max_entries=32, show_spinner=False)
+    def get_map_html(version, _museums):
+        return build_map_html(_museums)
+
+    for n in (10, 1_000, 10_000):
+        museums = synthetic_museums(n)
+        # main.py의 키: (데이터 파일 수정 시각, 검색 결과 인덱스 바이트)
+        version = (0.0, np.arange(n).tobytes())
+        t0 = time.perf_counter()
+        page = get_map_html(version, museums)
+        cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in range(20):
+            page = get_map_html(version, museums)
+        warm = (time.perf_counter() - t0) / 20
+        print(f"{n:6d} museums: cold build {cold * 1000:8.1f} ms, "
+              f"cached rerun (st.cache_data) {warm * 1000:6.2f} ms, HTML {len(page) / 1024:8.1f} KiB")
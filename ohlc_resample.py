@@ -0,0 +1,83 @@
+"""
+캔들 차트용 OHLC 리샘플링.
+
+20년치 일봉(약 5,000개)을 그대로 브라우저에 보내지 않고, 보이는 기간과 차트 폭(px)에 맞춰
+주봉/월봉 등으로 합쳐서 보냅니다. (시가=첫 값, 고가=최댓값, 저가=최솟값, 종가=마지막 값, 거래량=합계)
+그 밖의 컬럼(이동평균 등 일봉에서 계산해 붙인 지표)은 구간의 마지막 값을 씁니다.
+"""
+from lazy_imports import lazy_import
+from metrics import span
+
+pd = lazy_import("pandas")
+
+# (pandas 리샘플 규칙, 화면 표시 이름, 대략적인 봉 하나의 길이(일))
+RESOLUTIONS = [
+    ("D", "일봉", 1),
+    ("W-FRI", "주봉", 7),
+    ("MS", "월봉", 30.4),
+    ("QS", "분기봉", 91.3),
+]
+
+AGGREGATIONS = {
+    "Open": "first",
+    "High": "max",
+    "Low": "min",
+    "Close": "last",
+    "Adj Close": "last",
+    "Volume": "sum",
+}
+
+
+def choose_rule(start, end, width_px=1200, min_px_per_bar=4):
+    """보이는 기간에 봉 하나당 최소 `min_px_per_bar` 픽셀이 되는 가장 세밀한 해상도를 고릅니다."""
+    days = max((pd.Timestamp(end) - pd.Timestamp(start)).days, 1)
+    max_bars = max(width_px // min_px_per_bar, 1)
+    for rule, _, bar_days in RESOLUTIONS:
+        # 일봉은 영업일 기준이므로 달력일의 약 5/7만 봉이 됩니다.
+        bars = days * 5 / 7 if rule == "D" else days / bar_days
+        if bars <= max_bars:
+            return rule
+    return RESOLUTIONS[-1][0]
+
+
+def resample_ohlc(df, rule):
+    """일봉 OHLCV를 `rule` 단위로 합칩니다. 각 봉의 날짜는 구간의 첫 거래일입니다."""
+    if rule == "D" or df.empty:
+        return df
+    agg = {col: AGGREGATIONS.get(col, "last") for col in df.columns}
+    out = df.resample(rule).agg(agg)
+    first_dates = df.index.to_series().resample(rule).first()
+    out.index = pd.DatetimeIndex(first_dates.to_numpy(), name=df.index.name)
+    # 거래일이 하나도 없는 구간(긴 휴장 등)은 버립니다.
+    return out[out.index.notna()]
+
+
+def visible_candles(df, start, end, width_px=1200, rule=None):
+    """[start, end] 구간을 잘라서 자동(또는 지정된) 해상도로 리샘플링합니다. 반환값: (DataFrame, 규칙)"""
+    with span("ohlc.resample") as s:
+        view = df.loc[(df.index >= pd.Timestamp(start)) & (df.index <= pd.Timestamp(end))]
+        rule = rule or choose_rule(start, end, width_px)
+        candles = resample_ohlc(view, rule)
+        s.add(rows=len(view))
+    return candles, rule
+
+
+if __name__ == "__main__":
+    # 해상도별 Plotly 페이로드 크기와 직렬화 시간 측정 (가짜 20년 일봉 사용)
+    import time
+
+    import plotly.graph_objects as go
+
+    from stock_fetch import fake_ohlcv
+
+    end = pd.Timestamp.today().normalize()
+    daily = fake_ohlcv("ASML", end - pd.Timedelta(days=20 * 365), end)
+    for rule, label, _ in RESOLUTIONS:
+        candles = resample_ohlc(daily, rule)
+        fig = go.Figure(go.Candlestick(x=candles.index, open=candles["Open"], high=candles["High"],
+                                       low=candles["Low"], close=candles["Close"]))
+        t0 = time.perf_counter()
+        payload = fig.to_json()
+        elapsed = time.perf_counter() - t0
+        print(f"{label:>4} ({rule:>5}): {len(candles):5d} bars, {len(payload) / 1024:8.1f} KiB, {elapsed * 1000:6.1f} ms")
+    print("auto (20y @1200px):", choose_rule(daily.index[0], daily.index[-1]))
@@ -1,42 +1,126 @@
 import streamlit as st
-import yfinance as yf
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
+from datetime import date, timedelta
+
+from figure_cache import get_shared_cache
+from indicators import compute_indicators
+from lazy_imports import lazy_import, start_warm_up
+from metrics import debug_panel
+from ohlc_resample import RESOLUTIONS, visible_candles
+from prefetch import data_version, get_prices, start_prefetch
+
+# plotly는 그림을 새로 만들 때(그림 캐시에 없을 때)만 불러옵니다.
+go = lazy_import("plotly.graph_objects")
+start_warm_up()
+# PRICE_PREFETCH=1이면 백그라운드에서 주가 저장소를 미리 갱신합니다.
+start_prefetch()
+
+# 자동 해상도 선택에 사용할 차트 폭 (px). Streamlit은 실제 컨테이너 폭을 알려주지 않습니다.
+CHART_WIDTH_PX = 1200
+RESOLUTION_LABELS = {label: rule for rule, label, _ in RESOLUTIONS}
+RULE_NAMES = {rule: label for rule, label, _ in RESOLUTIONS}
+# 캔들 위에 겹쳐 그릴 지표: 화면 표시 이름 -> 지표 컬럼 목록
+OVERLAYS = {
+    "20일 이동평균": ["sma_20"],
+    "50일 이동평균": ["sma_50"],
+    "200일 이동평균": ["sma_200"],
+    "볼린저 밴드 (20일, 2σ)": ["bb_upper", "bb_lower"],
+}
 
 def main():
     st.set_page_config(page_title="ASML 주가 변화", layout="wide")
     st.title("ASML (ASML) 최근 20년 주가 변화")
 
     ticker = "ASML"
-    end_date = datetime.now()
+    # datetime.now()를 캐시 키로 쓰면 매 rerun마다 캐시가 빗나가므로 날짜 단위로 자릅니다.
+    end_date = date.today()
     start_date = end_date - timedelta(days=20 * 365) # 20년 전 데이터
+    version = data_version()
+
+    @st.cache_data
+    def get_stock_data(ticker, start_date, end_date, version=0):
+        # 백그라운드 갱신 스냅샷(version)이 있으면 메모리에서 자르고,
+        # 없으면 디스크 저장소에서 읽고 마지막 저장일 이후의 봉만 새로 받습니다.
+        frames, errors = get_prices([ticker], start_date, end_date + timedelta(days=1))
+        if ticker in errors:
+            raise errors[ticker]
+        return frames[ticker]
+
+    @st.cache_data
+    def get_daily_with_indicators(ticker, start_date, end_date, version=0):
+        # 종가 기준 지표는 데이터 버전마다 일봉 전체에서 한 번만 계산해 붙여 둡니다.
+        # 캐시된 결과가 세션 사이에 공유된 상태에 좌우되지 않도록 입력만으로 계산합니다.
+        df = get_stock_data(ticker, start_date, end_date, version)
+        indicators = compute_indicators(df[["Close"]])
+        return df.assign(**{name: frame["Close"] for name, frame in indicators.frames.items()})
 
     @st.cache_data
-    def get_stock_data(ticker, start_date, end_date):
-        data = yf.download(ticker, start=start_date, end=end_date)
-        return data
+    def get_candles(ticker, start_date, end_date, view_start, view_end, rule, version=0):
+        # 보이는 구간만 잘라서 해상도에 맞게 합친 봉을 캐시합니다.
+        # 지표도 함께 리샘플링합니다 (각 봉 구간의 마지막 값).
+        df = get_daily_with_indicators(ticker, start_date, end_date, version)
+        return visible_candles(df, view_start, view_end, CHART_WIDTH_PX, rule)
 
     st.write(f"**티커:** {ticker}")
     st.write(f"**데이터 기간:** {start_date.strftime('%Y-%m-%d')} 부터 {end_date.strftime('%Y-%m-%d')} 까지")
 
     try:
-        df = get_stock_data(ticker, start_date, end_date)
+        df = get_stock_data(ticker, start_date, end_date, version)
 
         if not df.empty:
-            fig = go.Figure(data=[go.Candlestick(x=df.index,
-                                                    open=df['Open'],
-                                                    high=df['High'],
-                                                    low=df['Low'],
-                                                    close=df['Close'])])
-
-            fig.update_layout(
-                title=f'{ticker} 주가 (최근 20년)',
-                xaxis_title='날짜',
-                yaxis_title='주가 (USD)',
-                xaxis_rangeslider_visible=False,
-                height=600 # 그래프 높이 조정
+            # 보고 싶은 구간을 좁히면 더 세밀한 해상도(주봉 -> 일봉)로 다시 가져옵니다.
+            first_day, last_day = df.index[0].date(), df.index[-1].date()
+            view_start, view_end = st.slider(
+                "표시 구간:",
+                min_value=first_day,
+                max_value=last_day,
+                value=(first_day, last_day),
+                format="YYYY-MM-DD"
             )
-            st.plotly_chart(fig, use_container_width=True)
+            resolution = st.selectbox("봉 단위:", ["자동", *RESOLUTION_LABELS])
+            rule = RESOLUTION_LABELS.get(resolution)
+            overlays = st.multiselect("보조 지표:", list(OVERLAYS), default=[])
+            show_rsi = st.checkbox("RSI (14일) 표시", value=False)
+
+            candles, rule = get_candles(ticker, start_date, end_date, view_start, view_end, rule, version)
+            st.caption(f"{RULE_NAMES[rule]} {len(candles):,}개 표시 중 (일봉 {len(df):,}개)")
+
+            def build_figure():
+                fig = go.Figure(data=[go.Candlestick(x=candles.index,
+                                                        open=candles['Open'],
+                                                        high=candles['High'],
+                                                        low=candles['Low'],
+                                                        close=candles['Close'],
+                                                        name=ticker)])
+                for overlay in overlays:
+                    for column in OVERLAYS[overlay]:
+                        fig.add_trace(go.Scatter(x=candles.index, y=candles[column].to_numpy(), mode='lines',
+                                                 name=overlay, line=dict(width=1), showlegend=column == OVERLAYS[overlay][0]))
+
+                fig.update_layout(
+                    title=f'{ticker} 주가 ({view_start} ~ {view_end}, {RULE_NAMES[rule]})',
+                    xaxis_title='날짜',
+                    yaxis_title='주가 (USD)',
+                    xaxis_rangeslider_visible=False,
+                    height=600 # 그래프 높이 조정
+                )
+                return fig
+
+            # 같은 구간/해상도의 그림은 직렬화된 JSON을 그대로 다시 사용합니다.
+            figure_key = (ticker, start_date, end_date, view_start, view_end, rule, version, tuple(overlays))
+            st.plotly_chart(get_shared_cache().plotly(figure_key, build_figure), use_container_width=True)
+
+            if show_rsi:
+                def build_rsi_figure():
+                    fig = go.Figure(go.Scatter(x=candles.index, y=candles['rsi'].to_numpy(), mode='lines', name='RSI'))
+                    # 일반적인 과매수(70)/과매도(30) 기준선
+                    for level in (30, 70):
+                        fig.add_hline(y=level, line_dash="dot", line_color="gray")
+                    fig.update_layout(title=f'{ticker} RSI (14일, {RULE_NAMES[rule]} 마지막 값)', yaxis_title='RSI',
+                                      yaxis_range=[0, 100], height=250, margin=dict(t=40, b=20))
+                    return fig
+
+                rsi_key = ("rsi", ticker, start_date, end_date, view_start, view_end, rule, version)
+                st.plotly_chart(get_shared_cache().plotly(rsi_key, build_rsi_figure), use_container_width=True)
 
             st.subheader("주가 데이터")
             st.dataframe(df.tail()) # 최근 5개 데이터 보여주기
@@ -45,5 +129,8 @@ def main():
     except Exception as e:
         st.error(f"데이터를 가져오는 중 오류가 발생했습니다: {e}")
 
+    # METRICS_ENABLED=1이면 사이드바에서 이 세션의 단계별 처리 시간을 볼 수 있습니다.
+    debug_panel()
+
 if __name__ == "__main__":
     main()
@@ -1,16 +1,30 @@
 
 import streamlit as st
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.signal import welch
+from typing import NamedTuple
+
+from decimate import minmax_decimate, target_points
+from figure_cache import get_shared_cache
+from lazy_imports import is_available, lazy_import, start_warm_up
+from matched_filter import search_stream
+from metrics import debug_panel
+from spectral import SpectralService
+from strain_cache import StrainCache
+from streaming_spectrogram import (DEFAULT_ROOT as SPECTROGRAM_DIR, downsample_columns, iter_strain_chunks, load_spectrogram,
+                                   spectrogram_path, stream_spectrogram)
+
+# matplotlib, gwpy(astropy 포함), scipy는 불러오는 데 몇 초가 걸리므로
+# 버튼을 눌러 실제로 그림을 그리거나 계산할 때 불러옵니다.
+plt = lazy_import("matplotlib.pyplot")
+mcolors = lazy_import("matplotlib.colors")
+gwpy_timeseries = lazy_import("gwpy.timeseries")
+gwpy_frequencyseries = lazy_import("gwpy.frequencyseries")
+gwpy_spectrogram = lazy_import("gwpy.spectrogram")
+start_warm_up()
 
 # gwpy는 LIGO/Virgo 데이터를 다루는 데 매우 유용합니다.
 # pip install gwpy h5py matplotlib
-try:
-    from gwpy.timeseries import TimeSeries
-    from gwpy.segments import Segment
-    from gwpy.plot import Plot
-except ImportError:
+if not is_available("gwpy"):
     st.error("`gwpy` 라이브러리가 설치되어 있지 않습니다. `pip install gwpy h5py matplotlib`을 실행하거나 `requirements.txt`에 추가했는지 확인해주세요.")
     st.stop()
 
@@ -20,15 +34,169 @@ st.title("LIGO 중력파 데이터 시각화 (GWOSC 데이터 기반)")
 st.write("이 앱은 GWOSC(Gravitational-Wave Open Science Center)에서 특정 중력파 이벤트 또는 사용자가 지정한 시간 구간의 데이터를 가져와 시각화합니다.")
 st.warning("1년치 데이터를 직접 로드하는 것은 매우 무거울 수 있습니다. 여기서는 특정 이벤트 또는 짧은 시간 구간의 데이터를 시각화합니다.")
 
----
+# ---
+
+# 2. 데이터 로드 및 시각화 함수
+
+class Segment(NamedTuple):
+    # gwpy.segments.Segment처럼 start/end와 abs(segment)(길이)를 지원하는 구간.
+    # UI에서 구간을 만들 때마다 gwpy를 불러오지 않도록 직접 정의합니다.
+    start: float
+    end: float
+
+    def __abs__(self):
+        return self.end - self.start
+
+@st.cache_resource
+def get_strain_cache():
+    # 모든 세션이 같은 strain 캐시(디스크의 HDF5 파일)를 공유합니다.
+    return StrainCache()
+
+@st.cache_resource
+def get_spectral_service():
+    # PSD/스펙트로그램 결과를 세션 간에 공유하고, 여러 탐지기는 프로세스 풀에서 함께 계산합니다.
+    return SpectralService()
+
+def load_strain(detector, segment):
+    # GWOSC에서 데이터 스트레인(strain)을 가져옵니다.
+    # 로컬 HDF5 캐시에 이미 있는 청크는 디스크에서 읽고, 빠진 구간만 네트워크로 받습니다.
+    cache = get_strain_cache()
+    return gwpy_timeseries.TimeSeries(cache.get(detector, segment.start, segment.end),
+                      t0=segment.start, sample_rate=cache.sample_rate, name=detector)
+
+def load_and_visualize(detectors, segment):
+    st.info(f"{', '.join(detectors)} 데이터 로드 중 (시작: {segment.start}, 기간: {abs(segment)}초)... 잠시 기다려주세요. 이 과정은 네트워크 상태에 따라 시간이 걸릴 수 있습니다.")
+    try:
+        strains = {detector: load_strain(detector, segment) for detector in detectors}
+        for detector, strain in strains.items():
+            st.success(f"{detector} 데이터 로드 완료! 총 {len(strain)} 샘플, {strain.duration.value:.2f} 초 데이터.")
+
+        # PSD와 스펙트로그램은 같은 FFT 구간을 공유합니다 (데이터를 한 번만 변환).
+        fftlength = min(1, abs(segment) / 4) # 데이터 길이에 따라 조정
+        if fftlength < 0.25: # 데이터가 너무 짧으면 계산 어려움
+            st.warning("데이터 길이가 너무 짧아 PSD/스펙트로그램을 정확히 계산하기 어렵습니다. 더 긴 기간을 선택해주세요.")
+            return
+        sample_rate = get_strain_cache().sample_rate
+        spectra = get_spectral_service().compute_many(
+            [(detector, (segment.start, segment.end), strain.value) for detector, strain in strains.items()],
+            sample_rate, fftlength, fftlength / 2, 'hann'
+        )
+
+        # 같은 데이터/설정으로 그린 그림은 PNG 바이트로 캐시해 두고, matplotlib을 다시 거치지 않습니다.
+        figures = get_shared_cache()
+        for (detector, strain), result in zip(strains.items(), spectra):
+            key = (detector, segment.start, segment.end, fftlength)
+
+            # 1. 시간 영역 파형 시각화
+            st.subheader(f"{detector} - 시간 영역 파형")
+            def plot_waveform():
+                # 수백만 샘플을 그대로 그리지 않고, 그림 폭에 맞게 줄인 점만 그립니다 (피크는 유지).
+                # 원본 strain은 PSD/스펙트로그램 계산에 그대로 사용합니다.
+                times, values = minmax_decimate(strain.times.value - strain.t0.value, strain.value, target_points((10, 4)))
+                fig_waveform, ax_waveform = plt.subplots(figsize=(10, 4))
+                ax_waveform.plot(times, values, color='teal', linewidth=0.5)
+                ax_waveform.set_title(f"{detector} Strain Data")
+                ax_waveform.set_xlabel(f"Time (s) from {strain.t0.value}")
+                ax_waveform.set_ylabel("Strain")
+                return fig_waveform
+            st.image(figures.matplotlib(("waveform", *key), plot_waveform), use_container_width=True)
+
+            # 2. 파워 스펙트럼 밀도 (PSD) 시각화
+            st.subheader(f"{detector} - 파워 스펙트럼 밀도 (PSD)")
+            df = result.frequencies[1] - result.frequencies[0]
+            def plot_psd():
+                asd = gwpy_frequencyseries.FrequencySeries(np.sqrt(result.psd), f0=0, df=df, name=detector)
+                fig_psd = asd[1:].plot(figsize=(10, 4), color='purple', title=f"{detector} Power Spectral Density")
+                ax_psd = fig_psd.gca()
+                ax_psd.set_xlabel("Frequency (Hz)")
+                ax_psd.set_ylabel("ASD (Hz$^{-1/2}$)")
+                ax_psd.set_xscale("log")
+                ax_psd.set_yscale("log")
+                return fig_psd
+            st.image(figures.matplotlib(("psd", *key), plot_psd), use_container_width=True)
+
+            # 3. 스펙트로그램 시각화 (시간-주파수 플롯)
+            st.subheader(f"{detector} - 스펙트로그램")
+            def plot_spectrogram():
+                specgram = gwpy_spectrogram.Spectrogram(np.sqrt(result.spectrogram), t0=segment.start,
+                                       dt=result.times[1] - result.times[0] if len(result.times) > 1 else fftlength / 2,
+                                       f0=0, df=df)
+                # vmax 값을 조정하여 시각화 범위를 최적화할 수 있습니다.
+                plot_spec = specgram.plot(figsize=(10, 6), cmap='viridis', vmin=1e-24, vmax=1e-20)
+                plot_spec.colorbar(label='Strain (Hz$^{-1/2}$)')
+                plot_spec.axes[0].set_yscale('log')
+                plot_spec.axes[0].set_ylim(20, 1024) # 중력파 신호가 주로 나타나는 주파수 범위
+                plot_spec.axes[0].set_title(f"{detector} Spectrogram")
+                return plot_spec
+            st.image(figures.matplotlib(("spectrogram", *key), plot_spectrogram), use_container_width=True)
+
+    except Exception as e:
+        st.error(f"데이터를 로드하거나 처리하는 중 오류가 발생했습니다: {e}")
+        st.info("GWOSC에서 데이터를 가져오는 데 시간이 걸리거나 네트워크 문제일 수 있습니다. 선택한 기간이 너무 길거나, 해당 시간에 데이터가 없을 수도 있습니다.")
+        st.info("특정 이벤트의 정확한 시간 범위는 GWOSC 웹사이트에서 확인해주세요.")
+
 
-## 1. 데이터 선택 옵션
+def visualize_streaming(detectors, segment):
+    # 몇 시간 길이의 구간은 strain 전체를 메모리에 올리지 않고 청크 단위로 읽으며 스펙트로그램만 계산합니다.
+    st.info(f"{', '.join(detectors)} 스트리밍 스펙트로그램 계산 중 (시작: {segment.start}, 기간: {abs(segment)}초)...")
+    try:
+        cache = get_strain_cache()
+        fftlength = 1
+        for detector in detectors:
+            st.subheader(f"{detector} - 스펙트로그램 (스트리밍)")
+            def plot_spectrogram():
+                # 그림 캐시에 없을 때만 스펙트로그램을 읽거나 계산합니다.
+                out_path = spectrogram_path(SPECTROGRAM_DIR, detector, segment.start, segment.end,
+                                            cache.sample_rate, fftlength, fftlength / 2)
+                n_samples = int(abs(segment) * cache.sample_rate)
+                # 같은 구간/설정은 이미 디스크에 있는 결과(행렬과 주파수 축)를 그대로 사용합니다.
+                stored = load_spectrogram(out_path)
+                if stored is not None:
+                    matrix, frequencies = stored
+                else:
+                    chunks = iter_strain_chunks(cache, detector, segment.start, segment.end, cache.chunk_seconds)
+                    matrix, _, frequencies = stream_spectrogram(
+                        chunks, n_samples, cache.sample_rate, fftlength, fftlength / 2, out_path)
+                image, _ = downsample_columns(matrix, target_points((10, 6)) // 2)
 
-데이터를 로드하는 방식을 선택할 수 있습니다.
+                fig_spec, ax_spec = plt.subplots(figsize=(10, 6))
+                mesh = ax_spec.imshow(image.T, origin="lower", aspect="auto", cmap="viridis",
+                                      norm=mcolors.LogNorm(vmin=1e-24, vmax=1e-20),
+                                      extent=[0, abs(segment), frequencies[0], frequencies[-1]])
+                fig_spec.colorbar(mesh, ax=ax_spec, label='Strain (Hz$^{-1/2}$)')
+                ax_spec.set_xlabel(f"Time (s) from {segment.start}")
+                ax_spec.set_ylabel("Frequency (Hz)")
+                ax_spec.set_title(f"{detector} Spectrogram")
+                return fig_spec
+            key = ("streaming_spectrogram", detector, segment.start, segment.end, cache.sample_rate, fftlength)
+            # 그리기 함수는 캐시에 없을 때만 불리므로 Streamlit 요소는 밖에서 띄웁니다 (캐시 적중이면 0.5초 안에 끝나 표시되지 않음).
+            with st.spinner(f"{detector} 스펙트로그램 계산 중..."):
+                png = get_shared_cache().matplotlib(key, plot_spectrogram)
+            st.image(png, use_container_width=True)
+
+    except Exception as e:
+        st.error(f"데이터를 로드하거나 처리하는 중 오류가 발생했습니다: {e}")
+        st.info("GWOSC에서 데이터를 가져오는 데 시간이 걸리거나 네트워크 문제일 수 있습니다. 선택한 기간이 너무 길거나, 해당 시간에 데이터가 없을 수도 있습니다.")
+
+
+@st.cache_data(show_spinner=False)
+def run_search(detector, start, end, threshold):
+    # 같은 구간/임계값의 검색 결과는 다시 계산하지 않습니다.
+    # 한 시간 구간도 전체를 이어 붙이지 않고, 캐시에서 청크를 차례로 읽으며 PSD와 필터링을 계산합니다.
+    cache = get_strain_cache()
+    return search_stream(lambda: iter_strain_chunks(cache, detector, start, end, cache.chunk_seconds),
+                         cache.sample_rate, t0=start, threshold=threshold)
+
+
+# ---
+
+# 1. 데이터 선택 옵션
+
+# 데이터를 로드하는 방식을 선택할 수 있습니다.
 
 data_source_option = st.radio(
     "어떤 방식으로 데이터를 가져오시겠습니까?",
-    ("특정 중력파 이벤트 선택", "직접 시간 구간 지정"),
+    ("특정 중력파 이벤트 선택", "직접 시간 구간 지정", "매치드 필터 이벤트 검색"),
     help="1년치 데이터는 너무 방대하여 직접 로드하기 어렵습니다."
 )
 
@@ -40,10 +208,10 @@ if data_source_option == "특정 중력파 이벤트 선택":
         index=0 # 기본값 설정
     )
 
-    detector = st.selectbox(
-        "탐지기를 선택하세요:",
+    detectors = st.multiselect(
+        "탐지기를 선택하세요 (여러 개 선택하면 함께 계산합니다):",
         ["H1 (Hanford)", "L1 (Livingston)"],
-        index=0 # 기본값 설정
+        default=["H1 (Hanford)"] # 기본값 설정
     )
 
     duration = st.slider(
@@ -66,10 +234,10 @@ if data_source_option == "특정 중력파 이벤트 선택":
     center_time = event_times[event_name]
     segment = Segment(center_time - duration / 2, center_time + duration / 2)
 
-    if st.button(f"{event_name} ({detector}) 데이터 로드 및 시각화"):
-        load_and_visualize(detector.split(' ')[0], segment)
+    if st.button(f"{event_name} ({', '.join(detectors)}) 데이터 로드 및 시각화", disabled=not detectors):
+        load_and_visualize([detector.split(' ')[0] for detector in detectors], segment)
 
-else: # 직접 시간 구간 지정
+elif data_source_option == "직접 시간 구간 지정":
     st.subheader("B. 시간 구간 직접 지정")
     st.info("시작 시간은 GPS 시간(Epoch)을 사용합니다. 예를 들어, 2015년 9월 14일 09:50:45 UTC는 1126259445 입니다.")
 
@@ -78,83 +246,92 @@ else: # 직접 시간 구간 지정
         value="1126259445", # GW150914 이벤트 근처
         help="GWOSC 데이터는 GPS 시간을 기준으로 합니다. GWOSC 웹사이트에서 특정 시간의 GPS 시간을 확인할 수 있습니다."
     )
-    custom_duration = st.slider(
-        "데이터 기간 (초):",
-        min_value=1,
-        max_value=600, # 최대 10분 정도로 제한 (스트림릿 클라우드 성능 고려)
-        value=60,
-        step=1,
-        help="가져올 데이터의 총 기간입니다. 너무 길게 설정하면 앱이 느려질 수 있습니다."
+    streaming = st.checkbox(
+        "긴 구간 스트리밍 모드 (스펙트로그램만)",
+        value=False,
+        help="데이터를 청크 단위로 읽어 스펙트로그램을 디스크에 바로 기록하므로, 몇 시간 길이의 구간도 메모리 부담 없이 볼 수 있습니다."
     )
-    detector_custom = st.selectbox(
-        "탐지기를 선택하세요:",
+    if streaming:
+        custom_duration = st.slider(
+            "데이터 기간 (분):",
+            min_value=10,
+            max_value=360, # 최대 6시간
+            value=60,
+            step=10
+        ) * 60
+    else:
+        custom_duration = st.slider(
+            "데이터 기간 (초):",
+            min_value=1,
+            max_value=600, # 최대 10분 정도로 제한 (스트림릿 클라우드 성능 고려)
+            value=60,
+            step=1,
+            help="가져올 데이터의 총 기간입니다. 너무 길게 설정하면 앱이 느려질 수 있습니다. 더 긴 구간은 스트리밍 모드를 사용하세요."
+        )
+    detectors_custom = st.multiselect(
+        "탐지기를 선택하세요 (여러 개 선택하면 함께 계산합니다):",
         ["H1", "L1"],
-        index=0
+        default=["H1"]
     )
 
     try:
         start_gps_time = int(gps_time_input)
         custom_segment = Segment(start_gps_time, start_gps_time + custom_duration)
-        if st.button(f"지정된 시간 ({detector_custom}) 데이터 로드 및 시각화"):
-            load_and_visualize(detector_custom, custom_segment)
+        if st.button(f"지정된 시간 ({', '.join(detectors_custom)}) 데이터 로드 및 시각화", disabled=not detectors_custom):
+            if streaming:
+                visualize_streaming(detectors_custom, custom_segment)
+            else:
+                load_and_visualize(detectors_custom, custom_segment)
     except ValueError:
         st.error("유효한 GPS 시간을 입력해주세요.")
 
+else: # 매치드 필터 이벤트 검색
+    st.subheader("C. 매치드 필터 이벤트 검색")
+    st.info("지정한 구간의 strain을 chirp 템플릿 뱅크와 비교해서 SNR이 높은 후보(트리거)를 찾습니다. 후보를 선택하면 해당 시점 주변 데이터를 바로 볼 수 있습니다.")
 
----
-
-## 2. 데이터 로드 및 시각화 함수
+    search_gps_input = st.text_input(
+        "검색 시작 GPS 시간 (초):",
+        value="1126259300" # GW150914 이벤트 근처
+    )
+    search_duration = st.slider(
+        "검색 기간 (초):",
+        min_value=64,
+        max_value=3600,
+        value=256,
+        step=64
+    )
+    search_detector = st.selectbox("탐지기를 선택하세요:", ["H1", "L1"], index=0, key="search_detector")
+    snr_threshold = st.slider("SNR 임계값:", min_value=5.0, max_value=20.0, value=8.0, step=0.5)
 
-def load_and_visualize(detector, segment):
-    st.info(f"{detector} 데이터 로드 중 (시작: {segment.start}, 기간: {segment.duration}초)... 잠시 기다려주세요. 이 과정은 네트워크 상태에 따라 시간이 걸릴 수 있습니다.")
     try:
-        # GWOSC에서 데이터 스트레인(strain)을 가져옵니다.
-        # 이 과정은 네트워크 상태에 따라 시간이 걸릴 수 있습니다.
-        strain = TimeSeries.fetch_open_data(detector, segment.active[0].start, segment.active[0].duration, cache=True)
-
-        st.success(f"{detector} 데이터 로드 완료! 총 {len(strain)} 샘플, {strain.duration:.2f} 초 데이터.")
-
-        # 1. 시간 영역 파형 시각화
-        st.subheader(f"{detector} - 시간 영역 파형")
-        fig_waveform = strain.plot(figsize=(10, 4), color='teal', title=f"{detector} Strain Data")
-        fig_waveform.set_xlabel("Time (s)")
-        fig_waveform.set_ylabel("Strain")
-        st.pyplot(fig_waveform)
-
-        # 2. 파워 스펙트럼 밀도 (PSD) 시각화
-        st.subheader(f"{detector} - 파워 스펙트럼 밀도 (PSD)")
-        # PSD 계산을 위한 FFT 길이 및 오버랩 설정
-        fftlength = min(4, strain.duration / 2) # 데이터 길이에 따라 조정
-        if fftlength < 1: # 데이터가 너무 짧으면 PSD 계산 어려움
-            st.warning("데이터 길이가 너무 짧아 PSD를 정확히 계산하기 어렵습니다. 더 긴 기간을 선택해주세요.")
-            return
+        search_start = int(search_gps_input)
+        if st.button(f"{search_detector} {search_duration}초 구간 검색"):
+            with st.spinner("매치드 필터 검색 중..."):
+                st.session_state["triggers"] = run_search(search_detector, search_start, search_start + search_duration, snr_threshold)
+    except ValueError:
+        st.error("유효한 GPS 시간을 입력해주세요.")
+    except Exception as e:
+        st.session_state.pop("triggers", None)
+        st.error(f"데이터를 로드하거나 검색하는 중 오류가 발생했습니다: {e}")
 
-        psd = strain.psd(fftlength=fftlength, overlap=fftlength/2, window='hann')
-        fig_psd = psd.plot(figsize=(10, 4), color='purple', title=f"{detector} Power Spectral Density")
-        fig_psd.set_xlabel("Frequency (Hz)")
-        fig_psd.set_ylabel("ASD (Hz$^{-1/2}$)")
-        fig_psd.set_xscale("log")
-        fig_psd.set_yscale("log")
-        st.pyplot(fig_psd)
-
-        # 3. 스펙트로그램 시각화 (시간-주파수 플롯)
-        st.subheader(f"{detector} - 스펙트로그램")
-        # 스펙트로그램 계산 및 플롯
-        specgram_fft_length = min(1, strain.duration / 4) # 스펙트로그램 FFT 길이
-        if specgram_fft_length < 0.1: # 너무 짧으면 계산 어려움
-             st.warning("데이터 길이가 너무 짧아 스펙트로그램을 정확히 계산하기 어렵습니다. 더 긴 기간을 선택해주세요.")
-             return
-             
-        specgram = strain.spectrogram(fftlength=specgram_fft_length, overlap=0.5, window='hann', frequency_resolution=1)
-        # vmax 값을 조정하여 시각화 범위를 최적화할 수 있습니다.
-        plot_spec = specgram.plot(figsize=(10, 6), cmap='viridis', vmin=1e-24, vmax=1e-20)
-        plot_spec.colorbar(label='Strain (Hz$^{-1/2}$)')
-        plot_spec.axes[0].set_yscale('log')
-        plot_spec.axes[0].set_ylim(20, 1024) # 중력파 신호가 주로 나타나는 주파수 범위
-        plot_spec.axes[0].set_title(f"{detector} Spectrogram")
-        st.pyplot(plot_spec)
+    triggers = st.session_state.get("triggers")
+    if triggers is not None:
+        if not triggers:
+            st.warning("임계값을 넘는 트리거가 없습니다. 임계값을 낮추거나 다른 구간을 검색해보세요.")
+        else:
+            st.dataframe(
+                [{"순위": i + 1, "GPS 시간": f"{t.time:.3f}", "SNR": round(t.snr, 2), "Chirp mass (M☉)": round(t.chirp_mass, 2)}
+                 for i, t in enumerate(triggers[:50])],
+                hide_index=True
+            )
+            picked = st.selectbox(
+                "자세히 볼 트리거:",
+                range(min(len(triggers), 50)),
+                format_func=lambda i: f"#{i + 1}  t={triggers[i].time:.3f}  SNR={triggers[i].snr:.1f}"
+            )
+            if st.button("선택한 트리거로 이동"):
+                center = triggers[picked].time
+                load_and_visualize([search_detector], Segment(int(center) - 16, int(center) + 16))
 
-    except Exception as e:
-        st.error(f"데이터를 로드하거나 처리하는 중 오류가 발생했습니다: {e}")
-        st.info("GWOSC에서 데이터를 가져오는 데 시간이 걸리거나 네트워크 문제일 수 있습니다. 선택한 기간이 너무 길거나, 해당 시간에 데이터가 없을 수도 있습니다.")
-        st.info("특정 이벤트의 정확한 시간 범위는 GWOSC 웹사이트에서 확인해주세요.")
+# METRICS_ENABLED=1이면 사이드바에서 이 세션의 단계별 처리 시간을 볼 수 있습니다.
+debug_panel()
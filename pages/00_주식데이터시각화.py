@@ -1,52 +1,58 @@
 import streamlit as st
-import yfinance as yf
-import pandas as pd
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
 
+from figure_cache import get_shared_cache
+from indicators import IndicatorEngine
+from lazy_imports import lazy_import, start_warm_up
+from metrics import debug_panel
+from price_matrix import cumulative_returns, rebase, to_wide
+from prefetch import data_version, get_prices, start_prefetch
+from tickers import TICKERS
+
+# plotly는 그림을 새로 만들 때(그림 캐시에 없을 때)만 불러옵니다.
+go = lazy_import("plotly.graph_objects")
+start_warm_up()
+# PRICE_PREFETCH=1이면 백그라운드에서 주가 저장소를 미리 갱신합니다.
+start_prefetch()
+
 st.set_page_config(layout="wide")
 
 st.title("글로벌 시총 상위 10개 기업 주가 변화 시각화")
 st.markdown("최근 3년간 글로벌 시가총액 상위 기업들의 주가 변화를 시각화합니다.")
 
-# 현재 시점에서 글로벌 시가총액 상위 기업 (변동될 수 있음)
-# 실제 시총 상위 기업 목록은 수시로 변동되므로, 이 목록은 예시입니다.
-# 더 정확한 최신 목록을 원하시면 별도의 API나 웹 스크래핑이 필요합니다.
-TICKERS = {
-    "AAPL": "Apple",
-    "MSFT": "Microsoft",
-    "NVDA": "NVIDIA",
-    "GOOGL": "Alphabet (Google) A",
-    "AMZN": "Amazon",
-    "META": "Meta Platforms",
-    "TSLA": "Tesla",
-    "BRK-A": "Berkshire Hathaway A", # A주 (매우 비쌈)
-    "LLY": "Eli Lilly",
-    "AVGO": "Broadcom"
+# 표시할 값: 화면 표시 이름 -> (지표 이름, y축 제목). 지표 이름이 None이면 주가 그대로.
+VIEWS = {
+    "주가": (None, "주가 (USD)"),
+    "누적 수익률": ("cumulative", "시작점 대비 누적 수익률"),
+    "50일 이동평균": ("sma_50", "50일 이동평균 (USD)"),
+    "200일 이동평균": ("sma_200", "200일 이동평균 (USD)"),
+    "RSI (14일)": ("rsi", "RSI"),
+    "최고점 대비 낙폭": ("drawdown", "최고점 대비 낙폭"),
 }
 
 @st.cache_data
-def get_stock_data(tickers_dict, years=3):
+def get_stock_data(tickers_dict, years=3, version=0):
     """
     지정된 티커 목록에 대해 지난 N년 동안의 주가 데이터를 가져옵니다.
+    version: 백그라운드 갱신 스냅샷 버전. 새 스냅샷이 생기면 캐시를 새로 만듭니다.
     """
     end_date = datetime.now()
     start_date = end_date - timedelta(days=years * 365) # 대략 3년 전
 
-    all_data = pd.DataFrame()
-    for ticker, name in tickers_dict.items():
-        try:
-            data = yf.download(ticker, start=start_date, end=end_date)
-            if not data.empty:
-                data['Ticker'] = ticker
-                data['Company'] = name
-                all_data = pd.concat([all_data, data[['Adj Close', 'Ticker', 'Company']]])
-        except Exception as e:
-            st.warning(f"Error downloading data for {name} ({ticker}): {e}")
-    return all_data
-
-# 주가 데이터 가져오기
-df_stocks = get_stock_data(TICKERS, years=3)
+    # 백그라운드 갱신 스냅샷이 있으면 그대로 쓰고, 없으면 로컬 저장소에 없는 구간만 여러 티커를 묶어 한 번에 요청합니다.
+    # 결과는 날짜 x 티커 형태의 가격 행렬로 한 번만 만들어 캐시합니다.
+    frames, errors = get_prices(list(tickers_dict), start_date, end_date)
+    for ticker, e in errors.items():
+        st.warning(f"Error downloading data for {tickers_dict[ticker]} ({ticker}): {e}")
+    return to_wide(frames, "Adj Close")
+
+@st.cache_resource
+def get_indicator_engine(name):
+    """세션들이 함께 쓰는 지표 엔진. 새 봉이 덧붙은 데이터가 오면 그만큼만 증분 계산합니다."""
+    return IndicatorEngine()
+
+# 주가 데이터 가져오기 (날짜 x 티커 행렬)
+df_stocks = get_stock_data(TICKERS, years=3, version=data_version())
 
 if not df_stocks.empty:
     st.subheader("주가 추이")
@@ -64,55 +70,80 @@ if not df_stocks.empty:
             default=list(TICKERS.keys())
         )
 
+    # 데이터를 받지 못한 종목은 제외합니다.
+    selected_tickers = [t for t in selected_tickers if t in df_stocks.columns]
+
     if selected_tickers:
-        filtered_df = df_stocks[df_stocks['Ticker'].isin(selected_tickers)].copy()
+        view = st.selectbox("표시할 값:", list(VIEWS))
+        indicator, y_axis_title = VIEWS[view]
 
         # 주가 데이터 정규화 (선택 사항: 주가 시작점을 100으로 설정)
-        normalize = st.checkbox("주가 정규화 (시작점 100)", value=False)
+        normalize = indicator is None and st.checkbox("주가 정규화 (시작점 100)", value=False)
 
         if normalize:
-            # 각 종목별로 첫 번째 'Adj Close' 값을 찾아서 나누기
-            normalized_data = pd.DataFrame()
-            for ticker in selected_tickers:
-                ticker_df = filtered_df[filtered_df['Ticker'] == ticker].copy()
-                if not ticker_df.empty:
-                    initial_price = ticker_df['Adj Close'].iloc[0]
-                    if initial_price != 0:
-                        ticker_df['Adj Close Normalized'] = (ticker_df['Adj Close'] / initial_price) * 100
-                    else:
-                        ticker_df['Adj Close Normalized'] = 0 # 0으로 나누는 경우 방지
-                    normalized_data = pd.concat([normalized_data, ticker_df])
-            plot_column = 'Adj Close Normalized'
             y_axis_title = '정규화된 주가 (시작점 100)'
-        else:
-            plot_column = 'Adj Close'
-            y_axis_title = '주가 (USD)'
 
-        fig = go.Figure()
+        # 모든 종목의 지표를 한 번에 계산해 두고, 새 봉이 덧붙은 경우에는 증분으로만 갱신합니다.
+        indicators = get_indicator_engine("top10").sync(df_stocks)
 
-        for ticker in selected_tickers:
-            company_df = filtered_df[filtered_df['Ticker'] == ticker]
+        def build_figure():
             if normalize:
-                 # 정규화된 데이터가 없으면 건너뛰기
-                if 'Adj Close Normalized' not in company_df.columns or company_df['Adj Close Normalized'].empty:
-                    continue
-            
-            fig.add_trace(go.Scatter(
-                x=company_df.index,
-                y=company_df[plot_column],
-                mode='lines',
-                name=f"{TICKERS[ticker]} ({ticker})"
-            ))
-
-        fig.update_layout(
-            title="글로벌 시총 상위 기업 주가 추이",
-            xaxis_title="날짜",
-            yaxis_title=y_axis_title,
-            hovermode="x unified",
-            legend_title="기업",
-            height=600
-        )
-        st.plotly_chart(fig, use_container_width=True)
+                # 모든 종목의 시작점을 한 번의 벡터 연산으로 100에 맞춥니다.
+                plot_df = rebase(df_stocks[selected_tickers], base=100)
+            elif indicator == "cumulative":
+                plot_df = cumulative_returns(df_stocks[selected_tickers])
+            elif indicator is not None:
+                plot_df = indicators.frames[indicator][selected_tickers]
+            else:
+                plot_df = df_stocks[selected_tickers]
+
+            fig = go.Figure()
+
+            # 종목별 마스킹 없이 행렬의 컬럼을 그대로 트레이스로 사용합니다.
+            x = plot_df.index
+            for ticker in plot_df.columns:
+                fig.add_trace(go.Scatter(
+                    x=x,
+                    y=plot_df[ticker].to_numpy(),
+                    mode='lines',
+                    name=f"{TICKERS[ticker]} ({ticker})"
+                ))
+
+            fig.update_layout(
+                title=f"글로벌 시총 상위 기업 {view} 추이",
+                xaxis_title="날짜",
+                yaxis_title=y_axis_title,
+                hovermode="x unified",
+                legend_title="기업",
+                height=600
+            )
+            if indicator == "rsi":
+                # 일반적인 과매수(70)/과매도(30) 기준선
+                for level in (30, 70):
+                    fig.add_hline(y=level, line_dash="dot", line_color="gray")
+            elif indicator in ("drawdown", "cumulative"):
+                fig.update_yaxes(tickformat=".0%")
+            return fig
+
+        # 같은 데이터/선택/정규화 조합의 그림은 직렬화된 JSON을 그대로 다시 사용합니다.
+        figure_key = ("top10", tuple(selected_tickers), view, normalize, df_stocks.index[-1], df_stocks.shape,
+                      data_version())
+        st.plotly_chart(get_shared_cache().plotly(figure_key, build_figure), use_container_width=True)
+
+        if len(selected_tickers) > 1:
+            with st.expander("종목 간 상관계수 (최근 60거래일 일간 로그 수익률)"):
+                def build_correlation_figure():
+                    corr = indicators.correlation.loc[selected_tickers, selected_tickers]
+                    fig = go.Figure(go.Heatmap(
+                        z=corr.to_numpy(), x=list(corr.columns), y=list(corr.index),
+                        zmin=-1, zmax=1, colorscale="RdBu", reversescale=True,
+                        text=corr.round(2).to_numpy(), texttemplate="%{text}",
+                    ))
+                    fig.update_layout(height=500, yaxis_autorange="reversed")
+                    return fig
+
+                corr_key = ("top10-corr", tuple(selected_tickers), df_stocks.index[-1], df_stocks.shape, data_version())
+                st.plotly_chart(get_shared_cache().plotly(corr_key, build_correlation_figure), use_container_width=True)
 
     else:
         st.info("시각화할 기업을 하나 이상 선택해주세요.")
@@ -122,3 +153,6 @@ else:
 
 st.markdown("---")
 st.markdown("Made with ❤️ using Streamlit, yfinance, and Plotly.")
+
+# METRICS_ENABLED=1이면 사이드바에서 이 세션의 단계별 처리 시간을 볼 수 있습니다.
+debug_panel()
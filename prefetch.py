@@ -0,0 +1,255 @@
+"""
+주가 저장소를 백그라운드에서 미리 갱신하는 스케줄러.
+
+- 서버 옆의 워커 스레드가 `tickers.UNIVERSE`(시총 상위 10개 + ASML)를 정해진 간격마다,
+  그리고 미국 장 마감(뉴욕 16:00) 30분 뒤에 갱신합니다 (`price_store.MARKET_CLOSE` + `PUBLISH_DELAY`).
+- 마감된 거래일(`price_store.last_closed_session`)까지만 요청하므로, 장중에 돌아도 일부 봉을 받지 않습니다.
+- 종목을 묶음(batch)으로 나눠 동시에 최대 `max_concurrency`개 요청만 보내고,
+  실패한 종목은 지수 백오프(+지터)로 몇 번 다시 시도합니다.
+- 한 번의 갱신이 끝나면 전체 종목의 DataFrame을 새 스냅샷으로 만든 뒤 참조 하나만 바꿔 끼웁니다.
+  페이지는 `get_prices()`로 이 스냅샷을 읽으므로, 요청 경로에서 네트워크(yfinance)를 기다리지 않습니다.
+- `PRICE_PREFETCH=1`일 때만 켜집니다. 꺼져 있거나, 아직 첫 갱신 전이거나, 스냅샷이 요청 구간의 시작을
+  덮지 못하면 `get_prices()`는 예전처럼 `PriceStore().get()`으로 동작합니다.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from lazy_imports import lazy_import
+from metrics import span
+from price_store import MARKET_CLOSE, MARKET_TZ, PriceStore, covers_start, last_closed_session
+from tickers import UNIVERSE
+
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+# 장 마감 뒤 그날의 봉이 공급자에 반영될 시간을 조금 둡니다.
+PUBLISH_DELAY = timedelta(minutes=30)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    version: int
+    refreshed_at: datetime
+    frames: dict = field(default_factory=dict)   # 티커 -> 저장된 전체 기간 DataFrame
+    errors: dict = field(default_factory=dict)   # 티커 -> 마지막 시도의 예외
+
+
+def next_market_close(now):
+    """`now` 이후 가장 가까운 평일의 장 마감 후 갱신 시각 (뉴욕 시간 기준, 마감 + `PUBLISH_DELAY`)."""
+    local = now.astimezone(MARKET_TZ)
+    candidate = datetime.combine(local.date(), MARKET_CLOSE, MARKET_TZ) + PUBLISH_DELAY
+    if candidate <= local:
+        candidate += timedelta(days=1)
+    while candidate.weekday() >= 5:
+        candidate += timedelta(days=1)
+    return candidate
+
+
+def next_run(now, interval):
+    """다음 갱신 시각: 일정 간격과 다음 장 마감 중 더 이른 쪽."""
+    return min(now + interval, next_market_close(now))
+
+
+class PrefetchScheduler:
+    def __init__(self, universe=None, store=None, interval=timedelta(hours=6), max_concurrency=4,
+                 batch_size=5, max_retries=3, backoff=2.0, max_backoff=60.0):
+        self.universe = dict(universe or UNIVERSE)
+        self.store = store or PriceStore()
+        self.interval = interval
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._snapshot = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self.next_run_at = None
+        self.last_error = None   # 마지막으로 통째로 실패한 갱신의 예외 (성공하면 None)
+
+    def snapshot(self):
+        """현재 스냅샷 (첫 갱신 전이면 None). 참조 하나를 읽을 뿐이므로 잠금이 필요 없습니다."""
+        return self._snapshot
+
+    @property
+    def version(self):
+        snapshot = self._snapshot
+        return snapshot.version if snapshot is not None else 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="price-prefetch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def trigger(self):
+        """다음 예정 시각을 기다리지 않고 바로 갱신합니다."""
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_all()
+                self.last_error = None
+            except Exception as e:
+                # 한 번의 갱신이 통째로 실패해도 스케줄러는 계속 돌고, 기존 스냅샷을 그대로 씁니다.
+                logger.exception("주가 미리 갱신에 실패했습니다. 기존 스냅샷을 계속 씁니다.")
+                self.last_error = e
+            now = datetime.now(MARKET_TZ)
+            self.next_run_at = next_run(now, self.interval)
+            self._wake.wait(max(0.0, (self.next_run_at - now).total_seconds()))
+            self._wake.clear()
+
+    def _batches(self):
+        # 같은 기간을 쓰는 종목끼리 묶어서 배치 요청 한 번으로 받습니다.
+        by_years = {}
+        for ticker, years in self.universe.items():
+            by_years.setdefault(years, []).append(ticker)
+        for years, tickers in by_years.items():
+            for i in range(0, len(tickers), self.batch_size):
+                yield years, tickers[i:i + self.batch_size]
+
+    def _refresh_batch(self, years, tickers):
+        """한 묶음을 갱신합니다. 실패한 종목만 백오프하며 다시 시도합니다. 반환값: 티커 -> 예외"""
+        # 마감된 거래일까지만 받습니다. 장중의 일부 봉은 페이지가 직접 저장소를 갱신할 때만 받습니다.
+        end = last_closed_session() + pd.Timedelta(days=1)
+        start = end - pd.Timedelta(days=years * 365 + 1)
+        pending, errors = list(tickers), {}
+        for attempt in range(self.max_retries + 1):
+            try:
+                errors = self.store.refresh(pending, start, end)
+            except Exception as e:
+                errors = {ticker: e for ticker in pending}
+            pending = [t for t in pending if t in errors]
+            if not pending or attempt == self.max_retries:
+                break
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+            if self._stop.wait(delay):
+                break
+        return {t: errors[t] for t in pending}
+
+    def refresh_all(self):
+        """전체 종목을 갱신하고 새 스냅샷으로 바꿔 끼웁니다. 반환값: 새 스냅샷"""
+        with span("prefetch.refresh_all") as s:
+            errors = {}
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                futures = [pool.submit(self._refresh_batch, years, batch) for years, batch in self._batches()]
+                for future in futures:
+                    errors.update(future.result())
+
+            # 새 스냅샷을 완전히 만든 다음에 참조만 교체하므로, 읽는 쪽은 항상 한 시점의 데이터만 봅니다.
+            previous = self._snapshot
+            frames = {}
+            for ticker in self.universe:
+                frame = self.store.load(ticker)
+                if frame is not None:
+                    frames[ticker] = frame
+                elif previous is not None and ticker in previous.frames:
+                    frames[ticker] = previous.frames[ticker]
+            self._snapshot = Snapshot(self.version + 1, datetime.now(MARKET_TZ), frames, errors)
+            s.add(rows=sum(len(f) for f in frames.values()))
+        return self._snapshot
+
+
+_scheduler = None
+_scheduler_guard = threading.Lock()
+
+
+def start_prefetch(force=False, **kwargs):
+    """
+    프로세스 전체가 함께 쓰는 스케줄러를 시작합니다 (한 번만).
+    `PRICE_PREFETCH=1`이 아니면(또는 force=False이면) 아무것도 하지 않고 None을 돌려줍니다.
+    """
+    global _scheduler
+    if not (force or os.environ.get("PRICE_PREFETCH") == "1"):
+        return _scheduler
+    with _scheduler_guard:
+        if _scheduler is None:
+            if "interval" not in kwargs and os.environ.get("PRICE_PREFETCH_INTERVAL"):
+                kwargs["interval"] = timedelta(seconds=float(os.environ["PRICE_PREFETCH_INTERVAL"]))
+            _scheduler = PrefetchScheduler(**kwargs).start()
+    return _scheduler
+
+
+def data_version():
+    """페이지 캐시 키에 넣을 데이터 버전. 스냅샷이 바뀔 때마다 증가합니다 (스케줄러가 없으면 0)."""
+    return _scheduler.version if _scheduler is not None else 0
+
+
+def get_prices(tickers, start, end):
+    """
+    [start, end) 구간의 주가. 반환값: (티커 -> DataFrame 딕셔너리, 티커 -> 예외 딕셔너리)
+    스냅샷에 모든 종목이 `start`부터 있으면 메모리에서 잘라서 돌려주고, 아니면 저장소(필요하면 네트워크)에서 가져옵니다.
+    """
+    snapshot = _scheduler.snapshot() if _scheduler is not None else None
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    if snapshot is not None and all(t in snapshot.frames and covers_start(snapshot.frames[t], start) for t in tickers):
+        frames = {}
+        for ticker in tickers:
+            frame = snapshot.frames[ticker]
+            frames[ticker] = frame.loc[(frame.index >= start) & (frame.index < end)]
+        return frames, {}
+    return PriceStore().get(tickers, start, end)
+
+
+if __name__ == "__main__":
+    # 업스트림 지연(요청당 0.3초)과 간헐적 실패가 있을 때 동시성/백오프에 따른 갱신 시간,
+    # 그리고 스냅샷을 읽는 요청 경로의 지연 시간 측정
+    import tempfile
+
+    import numpy as np
+
+    from stock_fetch import FakePriceProvider
+
+    class FlakyProvider(FakePriceProvider):
+        """처음 몇 번의 요청은 실패하는 가짜 공급자."""
+
+        def __init__(self, fail_first, **kwargs):
+            super().__init__(**kwargs)
+            self.fail_first = fail_first
+
+        def download(self, tickers, start, end):
+            # 여러 스레드가 동시에 부르므로 실패 횟수도 공급자의 호출 수 잠금 안에서 셉니다.
+            with self._calls_lock:
+                fail = self.calls < self.fail_first
+                if fail:
+                    self.calls += 1
+            if fail:
+                raise ConnectionError("rate limited")
+            return super().download(tickers, start, end)
+
+    for label, concurrency, fail_first in (("serial", 1, 0), ("concurrent", 4, 0), ("concurrent+flaky", 4, 3)):
+        with tempfile.TemporaryDirectory() as tmp:
+            provider = FlakyProvider(fail_first, latency=0.3, supports_batch=True)
+            scheduler = PrefetchScheduler(store=PriceStore(tmp, provider), max_concurrency=concurrency,
+                                          batch_size=2, backoff=0.2)
+            t0 = time.perf_counter()
+            snapshot = scheduler.refresh_all()
+            elapsed = time.perf_counter() - t0
+            print(f"{label:>17}: cycle {elapsed:5.2f} s, {provider.calls:2d} upstream calls, "
+                  f"{len(snapshot.frames)}/{len(scheduler.universe)} tickers, errors {list(snapshot.errors)}")
+
+            _scheduler = scheduler
+            latencies = []
+            for _ in range(1000):
+                t0 = time.perf_counter()
+                get_prices(list(UNIVERSE)[:10], pd.Timestamp.today() - pd.Timedelta(days=3 * 365), pd.Timestamp.today())
+                latencies.append(time.perf_counter() - t0)
+            _scheduler = None
+            latencies = np.array(latencies) * 1000
+            print(f"{'':>17}  request path p50 {np.percentile(latencies, 50):.2f} ms, "
+                  f"p99 {np.percentile(latencies, 99):.2f} ms (upstream latency 300 ms)")
@@ -0,0 +1,106 @@
+"""
+날짜 x 티커 형태의 넓은(wide) 가격 행렬과, 모든 컬럼에 한 번에 적용되는 벡터화 변환 함수들.
+
+티커마다 마스킹/복사/concat 하는 대신 NumPy 연산 한 번으로 전체 종목을 처리합니다.
+"""
+import numpy as np
+
+from lazy_imports import lazy_import
+from metrics import span
+
+pd = lazy_import("pandas")
+
+
+def to_wide(frames, column="Adj Close"):
+    """티커 -> DataFrame 딕셔너리를 날짜 x 티커 행렬로 만듭니다."""
+    if not frames:
+        return pd.DataFrame(dtype=float)
+    with span("prices.to_wide") as s:
+        wide = pd.concat({ticker: frame[column] for ticker, frame in frames.items()}, axis=1, sort=False)
+        wide = wide.sort_index().astype(float)
+        s.add(rows=wide.size)
+    return wide
+
+
+def _first_valid(values):
+    """컬럼별 첫 번째 유효값 (상장일이 다른 종목도 각자의 시작점을 기준으로 삼습니다)."""
+    idx = np.argmax(~np.isnan(values), axis=0)
+    return values[idx, np.arange(values.shape[1])]
+
+
+def rebase(wide, base=100.0):
+    """각 종목의 시작점을 `base`로 맞춥니다. 시작값이 0이면 0으로 둡니다."""
+    with span("prices.rebase") as s:
+        values = wide.to_numpy(dtype=float)
+        first = _first_valid(values)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out = np.where(first != 0, values / first * base, 0.0)
+        out[np.isnan(values)] = np.nan
+        s.add(rows=values.size)
+    return pd.DataFrame(out, index=wide.index, columns=wide.columns)
+
+
+def log_returns(wide):
+    values = wide.to_numpy(dtype=float)
+    out = np.full_like(values, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[1:] = np.log(values[1:] / values[:-1])
+    return pd.DataFrame(out, index=wide.index, columns=wide.columns)
+
+
+def cumulative_returns(wide):
+    """시작점 대비 누적 수익률 (0.1 = +10%)."""
+    return rebase(wide, base=1.0) - 1.0
+
+
+def rolling_stats(wide, window=20):
+    """모든 종목의 이동평균과 이동표준편차를 누적합으로 한 번에 계산합니다."""
+    values = wide.to_numpy(dtype=float)
+    n = len(values)
+    mean = np.full_like(values, np.nan)
+    std = np.full_like(values, np.nan)
+    if n >= window:
+        filled = np.nan_to_num(values)
+        valid = (~np.isnan(values)).astype(float)
+        zero = np.zeros((1, values.shape[1]))
+        s1 = np.concatenate([zero, np.cumsum(filled, axis=0)])
+        s2 = np.concatenate([zero, np.cumsum(filled ** 2, axis=0)])
+        cnt = np.concatenate([zero, np.cumsum(valid, axis=0)])
+        w1 = s1[window:] - s1[:-window]
+        w2 = s2[window:] - s2[:-window]
+        full = (cnt[window:] - cnt[:-window]) == window
+        m = w1 / window
+        var = np.maximum(w2 / window - m ** 2, 0.0) * window / max(window - 1, 1)
+        mean[window - 1:] = np.where(full, m, np.nan)
+        std[window - 1:] = np.where(full, np.sqrt(var), np.nan)
+    return (pd.DataFrame(mean, index=wide.index, columns=wide.columns),
+            pd.DataFrame(std, index=wide.index, columns=wide.columns))
+
+
+if __name__ == "__main__":
+    # 종목 수에 따른 rerun 한 번의 비용: 행렬 변환(벡터화)과 Plotly 트레이스 생성/직렬화 (3년치 일봉)
+    import time
+
+    import plotly.graph_objects as go
+
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range("2022-01-03", periods=780, name="Date")
+    for n in (10, 100, 500):
+        frames = {f"T{i:03d}": pd.DataFrame({"Adj Close": 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(index))))},
+                                            index=index) for i in range(n)}
+        t0 = time.perf_counter()
+        wide = to_wide(frames)
+        t1 = time.perf_counter()
+        rebase(wide)
+        cumulative_returns(wide)
+        log_returns(wide)
+        rolling_stats(wide)
+        t2 = time.perf_counter()
+        fig = go.Figure()
+        for ticker in wide.columns:
+            fig.add_trace(go.Scatter(x=wide.index, y=wide[ticker].to_numpy(), mode="lines", name=ticker))
+        t3 = time.perf_counter()
+        payload = fig.to_json()
+        t4 = time.perf_counter()
+        print(f"{n:4d} tickers: to_wide {(t1 - t0) * 1000:6.1f} ms, rebase+returns+rolling {(t2 - t1) * 1000:6.1f} ms, "
+              f"traces {(t3 - t2) * 1000:6.1f} ms, to_json {(t4 - t3) * 1000:6.1f} ms ({len(payload) / 2**20:.1f} MiB)")
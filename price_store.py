@@ -0,0 +1,244 @@
+"""
+티커별 OHLCV 데이터를 디스크(Parquet)에 저장해 두는 로컬 가격 저장소.
+
+저장된 마지막 날짜 이후의 봉만 새로 받아서 덧붙이므로, 프로세스를 재시작해도
+디스크에서 바로 읽고 업스트림(yfinance)에는 변경분(delta) 요청만 보냅니다.
+장 마감 전에 저장된 마지막 봉(장중의 일부 봉)은 다음 갱신 때 다시 받아서 덮어쓰고,
+새 거래일이 없는 구간(주말)이나 방금 빈 응답을 받은 구간은 요청하지 않습니다.
+앞/뒤 구간을 받을 때는 저장된 첫/마지막 봉을 겹쳐서 함께 받습니다. 공급자의 종가/수정 종가는 분할과 배당이
+있을 때마다 과거 봉까지 다시 조정되므로, 겹친 봉의 값이 저장된 값과 다르면 저장된 이력을 버리고 전체를 다시 받습니다.
+여러 세션이 같은 종목/구간을 동시에 갱신하면 `SingleFlight`로 합쳐서 요청 한 번의 결과를 함께 씁니다.
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from datetime import time as dtime
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from lazy_imports import lazy_import
+from metrics import span
+from stock_fetch import download_many
+from upstream import SingleFlight
+
+pd = lazy_import("pandas")
+
+DEFAULT_ROOT = Path(os.environ.get("PRICE_STORE_DIR", Path(__file__).parent / "data" / "prices"))
+
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_CLOSE = dtime(16, 0)
+# 겹쳐 받은 봉의 종가/수정 종가가 이보다 크게(상대 오차) 다르면 수정주가 기준이 바뀐 것으로 봅니다.
+ADJUSTMENT_TOLERANCE = 1e-4
+
+# 페이지는 요청마다 PriceStore를 새로 만들므로, 진행 중인 갱신은 프로세스 전체에서 공유합니다.
+_flights = SingleFlight()
+# (저장소, 티커) -> 마지막으로 빈 응답을 받은 뒤쪽 요청 구간. 휴장일에 같은 요청을 되풀이하지 않습니다.
+# 최근에 쓴 `EMPTY_TAIL_ENTRIES`개만 기억합니다 (LRU). 잊은 티커는 한 번 더 요청할 뿐입니다.
+EMPTY_TAIL_ENTRIES = 1024
+_empty_tail = OrderedDict()
+_empty_tail_guard = threading.Lock()
+
+
+def _empty_tail_get(key):
+    with _empty_tail_guard:
+        value = _empty_tail.get(key)
+        if value is not None:
+            _empty_tail.move_to_end(key)
+        return value
+
+
+def _empty_tail_set(key, value):
+    with _empty_tail_guard:
+        _empty_tail[key] = value
+        _empty_tail.move_to_end(key)
+        while len(_empty_tail) > EMPTY_TAIL_ENTRIES:
+            _empty_tail.popitem(last=False)
+
+
+def last_closed_session(now=None):
+    """
+    장이 마감된 가장 최근 평일 (뉴욕 시간 기준). 이 날짜까지의 봉은 확정된 값입니다.
+    거래소 휴장일(공휴일)은 고려하지 않으므로 휴장일도 마감된 거래일로 봅니다. 그날의 봉을 요청해 빈 응답을 받으면
+    `_empty_tail`에 기록해 두고 같은 요청을 되풀이하지 않습니다.
+    """
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    day = pd.Timestamp(now.date())
+    if now.time() < MARKET_CLOSE:
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def _has_sessions(start, end):
+    """[start, end) 구간에 평일이 하루라도 있는지."""
+    return start < end and len(pd.bdate_range(start, end, inclusive="left")) > 0
+
+
+def coverage_start(frame):
+    """
+    저장된 데이터가 덮는 첫 날짜. 상장일 이전처럼 원래 데이터가 없는 구간을 매번 다시 요청하지 않도록,
+    실제로 요청했던 시작일(coverage_start)을 함께 기준으로 삼습니다.
+    """
+    return min(frame.index[0], pd.Timestamp(frame.attrs.get("coverage_start", frame.index[0])))
+
+
+def covers_start(frame, start):
+    """저장된 데이터가 `start`부터 덮는지 (그 사이에 거래일이 없으면 덮는 것으로 봅니다)."""
+    first = coverage_start(frame)
+    return not (start < first and _has_sessions(start, first))
+
+
+def _same_basis(saved, fresh, day):
+    """`day`의 종가/수정 종가가 저장된 값과 같은지 (겹쳐 받은 봉이 응답에 없으면 같은 것으로 봅니다)."""
+    if day not in saved.index or day not in fresh.index:
+        return True
+    columns = [c for c in ("Close", "Adj Close") if c in saved.columns and c in fresh.columns]
+    old = saved.loc[day, columns].to_numpy(dtype=float)
+    new = fresh.loc[day, columns].to_numpy(dtype=float)
+    return np.allclose(old, new, rtol=ADJUSTMENT_TOLERANCE, atol=0.0, equal_nan=True)
+
+
+class PriceStore:
+    def __init__(self, root=DEFAULT_ROOT, provider=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.provider = provider
+        self._lock = threading.Lock()
+
+    def _path(self, ticker):
+        return self.root / f"{ticker}.parquet"
+
+    def load(self, ticker):
+        """저장된 데이터를 읽습니다. 없으면 None."""
+        path = self._path(ticker)
+        if not path.exists():
+            return None
+        with span("prices.load") as s:
+            frame = pd.read_parquet(path)
+            s.add(rows=len(frame), bytes=path.stat().st_size)
+        return frame
+
+    def save(self, ticker, frame):
+        # 임시 파일에 쓴 뒤 교체하므로, 읽는 쪽은 항상 완전한 파일만 보게 됩니다.
+        path = self._path(ticker)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        frame.to_parquet(tmp)
+        os.replace(tmp, path)
+
+    def refresh(self, tickers, start, end):
+        """
+        저장소를 [start, end) 구간까지 채웁니다.
+        이미 있는 구간은 건너뛰고, 앞/뒤로 비어 있는 구간만 요청합니다.
+        반환값: 티커 -> 예외 딕셔너리 (데이터를 전혀 얻지 못한 티커만)
+        """
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        key = (str(self.root.resolve()), tuple(sorted(tickers)), start, end)
+        # 같은 갱신을 기다린 호출들이 결과를 함께 받으므로 복사해서 돌려줍니다.
+        return dict(_flights.do(key, lambda: self._refresh(tickers, start, end)))
+
+    def _refresh(self, tickers, start, end):
+        stored = {ticker: self.load(ticker) for ticker in tickers}
+        closed = last_closed_session()
+        root = str(self.root.resolve())
+
+        # 같은 구간이 비어 있는 티커끼리 묶어서 한 번에 요청합니다.
+        requests = {}
+        overlaps = {}   # (티커, 요청 구간) -> 기준 확인용으로 겹쳐 받는 저장된 봉의 날짜
+        for ticker, frame in stored.items():
+            if frame is None or frame.empty:
+                requests.setdefault((start, end), []).append(ticker)
+                continue
+            first, last = frame.index[0], frame.index[-1]
+            if not covers_start(frame, start):
+                request = (start, first + timedelta(days=1))
+                requests.setdefault(request, []).append(ticker)
+                overlaps[(ticker, request)] = first
+            # 마지막 봉은 항상 다시 받습니다. 마감 전에 저장된 봉이면 덮어쓰고 (merge가 keep="last"),
+            # 마감된 봉이면 수정주가 기준이 바뀌었는지 확인합니다.
+            tail_start = last if last > closed else last + timedelta(days=1)
+            if _has_sessions(tail_start, end) and _empty_tail_get((root, ticker)) != (last, end):
+                request = (last, end)
+                requests.setdefault(request, []).append(ticker)
+                if last <= closed:
+                    overlaps[(ticker, request)] = last
+
+        updates, errors, stale, starts = {}, {}, {}, {}
+        # 요청할 구간이 없으면 저장소만으로 처리된 것(캐시 적중)으로 기록합니다.
+        with span("prices.refresh") as s:
+            s.cache(hit=not requests)
+            for (req_start, req_end), req_tickers in requests.items():
+                frames, failed = download_many(req_tickers, req_start, req_end, provider=self.provider)
+                for ticker, frame in frames.items():
+                    # 공급자가 요청 구간 앞의 봉을 덧붙여 돌려주기도 하므로 잘라 냅니다.
+                    frame = frame.loc[frame.index >= req_start]
+                    overlap = overlaps.get((ticker, (req_start, req_end)))
+                    if overlap is not None:
+                        if not _same_basis(stored[ticker], frame, overlap):
+                            stale[ticker] = min(start, coverage_start(stored[ticker]))
+                        frame = frame.loc[frame.index != overlap]
+                    if frame.empty:
+                        failed[ticker] = LookupError(f"{ticker} 의 새 봉이 없습니다.")
+                        continue
+                    updates.setdefault(ticker, []).append(frame)
+                    s.add(rows=len(frame))
+                for ticker, e in failed.items():
+                    # 기존 데이터가 있으면 "새 봉 없음"(휴장일, 상장 전)으로 보고 넘어갑니다.
+                    if stored.get(ticker) is None:
+                        errors[ticker] = e
+                    elif req_start < stored[ticker].index[0]:
+                        # 앞쪽 구간이 비어 있었으면 coverage_start만 갱신해 둡니다.
+                        updates.setdefault(ticker, [])
+                    else:
+                        _empty_tail_set((root, ticker), (req_start, req_end))
+
+            # 분할/배당으로 과거 봉이 다시 조정된 종목은 저장된 이력을 버리고 전체 구간을 다시 받습니다.
+            # 다시 받지 못하면 이번에는 기존 이력을 그대로 둡니다.
+            refetch = {}
+            for ticker, full_start in stale.items():
+                refetch.setdefault(full_start, []).append(ticker)
+            for full_start, req_tickers in refetch.items():
+                frames, _ = download_many(req_tickers, full_start, end, provider=self.provider)
+                for ticker, frame in frames.items():
+                    frame = frame.loc[frame.index >= full_start]
+                    if not frame.empty:
+                        stored[ticker] = None
+                        updates[ticker] = [frame]
+                        starts[ticker] = full_start
+                        s.add(rows=len(frame))
+
+        with self._lock, span("prices.merge") as s:
+            for ticker, parts in updates.items():
+                previous = stored.get(ticker)
+                coverage = starts.get(ticker, start)
+                if previous is not None:
+                    old_coverage = pd.Timestamp(previous.attrs.get("coverage_start", start))
+                    coverage = min(start, old_coverage)
+                    if not parts and coverage == old_coverage:
+                        continue
+                    parts = [previous, *parts]
+                merged = pd.concat(parts)
+                merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+                merged.attrs = {"coverage_start": coverage.isoformat()}
+                self.save(ticker, merged)
+                s.add(rows=len(merged))
+        return errors
+
+    def get(self, tickers, start, end, refresh=True):
+        """
+        [start, end) 구간의 데이터를 돌려줍니다.
+        반환값: (티커 -> DataFrame 딕셔너리, 티커 -> 예외 딕셔너리)
+        """
+        errors = self.refresh(tickers, start, end) if refresh else {}
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        frames = {}
+        for ticker in tickers:
+            frame = self.load(ticker)
+            if frame is None:
+                errors.setdefault(ticker, LookupError(f"{ticker} 에 대한 데이터가 없습니다."))
+                continue
+            frames[ticker] = frame.loc[(frame.index >= start) & (frame.index < end)]
+        return frames, errors
@@ -0,0 +1,293 @@
+"""
+모든 페이지의 헤드리스 rerun 벤치마크 (Streamlit AppTest, 완전 오프라인).
+
+- 주가는 가짜 공급자(`PRICE_PROVIDER=fake`), strain은 합성 HDF5 파일(`STRAIN_SOURCE_DIR`),
+  박물관 데이터/이미지는 합성 파일(`MUSEUM_DATA`, `IMAGE_SOURCE_DIR`)을 쓰므로 네트워크가 필요 없습니다.
+- 시나리오(페이지 x 데이터 크기)마다 새 파이썬 프로세스에서
+  콜드(빈 캐시에서 처음 실행), 웜(같은 프로세스에서 새 세션으로 같은 조작을 반복, 중앙값) 지연 시간,
+  최대 RSS, 페이로드 크기(화면 요소 protobuf + 미디어 파일 바이트)를 잽니다.
+- 저장된 기준값(`rerun_baseline.json`)과 비교해서 허용 범위를 넘으면 표시하고 종료 코드 1로 끝납니다.
+  시간 지표는 기계마다 다르고 페이지마다 늘어나는 방식도 달라서 다른 기계의 값으로 환산할 수 없으므로,
+  기준값은 기계별로(`--machine`, 기본값은 호스트 이름-아키텍처-CPU 수) 그 기계에서 여러 번 실행한 중앙값으로 저장합니다.
+  이 기계의 기준값이 없으면 기계와 관계없는 지표(메모리, 페이로드 크기)만 다른 기계의 기준값과 비교합니다.
+
+    python rerun_bench.py                              # 전체 실행 후 이 기계의 기준값과 비교
+    python rerun_bench.py --only ligo                  # 한 페이지만
+    python rerun_bench.py --update-baseline --runs 5   # 5번 실행한 중앙값을 이 기계의 기준값으로 저장
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).parent
+BASELINE_PATH = APP_DIR / "rerun_baseline.json"
+
+# 페이지 -> (파일, 데이터 크기 목록). 크기의 의미는 페이지마다 다릅니다.
+SCENARIOS = {
+    "main": ("main.py", [6, 50, 200]),                                   # 박물관 수
+    "top10": ("pages/00_주식데이터시각화.py", [1, 5, 10]),               # 선택한 종목 수
+    "asml": ("pages/00_ASML주가데이터시각화.py", [1, 5, 20]),            # 표시 구간(년)
+    "ligo": ("pages/00_LIGO data.py", [8, 32, 128]),                     # 이벤트 전후 데이터 길이(초)
+}
+WARM_REPEATS = 3
+
+# 기준값 대비 허용 범위: (비율, 절대값)
+TOLERANCE = {
+    "cold_s": (0.5, 0.25),
+    "warm_s": (0.5, 0.05),
+    "peak_rss_mib": (0.2, 20),
+    "payload_kib": (0.1, 4),
+}
+
+# 기계 속도에 따라 달라지는 지표. 같은 기계의 기준값하고만 비교합니다.
+TIMING_METRICS = ("cold_s", "warm_s")
+# 기준값을 기록할 때 시나리오마다 실행하는 횟수 (중앙값을 저장합니다)
+BASELINE_RUNS = 5
+
+GW150914 = 1126259446
+
+
+def _widget(elements, label):
+    return next(e for e in elements if e.label.startswith(label))
+
+
+def _interact(page, size, at):
+    """시나리오별 사용자 조작을 순서대로 실행합니다."""
+    at.run(timeout=600)
+    if page == "top10" and size < 10:
+        _widget(at.checkbox, "모든 기업 선택").uncheck().run(timeout=600)
+        ms = _widget(at.multiselect, "시각화할 기업")
+        ms.set_value(ms.options[:size]).run(timeout=600)
+    elif page == "asml":
+        slider = _widget(at.slider, "표시 구간")
+        first, last = slider.value
+        start = max(first, last.replace(year=last.year - size))
+        slider.set_value((start, last)).run(timeout=600)
+    elif page == "ligo":
+        _widget(at.slider, "이벤트 전후로").set_value(size).run(timeout=600)
+        at.button[0].click().run(timeout=600)
+    if at.exception:
+        raise RuntimeError(f"{page}[{size}] 실행 중 예외: {[e.message for e in at.exception]}")
+    return at
+
+
+def _payload_bytes(at):
+    total = 0
+    stack = [at._tree]
+    while stack:
+        node = stack.pop()
+        proto = getattr(node, "proto", None)
+        if proto is not None and hasattr(proto, "ByteSize"):
+            total += proto.ByteSize()
+        stack.extend(getattr(node, "children", {}).values())
+    return total
+
+
+def run_one(page, size):
+    """(하위 프로세스에서) 시나리오 하나를 실행하고 결과 dict를 돌려줍니다."""
+    import resource
+
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1 import AppTest
+
+    # st.image 등으로 보내는 미디어 파일 크기를 셉니다.
+    media = {"bytes": 0}
+    original = MemoryMediaFileStorage.load_and_get_id
+
+    def counting(self, path_or_data, *args, **kwargs):
+        if isinstance(path_or_data, (bytes, bytearray)):
+            media["bytes"] += len(path_or_data)
+        return original(self, path_or_data, *args, **kwargs)
+
+    MemoryMediaFileStorage.load_and_get_id = counting
+
+    script = str(APP_DIR / SCENARIOS[page][0])
+    t0 = time.perf_counter()
+    _interact(page, size, AppTest.from_file(script, default_timeout=600))
+    cold = time.perf_counter() - t0
+
+    warm = []
+    for _ in range(WARM_REPEATS):
+        media["bytes"] = 0
+        t0 = time.perf_counter()
+        at = _interact(page, size, AppTest.from_file(script, default_timeout=600))
+        warm.append(time.perf_counter() - t0)
+
+    return {
+        "cold_s": round(cold, 4),
+        "warm_s": round(statistics.median(warm), 4),
+        "peak_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "payload_kib": round((_payload_bytes(at) + media["bytes"]) / 1024, 1),
+    }
+
+
+def _prepare_fixtures(workdir):
+    """합성 strain 파일, 박물관 데이터, 박물관 이미지를 만들고 벤치마크용 환경 변수를 돌려줍니다."""
+    import numpy as np
+    from PIL import Image
+
+    from strain_cache import write_synthetic_files
+
+    workdir = Path(workdir)
+    for detector in ("H1", "L1"):
+        write_synthetic_files(workdir / "strain_source", detector, GW150914 - 118, 256)
+
+    images = workdir / "images"
+    images.mkdir()
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:853, 0:1280]
+    for i in range(8):
+        # 사진과 비슷하게 압축되도록 부드러운 그라디언트에 약한 잡음을 더합니다.
+        pixels = np.stack([(x + 40 * i) % 256, (y + 25 * i) % 256, (x + y) // 8 % 256], axis=-1)
+        pixels = np.clip(pixels + rng.normal(0, 6, pixels.shape), 0, 255).astype(np.uint8)
+        Image.fromarray(pixels).save(images / f"museum_{i}.jpg", quality=85)
+
+    museums = json.loads((APP_DIR / "museums.json").read_text(encoding="utf-8"))
+    template = list(museums.values())
+    for n in SCENARIOS["main"][1]:
+        data = {}
+        for i in range(n):
+            info = dict(template[i % len(template)])
+            info["lat"] += rng.uniform(-2, 2)
+            info["lon"] += rng.uniform(-2, 2)
+            # URL은 모두 다르지만 이미지 파일은 8개를 돌려 씁니다.
+            info["image"] = f"https://upload.wikimedia.org/bench/{i}/museum_{i % 8}.jpg"
+            data[f"{list(museums)[i % len(museums)]} #{i}"] = info
+        (workdir / f"museums_{n}.json").write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+    return {
+        "PRICE_PROVIDER": "fake",
+        "STRAIN_SOURCE_DIR": str(workdir / "strain_source"),
+        "IMAGE_SOURCE_DIR": str(images),
+    }
+
+
+def _scenario_env(base_env, workdir, page, size):
+    # 시나리오마다 빈 저장소에서 시작해야 콜드 시간을 잴 수 있습니다.
+    data = Path(workdir) / f"{page}_{size}"
+    return dict(base_env,
+                PRICE_STORE_DIR=str(data / "prices"),
+                STRAIN_CACHE_DIR=str(data / "strain"),
+                SPECTROGRAM_DIR=str(data / "spectrograms"),
+                THUMBNAIL_DIR=str(data / "thumbnails"))
+
+
+def _museum_env(workdir, page, size):
+    if page == "main":
+        return {"MUSEUM_DATA": str(Path(workdir) / f"museums_{size}.json")}
+    return {}
+
+
+def machine_id():
+    """기준값을 구분하는 기계 이름. 환경 변수 `RERUN_BENCH_MACHINE`로 바꿀 수 있습니다."""
+    return os.environ.get("RERUN_BENCH_MACHINE") or f"{platform.node()}-{platform.machine()}-{os.cpu_count()}cpu"
+
+
+def _median(runs):
+    """여러 번 실행한 결과의 지표별 중앙값."""
+    return {m: round(statistics.median(run[m] for run in runs), 4) for m in runs[0]}
+
+
+def _expected(baseline, machine):
+    """
+    시나리오별로 비교할 기준값. 이 기계의 기준값이 있으면 모든 지표를, 없으면 다른 기계의 기준값에서
+    기계와 관계없는 지표만 씁니다. 반환값: (시나리오 -> 지표 -> 값, 기준값을 기록한 기계 이름 또는 None)
+    """
+    machines = baseline.get("machines", {})
+    if machine in machines:
+        return machines[machine]["scenarios"], machine
+    for other in machines.values():
+        scenarios = {name: {m: v for m, v in entry.items() if m not in TIMING_METRICS}
+                     for name, entry in other["scenarios"].items()}
+        return scenarios, None
+    return {}, None
+
+
+def _regressions(result, expected):
+    flags = []
+    for metric, (ratio, absolute) in TOLERANCE.items():
+        if metric in expected and result[metric] > expected[metric] * (1 + ratio) + absolute:
+            flags.append(metric)
+    return flags
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streamlit AppTest 기반 헤드리스 rerun 벤치마크")
+    parser.add_argument("--only", choices=sorted(SCENARIOS), action="append", help="실행할 페이지 (여러 번 지정 가능)")
+    parser.add_argument("--update-baseline", action="store_true", help="결과를 이 기계의 기준값으로 저장")
+    parser.add_argument("--runs", type=int, help=f"시나리오마다 실행할 횟수 (중앙값 사용, 기본: 비교 1번, "
+                                                  f"기준값 저장 {BASELINE_RUNS}번)")
+    parser.add_argument("--machine", default=machine_id(), help="기준값을 구분하는 기계 이름")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--run-one", nargs=2, metavar=("PAGE", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_one:
+        page, size = args.run_one
+        print(json.dumps(run_one(page, int(size))))
+        return 0
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    runs = args.runs or (BASELINE_RUNS if args.update_baseline else 1)
+    results = {}
+    failed = []
+    with tempfile.TemporaryDirectory() as workdir:
+        base_env = {**os.environ, **_prepare_fixtures(workdir)}
+        for page in args.only or SCENARIOS:
+            for size in SCENARIOS[page][1]:
+                name = f"{page}[{size}]"
+                samples = []
+                for _ in range(runs):
+                    # 실행마다 빈 저장소에서 시작합니다.
+                    with tempfile.TemporaryDirectory() as rundir:
+                        proc = subprocess.run(
+                            [sys.executable, __file__, "--run-one", page, str(size)],
+                            env=_scenario_env(base_env, rundir, page, size) | _museum_env(workdir, page, size),
+                            cwd=APP_DIR, capture_output=True, text=True)
+                    if proc.returncode != 0:
+                        print(f"{name:<12} FAILED\n{proc.stderr[-2000:]}")
+                        failed.append(name)
+                        break
+                    samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+                else:
+                    result = results[name] = _median(samples)
+                    print(f"{name:<12} cold {result['cold_s']:7.3f} s  warm {result['warm_s']:7.3f} s  "
+                          f"RSS {result['peak_rss_mib']:7.1f} MiB  payload {result['payload_kib']:8.1f} KiB"
+                          + (f"  (중앙값, {runs}번)" if runs > 1 else ""))
+
+    if args.update_baseline:
+        # 이번에 실행하지 않은 시나리오와 다른 기계의 기준값은 그대로 둡니다.
+        machines = baseline.get("machines", {})
+        entry = machines.get(args.machine, {"scenarios": {}})
+        entry["scenarios"] = {**entry["scenarios"], **results}
+        entry["runs"] = runs
+        machines[args.machine] = entry
+        args.baseline.write_text(json.dumps({"machines": machines}, indent=2, sort_keys=True) + "\n")
+        print(f"기준값 저장: {args.baseline} ({args.machine}, 시나리오마다 {runs}번 실행한 중앙값)")
+        return 0
+
+    expected_by_name, recorded_on = _expected(baseline, args.machine)
+    if recorded_on is None:
+        print(f"{args.machine}의 기준값이 없어 시간 지표는 비교하지 않습니다 "
+              f"(--update-baseline으로 이 기계의 기준값을 기록하세요).")
+    for name, result in results.items():
+        if name not in expected_by_name:
+            continue
+        expected = expected_by_name[name]
+        flags = _regressions(result, expected)
+        if flags:
+            failed.append(name)
+        print(f"{name:<12} 기준 " + ", ".join(f"{m} {expected[m]}" for m in TOLERANCE if m in expected)
+              + (f"  REGRESSION: {', '.join(flags)}" if flags else ""))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
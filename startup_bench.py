@@ -0,0 +1,147 @@
+"""
+페이지별 시작 시간 벤치마크.
+
+- import: 각 페이지(main.py, pages/*.py)의 모듈 수준 import 문만 골라서, 새 파이썬 프로세스에서
+  `python -X importtime`으로 실행하고 패키지별 import 시간을 집계합니다.
+- 첫 화면: 새 프로세스에서 페이지 전체를 Streamlit AppTest로 한 번 실행하는 시간입니다.
+  import뿐 아니라 모듈 수준에서 하는 데이터 호출(주식 페이지의 `get_stock_data` 등)과 화면 요소 생성까지 들어갑니다.
+  완전 오프라인으로 돌도록 주가는 가짜 공급자(`PRICE_PROVIDER=fake`)를, 저장소는 빈 임시 디렉터리를 쓰고,
+  원본 이미지는 없는 것으로 칩니다 (썸네일 생성 시간은 들어가지 않음).
+Streamlit 자체를 불러오는 시간은 모든 페이지에 공통이므로 둘 다에서 빼고 계산합니다.
+페이지의 import 시간이나 첫 화면 시간이 예산(`BUDGET_SECONDS`, `RENDER_BUDGET_SECONDS`)을 넘으면 종료 코드 1로 끝납니다.
+
+    python startup_bench.py                 # 모든 페이지
+    python startup_bench.py --budget 0.3    # import 예산 변경
+    python startup_bench.py --no-render     # import만 측정
+    python startup_bench.py --top 10 "pages/00_LIGO data.py"
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+APP_DIR = Path(__file__).parent
+
+# 페이지 하나가 버튼을 누르기 전(모듈 수준)에 import하는 데 쓸 수 있는 시간 (Streamlit 제외)
+BUDGET_SECONDS = 0.25
+# 페이지 하나의 첫 화면(빈 캐시에서 AppTest 첫 실행)에 쓸 수 있는 시간 (Streamlit 제외)
+RENDER_BUDGET_SECONDS = 2.0
+
+_MARKER = "--- page imports ---"
+
+
+def pages():
+    return [APP_DIR / "main.py", *sorted((APP_DIR / "pages").glob("*.py"))]
+
+
+def page_imports(path):
+    """페이지 파일의 모듈 수준 import 문(최상위 if/try 블록 안 포함)의 소스 코드 목록."""
+    source = path.read_text(encoding="utf-8")
+    statements = []
+
+    def visit(body):
+        for node in body:
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                statements.append(ast.get_source_segment(source, node))
+            elif isinstance(node, (ast.If, ast.Try)):
+                for block in (node.body, getattr(node, "orelse", []), getattr(node, "finalbody", [])):
+                    visit(block)
+
+    visit(ast.parse(source).body)
+    return statements
+
+
+def parse_importtime(stderr):
+    """`-X importtime` 출력에서 (모듈 이름, 자체 시간(초)) 목록을 꺼냅니다. 마커 이후만 셉니다."""
+    lines = stderr.splitlines()
+    if _MARKER in lines:
+        lines = lines[lines.index(_MARKER) + 1:]
+    modules = []
+    for line in lines:
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us) / 1e6))
+    return modules
+
+
+def measure(path):
+    """페이지 하나의 import 시간. 반환값: (합계(초), 최상위 패키지별 시간 dict)"""
+    code = "\n".join([
+        "import sys",
+        f"sys.path.insert(0, {str(APP_DIR)!r})",
+        "import streamlit",
+        f"sys.stderr.write({_MARKER + chr(10)!r})",
+        *page_imports(path),
+    ])
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=APP_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{path.name}: import 실패\n{result.stderr[-2000:]}")
+    by_package = defaultdict(float)
+    for name, seconds in parse_importtime(result.stderr):
+        by_package[name.split(".")[0]] += seconds
+    return sum(by_package.values()), dict(by_package)
+
+
+def measure_first_render(path):
+    """페이지 하나를 새 프로세스에서 빈 캐시로 처음 실행하는 시간(초). Streamlit과 AppTest를 불러오는 시간은 뺍니다."""
+    code = "\n".join([
+        "import json, sys, time",
+        f"sys.path.insert(0, {str(APP_DIR)!r})",
+        "from streamlit.testing.v1 import AppTest",
+        "t0 = time.perf_counter()",
+        f"at = AppTest.from_file({str(path)!r}, default_timeout=600).run()",
+        "elapsed = time.perf_counter() - t0",
+        "print(json.dumps({'seconds': elapsed, 'errors': [e.message for e in at.exception]}))",
+    ])
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   PRICE_PROVIDER="fake",
+                   PRICE_STORE_DIR=str(Path(tmp) / "prices"),
+                   STRAIN_CACHE_DIR=str(Path(tmp) / "strain"),
+                   SPECTROGRAM_DIR=str(Path(tmp) / "spectrograms"),
+                   THUMBNAIL_DIR=str(Path(tmp) / "thumbnails"),
+                   IMAGE_SOURCE_DIR=tmp)
+        result = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{path.name}: 실행 실패\n{result.stderr[-2000:]}")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    if report["errors"]:
+        raise RuntimeError(f"{path.name}: 페이지 예외 {report['errors']}")
+    return report["seconds"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pages", nargs="*", help="측정할 페이지 파일 (기본: 모든 페이지)")
+    parser.add_argument("--budget", type=float, default=BUDGET_SECONDS, help="페이지별 import 예산 (초)")
+    parser.add_argument("--render-budget", type=float, default=RENDER_BUDGET_SECONDS, help="페이지별 첫 화면 예산 (초)")
+    parser.add_argument("--no-render", action="store_true", help="첫 화면 시간은 재지 않습니다")
+    parser.add_argument("--top", type=int, default=5, help="페이지마다 보여줄 패키지 수")
+    args = parser.parse_args(argv)
+
+    targets = [Path(p) if Path(p).is_absolute() else APP_DIR / p for p in args.pages] or pages()
+    over = []
+    for path in targets:
+        total, by_package = measure(path)
+        render = None if args.no_render else measure_first_render(path)
+        ok = total <= args.budget and (render is None or render <= args.render_budget)
+        line = f"[{'OK  ' if ok else 'OVER'}] {path.relative_to(APP_DIR)}: import {total * 1000:7.1f} ms (budget {args.budget * 1000:.0f} ms)"
+        if render is not None:
+            line += f", first render {render * 1000:7.1f} ms (budget {args.render_budget * 1000:.0f} ms)"
+        print(line)
+        for name, seconds in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"         {name:<24} {seconds * 1000:7.1f} ms")
+        if not ok:
+            over.append(path)
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
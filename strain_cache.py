@@ -0,0 +1,288 @@
+"""
+GWOSC strain 데이터를 GPS 시간 기준 청크로 나눠 HDF5 파일에 저장하는 로컬 캐시.
+
+- 탐지기마다 HDF5 파일 하나를 두고, `chunk_seconds` 단위로 정렬된 청크를 압축 데이터셋으로 저장합니다.
+- 요청한 구간과 겹치는 청크만 읽고, 비어 있는 구간(gap)만 원본(GWOSC)에서 가져옵니다.
+  연속된 빈 구간은 `max_fetch_seconds` 길이씩 한 번에 받으므로, 긴 구간을 작은 조각으로 나눠 읽을 때는
+  `prefill`로 먼저 채워 두면 조각마다 원본에 요청하지 않습니다.
+- 전체 크기가 `max_bytes`를 넘으면 가장 오래 사용하지 않은 청크부터 지웁니다 (LRU).
+  정리는 새 청크를 쓴 직후에만 하므로, 캐시에서 읽기만 하는 요청은 청크 목록을 훑지 않습니다.
+  읽기는 파일을 읽기 전용으로 열고, 청크의 마지막 사용 시각은 메모리에 모아 두었다가 정리할 때 파일에 씁니다.
+- 원본은 `fetch(detector, start, end, sample_rate)` 메서드만 있으면 되므로,
+  오프라인에서는 `LocalHDF5Source`로 합성 HDF5 파일 디렉터리를 GWOSC 대신 쓸 수 있습니다.
+- 원본 요청은 파일 잠금 밖에서 보내고, 같은 구간을 동시에 요청한 세션들은 `SingleFlight`로
+  요청 하나를 함께 기다립니다. 서로 다른 구간의 요청은 서로를 기다리지 않습니다.
+"""
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from lazy_imports import lazy_import
+from metrics import span
+from upstream import SingleFlight, throttle
+
+h5py = lazy_import("h5py")
+gwpy_timeseries = lazy_import("gwpy.timeseries")
+
+DEFAULT_ROOT = Path(os.environ.get("STRAIN_CACHE_DIR", Path(__file__).parent / "data" / "strain"))
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+# 아직 파일에 쓰지 않은 청크의 마지막 사용 시각: (파일 경로, 청크 이름) -> 시각.
+# 파일 잠금(`_lock_for(root)`) 안에서만 고치고, `_evict`가 파일 속성(last_access)에 쓰면서 비웁니다.
+_access_times = {}
+
+
+def _lock_for(path):
+    # 같은 캐시 디렉터리의 HDF5 파일을 여러 세션(스레드)이 동시에 쓰지 않도록 잠급니다.
+    with _locks_guard:
+        return _locks.setdefault(str(path), threading.Lock())
+
+
+_flights = SingleFlight()
+
+
+class GWOSCSource:
+    """gwpy로 GWOSC에서 strain을 가져오는 원본."""
+
+    def fetch(self, detector, start, end, sample_rate):
+        throttle("gwosc")
+        data = gwpy_timeseries.TimeSeries.fetch_open_data(detector, start, end, sample_rate=sample_rate)
+        return np.asarray(data.value, dtype=np.float64)
+
+
+class LocalHDF5Source:
+    """
+    GWOSC 형식(strain/Strain, Xstart, Xspacing)의 HDF5 파일 디렉터리를 원본으로 사용합니다.
+    파일 이름은 `{detector}_{GPS 시작}_{길이}.hdf5` 입니다.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.calls = 0
+        self._calls_lock = threading.Lock()
+
+    def fetch(self, detector, start, end, sample_rate):
+        with self._calls_lock:
+            self.calls += 1
+        n = int(round((end - start) * sample_rate))
+        out = np.full(n, np.nan)
+        for path in self.directory.glob(f"{detector}_*.hdf5"):
+            _, file_start, file_duration = path.stem.split("_")
+            file_start, file_duration = float(file_start), float(file_duration)
+            lo, hi = max(start, file_start), min(end, file_start + file_duration)
+            if lo >= hi:
+                continue
+            with h5py.File(path, "r") as f:
+                dset = f["strain/Strain"]
+                if round(1 / dset.attrs["Xspacing"]) != sample_rate:
+                    continue
+                src = slice(int(round((lo - file_start) * sample_rate)), int(round((hi - file_start) * sample_rate)))
+                dst = int(round((lo - start) * sample_rate))
+                out[dst:dst + src.stop - src.start] = dset[src]
+        if np.isnan(out).any():
+            raise LookupError(f"{detector} {start}-{end} 구간의 데이터가 없습니다.")
+        return out
+
+
+def default_source():
+    """기본 원본. 환경 변수 `STRAIN_SOURCE_DIR`가 있으면 GWOSC 대신 그 디렉터리의 HDF5 파일을 씁니다."""
+    directory = os.environ.get("STRAIN_SOURCE_DIR")
+    return LocalHDF5Source(directory) if directory else GWOSCSource()
+
+
+def write_synthetic_files(directory, detector, start, duration, sample_rate=4096, file_duration=32, seed=0):
+    """테스트/벤치마크용으로 GWOSC 형식의 합성 strain 파일들을 만듭니다."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    for file_start in range(int(start), int(start + duration), file_duration):
+        path = directory / f"{detector}_{file_start}_{file_duration}.hdf5"
+        with h5py.File(path, "w") as f:
+            dset = f.create_dataset("strain/Strain", data=rng.normal(0, 1e-21, file_duration * sample_rate))
+            dset.attrs["Xstart"] = file_start
+            dset.attrs["Xspacing"] = 1 / sample_rate
+
+
+class StrainCache:
+    def __init__(self, root=DEFAULT_ROOT, source=None, chunk_seconds=64, sample_rate=4096,
+                 max_bytes=2 * 1024 ** 3, max_fetch_seconds=1024):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.source = source or default_source()
+        self.chunk_seconds = chunk_seconds
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        # 원본 요청 하나의 최대 길이 (4096 Hz에서 1024초 = 32 MiB). 긴 빈 구간을 한 번에 메모리에 올리지 않습니다.
+        self.max_fetch_seconds = max(chunk_seconds, max_fetch_seconds)
+
+    def _path(self, detector):
+        return self.root / f"{detector}_{self.sample_rate}.h5"
+
+    def _open(self, detector):
+        # 지운 청크의 공간을 다음 청크가 재사용할 수 있도록 free-space 정보를 파일에 유지합니다.
+        path = self._path(detector)
+        if path.exists():
+            return h5py.File(path, "a")
+        return h5py.File(path, "w", fs_strategy="fsm", fs_persist=True)
+
+    def _open_read(self, detector):
+        """파일을 읽기 전용으로 엽니다. 아직 파일이 없으면 None."""
+        path = self._path(detector)
+        return h5py.File(path, "r") if path.exists() else None
+
+    def _chunk_starts(self, start, end):
+        first = math.floor(start / self.chunk_seconds) * self.chunk_seconds
+        return list(range(int(first), int(math.ceil(end)), self.chunk_seconds))
+
+    def get(self, detector, start, end):
+        """[start, end) 구간의 strain을 numpy 배열로 돌려줍니다."""
+        start, end = float(start), float(end)
+        with span("strain.get") as s:
+            out, missing = self._read(detector, start, end)
+            s.cache(hit=not missing)
+            if missing:
+                self._fill_gaps(detector, missing)
+                out, missing = self._read(detector, start, end)
+            if missing:
+                # 받아 온 뒤 다시 읽기 전에 다른 세션의 정리(evict)로 청크가 지워졌습니다. 캐시가 좁아서 계속
+                # 밀려날 수 있으므로 다시 받아 저장하지 않고, 이번 요청은 원본에서 직접 읽습니다.
+                out = self.source.fetch(detector, start, end, self.sample_rate)
+            s.add(rows=len(out))
+        return out
+
+    def prefill(self, detector, start, end):
+        """
+        [start, end) 구간의 빠진 청크를 읽지 않고 미리 받아 둡니다. 받아 온 청크 수를 돌려줍니다.
+        구간 전체가 `max_bytes`보다 크면 앞쪽 청크가 다시 정리될 수 있고, 그 청크는 `get`이 다시 받습니다.
+        """
+        chunk_starts = self._chunk_starts(float(start), float(end))
+        with _lock_for(self.root):
+            f = self._open_read(detector)
+            if f is None:
+                missing = chunk_starts
+            else:
+                with f:
+                    missing = [c for c in chunk_starts if str(c) not in f]
+        self._fill_gaps(detector, missing)
+        return len(missing)
+
+    def _read(self, detector, start, end):
+        """캐시에 있는 청크만 읽습니다. 반환값: (배열, 빠진 청크 시작점 목록). 빠진 청크가 있으면 배열은 None."""
+        chunk_starts = self._chunk_starts(start, end)
+        path = self._path(detector)
+        with _lock_for(self.root):
+            f = self._open_read(detector)
+            if f is None:
+                return None, chunk_starts
+            with f:
+                missing = [c for c in chunk_starts if str(c) not in f]
+                if missing:
+                    return None, missing
+                now = time.time()
+                parts = []
+                for c in chunk_starts:
+                    dset = f[str(c)]
+                    _access_times[(str(path), str(c))] = now
+                    lo = max(0, int(round((start - c) * self.sample_rate)))
+                    hi = min(len(dset), int(round((end - c) * self.sample_rate)))
+                    parts.append(dset[lo:hi])
+        return (np.concatenate(parts) if parts else np.empty(0)), []
+
+    def _fill_gaps(self, detector, missing):
+        max_chunks = self.max_fetch_seconds // self.chunk_seconds
+        for gap_start, gap_end in _contiguous(missing, self.chunk_seconds, max_chunks):
+            self._fill(detector, gap_start, gap_end)
+
+    def _fill(self, detector, gap_start, gap_end):
+        """
+        원본(GWOSC fetch_open_data)에서 구간을 받아 저장합니다. 받는 동안에는 파일 잠금을 잡지 않고,
+        같은 구간의 동시 요청은 저장까지 끝난 요청 하나를 함께 기다립니다.
+        """
+        def fill():
+            with span("strain.fetch") as s:
+                data = self.source.fetch(detector, gap_start, gap_end, self.sample_rate)
+                s.add(rows=len(data), bytes=data.nbytes)
+            # 짧거나 긴 응답(데이터 구간 끝 등)을 그대로 잘라 저장하면 청크의 GPS 시간이 어긋난 채로 계속 쓰이게 됩니다.
+            expected = int(round((gap_end - gap_start) * self.sample_rate))
+            if len(data) != expected:
+                raise ValueError(f"{detector} {gap_start}-{gap_end}: 샘플 {expected}개를 기대했지만 {len(data)}개를 받았습니다.")
+            per_chunk = self.chunk_seconds * self.sample_rate
+            with _lock_for(self.root):
+                with self._open(detector) as f:
+                    now = time.time()
+                    written = set()
+                    for i, c in enumerate(range(gap_start, gap_end, self.chunk_seconds)):
+                        if str(c) in f:
+                            continue
+                        dset = f.create_dataset(
+                            str(c), data=data[i * per_chunk:(i + 1) * per_chunk],
+                            chunks=(min(per_chunk, 64 * 1024),), compression="gzip", compression_opts=4, shuffle=True,
+                        )
+                        dset.attrs["last_access"] = now
+                        written.add((self._path(detector), str(c)))
+                self._evict(keep=written)
+
+        _flights.do((str(self.root.resolve()), detector, self.sample_rate, gap_start, gap_end), fill)
+
+    def size_bytes(self):
+        total = 0
+        for path in self.root.glob(f"*_{self.sample_rate}.h5"):
+            with h5py.File(path, "r") as f:
+                total += sum(f[name].id.get_storage_size() for name in f)
+        return total
+
+    def _evict(self, keep=()):
+        """
+        전체 청크 크기가 `max_bytes`를 넘으면 마지막 사용 시각이 가장 오래된 청크부터 지웁니다.
+        `keep`((파일 경로, 청크 이름) 집합)은 방금 쓴 청크이므로 지우지 않습니다.
+        메모리에 모아 둔 마지막 사용 시각은 남는 청크의 파일 속성에 씁니다.
+        """
+        entries = []
+        paths = list(self.root.glob(f"*_{self.sample_rate}.h5"))
+        for path in paths:
+            with h5py.File(path, "r") as f:
+                for name in f:
+                    dset = f[name]
+                    last_access = _access_times.get((str(path), name), dset.attrs.get("last_access", 0))
+                    entries.append((last_access, path, name, dset.id.get_storage_size()))
+        total = sum(e[3] for e in entries)
+        doomed = {}
+        if total > self.max_bytes:
+            for _, path, name, size in sorted(entries, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                if (path, name) in keep:
+                    continue
+                doomed.setdefault(path, set()).add(name)
+                total -= size
+        touched = {}
+        for path in paths:
+            for (key, name), last_access in _access_times.items():
+                if key == str(path):
+                    touched.setdefault(path, {})[name] = last_access
+        for path in doomed.keys() | touched.keys():
+            with h5py.File(path, "a") as f:
+                for name in doomed.get(path, ()):
+                    del f[name]
+                for name, last_access in touched.get(path, {}).items():
+                    if name in f:
+                        f[name].attrs["last_access"] = last_access
+                    del _access_times[(str(path), name)]
+
+
+def _contiguous(chunk_starts, step, max_chunks=None):
+    """연속된 청크 시작점들을 (gap 시작, gap 끝) 구간으로 묶어 원본 요청 횟수를 줄입니다 (구간당 최대 `max_chunks`개)."""
+    gaps = []
+    for c in chunk_starts:
+        if gaps and gaps[-1][1] == c and (max_chunks is None or gaps[-1][1] - gaps[-1][0] < max_chunks * step):
+            gaps[-1][1] = c + step
+        else:
+            gaps.append([c, c + step])
+    return [tuple(g) for g in gaps]
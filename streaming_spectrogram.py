@@ -0,0 +1,187 @@
+"""
+몇 시간 길이의 strain에 대한 스트리밍 스펙트로그램.
+
+strain 전체를 메모리에 올리지 않고 청크 단위로 읽으면서 STFT 열(column)을 차례로 계산합니다.
+청크 경계에 걸친 FFT 구간을 위해 남은 샘플(overlap)은 다음 청크로 넘기고,
+결과 시간-주파수 행렬은 디스크의 메모리 맵 파일(.npy)에 바로 쓰고, 주파수 축은 옆의 `.freqs.npy`에 저장합니다.
+따라서 최대 메모리 사용량은 구간 길이와 관계없이 청크 크기에만 비례합니다.
+"""
+import math
+import os
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from lazy_imports import lazy_import
+from metrics import timed
+from spectral import frame_power
+
+scipy_signal = lazy_import("scipy.signal")
+
+DEFAULT_ROOT = Path(os.environ.get("SPECTROGRAM_DIR", Path(__file__).parent / "data" / "spectrograms"))
+
+
+def iter_strain_chunks(cache, detector, start, end, chunk_seconds=64):
+    """
+    StrainCache에서 [start, end) 구간을 `chunk_seconds`씩 읽어 차례로 돌려줍니다.
+    빠진 청크는 처음에 한꺼번에 받아 두므로, 이후의 `get`은 원본 요청 없이 디스크에서 읽기만 합니다.
+    """
+    cache.prefill(detector, start, end)
+    t = start
+    while t < end:
+        stop = min(t + chunk_seconds, end)
+        yield cache.get(detector, t, stop)
+        t = stop
+
+
+class StreamingSTFT:
+    """청크를 하나씩 받아 완성된 STFT 열만 돌려주고, 나머지 샘플은 다음 청크로 넘깁니다."""
+
+    def __init__(self, sample_rate, fftlength, overlap, window="hann", freq_range=None):
+        self.sample_rate = sample_rate
+        self.nperseg = int(round(fftlength * sample_rate))
+        self.step = self.nperseg - int(round(overlap * sample_rate))
+        self.window = scipy_signal.get_window(window, self.nperseg)
+        self.frequencies = np.fft.rfftfreq(self.nperseg, 1 / sample_rate)
+        lo, hi = freq_range or (0, sample_rate / 2)
+        self._bins = (self.frequencies >= lo) & (self.frequencies <= hi)
+        self.frequencies = self.frequencies[self._bins]
+        self._carry = np.empty(0)
+
+    def n_columns(self, n_samples):
+        if n_samples < self.nperseg:
+            return 0
+        return (n_samples - self.nperseg) // self.step + 1
+
+    def feed(self, chunk):
+        buf = np.concatenate([self._carry, np.asarray(chunk, dtype=np.float64)])
+        n = self.n_columns(len(buf))
+        if n == 0:
+            self._carry = buf
+            return np.empty((0, len(self.frequencies)))
+        frames = sliding_window_view(buf, self.nperseg)[::self.step][:n]
+        self._carry = buf[n * self.step:]
+        return frame_power(frames, self.window, self.sample_rate)[:, self._bins]
+
+
+def stream_psd(chunks, sample_rate, fftlength, overlap, window="hann"):
+    """
+    청크 생성기로부터 Welch PSD(FFT 구간 평균, `spectral.compute_spectra`의 psd와 같음)를 구합니다.
+    FFT 구간 행렬이나 스펙트로그램을 만들지 않고 청크마다 합만 더합니다. 반환값: (주파수 배열, PSD)
+    """
+    stft = StreamingSTFT(sample_rate, fftlength, overlap, window)
+    if stft.nperseg < 2 or stft.step < 1:
+        raise ValueError("fftlength/overlap 값이 맞지 않습니다.")
+    total, count = np.zeros(len(stft.frequencies)), 0
+    for chunk in chunks:
+        columns = stft.feed(chunk)
+        total += columns.sum(axis=0)
+        count += len(columns)
+    if count == 0:
+        raise ValueError("데이터 길이에 비해 fftlength/overlap 값이 맞지 않습니다.")
+    return stft.frequencies, total / count
+
+
+def spectrogram_path(root, detector, start, end, sample_rate, fftlength, overlap, freq_range=(20, 1024)):
+    """스펙트로그램 결과 파일 경로. 결과를 바꾸는 설정은 모두 이름에 넣습니다."""
+    lo, hi = freq_range
+    return Path(root) / f"{detector}_{start}_{end}_{sample_rate}Hz_{fftlength}_{overlap}_{lo}-{hi}.npy"
+
+
+def _freqs_path(out_path):
+    return Path(out_path).with_suffix(".freqs.npy")
+
+
+def load_spectrogram(out_path):
+    """디스크에 있는 결과를 (메모리 맵 행렬, 주파수 배열)로 돌려줍니다. 없으면 None."""
+    out_path = Path(out_path)
+    if not (out_path.exists() and _freqs_path(out_path).exists()):
+        return None
+    return np.load(out_path, mmap_mode="r"), np.load(_freqs_path(out_path))
+
+
+@timed("spectrogram.stream")
+def stream_spectrogram(chunks, n_samples, sample_rate, fftlength, overlap, out_path,
+                       window="hann", freq_range=(20, 1024)):
+    """
+    청크 생성기로부터 스펙트로그램(ASD)을 계산해 `out_path`(.npy 메모리 맵)에 씁니다.
+    반환값: (메모리 맵 행렬, 각 열의 시작 시각(초), 주파수 배열)
+    """
+    stft = StreamingSTFT(sample_rate, fftlength, overlap, window, freq_range)
+    n_cols = stft.n_columns(n_samples)
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # 끝까지 다 쓴 뒤에 이름을 바꾸므로, 중간에 실패해도 반쯤 쓴 파일을 재사용하지 않습니다.
+    tmp = out_path.with_suffix(f".{os.getpid()}.tmp.npy")
+    matrix = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(n_cols, len(stft.frequencies)))
+    row = 0
+    for chunk in chunks:
+        columns = stft.feed(chunk)
+        take = min(len(columns), n_cols - row)
+        matrix[row:row + take] = np.sqrt(columns[:take])
+        row += take
+    matrix.flush()
+    del matrix
+    # 주파수 축을 먼저 저장하므로, 행렬 파일이 있으면 주파수 파일도 항상 있습니다.
+    freqs_tmp = _freqs_path(out_path).with_suffix(f".{os.getpid()}.tmp.npy")
+    np.save(freqs_tmp, stft.frequencies)
+    os.replace(freqs_tmp, _freqs_path(out_path))
+    os.replace(tmp, out_path)
+
+    times = np.arange(n_cols) * stft.step / sample_rate
+    return np.load(out_path, mmap_mode="r"), times, stft.frequencies
+
+
+def downsample_columns(matrix, n_out, block_rows=4096):
+    """
+    메모리 맵 행렬의 시간 축을 최대 `n_out`개 열로 줄입니다 (구간 최댓값, 짧은 신호가 사라지지 않도록).
+    블록 단위로 읽으므로 행렬 전체를 메모리에 올리지 않습니다.
+    """
+    n = len(matrix)
+    factor = max(1, math.ceil(n / n_out))
+    out = np.empty((math.ceil(n / factor), matrix.shape[1]), dtype=np.float32)
+    block_rows = max(factor, block_rows // factor * factor)
+    for start in range(0, n, block_rows):
+        block = np.asarray(matrix[start:start + block_rows])
+        pad = (-len(block)) % factor
+        if pad:
+            block = np.concatenate([block, np.repeat(block[-1:], pad, axis=0)])
+        out[start // factor:start // factor + len(block) // factor] = block.reshape(-1, factor, block.shape[1]).max(axis=1)
+    return out, factor
+
+
+if __name__ == "__main__":
+    # 길이별 최대 메모리 사용량 측정 (합성 잡음 + 주기적인 sine-Gaussian 버스트, 4096 Hz)
+    import tempfile
+    import time
+    import tracemalloc
+
+    rate = 4096
+    chunk_seconds = 64
+
+    def synthetic_chunks(duration):
+        rng = np.random.default_rng(0)
+        for t0 in range(0, duration, chunk_seconds):
+            t = t0 + np.arange(chunk_seconds * rate) / rate
+            y = rng.normal(0, 1e-21, len(t))
+            # 10분마다 150 Hz 버스트
+            y += 2e-20 * np.exp(-((t % 600 - 300) / 0.1) ** 2) * np.sin(2 * np.pi * 150 * t)
+            yield y
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for hours in (0.5, 1, 3):
+            duration = int(hours * 3600)
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            matrix, times, freqs = stream_spectrogram(
+                synthetic_chunks(duration), duration * rate, rate, 1, 0.5, Path(tmp) / f"{hours}h.npy")
+            image, factor = downsample_columns(matrix, 2000)
+            elapsed = time.perf_counter() - t0
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{hours:4}h: {matrix.shape[0]:6d} x {matrix.shape[1]} columns on disk "
+                  f"({matrix.nbytes / 2**20:7.1f} MiB), image {image.shape}, "
+                  f"{elapsed:6.1f} s, peak RAM {peak / 2**20:6.1f} MiB")
+            del matrix
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 앱 모듈은 저장소 루트에 평평하게 놓여 있습니다.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
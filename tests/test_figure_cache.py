@@ -0,0 +1,42 @@
+import json
+
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.tools import return_figure_from_figure_or_data
+
+from figure_cache import FigureCache
+
+
+def _build():
+    y = np.random.default_rng(0).normal(size=(50, 3))
+    fig = go.Figure([go.Scatter(y=y[:, i], name=f"T{i}") for i in range(3)])
+    fig.update_layout(title="bench", yaxis_tickformat=".0%")
+    return fig
+
+
+def test_cached_plotly_figure_sends_the_same_spec_without_rebuilding():
+    cache = FigureCache()
+    calls = []
+    build = lambda: calls.append(1) or _build()
+    cache.plotly("k", build)
+    cached = cache.plotly("k", build)
+    assert len(calls) == 1
+    assert isinstance(cached, go.Figure)
+
+    # st.plotly_chart와 같은 변환 경로: Figure 인스턴스는 to_dict()만 쓰고 다시 검증하지 않습니다.
+    spec = pio.to_json(return_figure_from_figure_or_data(cached, validate_figure=True), validate=False)
+    expected = pio.to_json(return_figure_from_figure_or_data(_build(), validate_figure=True), validate=False)
+    assert json.loads(spec) == json.loads(expected)
+
+
+def test_lru_is_bounded_by_bytes():
+    cache = FigureCache(max_bytes=25)
+    cache.put("a", b"x" * 10)
+    cache.put("b", b"x" * 10)
+    cache.get("a")
+    cache.put("c", b"x" * 10)
+    assert cache.get("b") is None and cache.get("a") is not None
+    assert cache.size_bytes <= 25
+    cache.put("huge", b"x" * 100)
+    assert cache.get("huge") is None
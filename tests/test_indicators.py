@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+import indicators
+from indicators import IndicatorEngine, compute_indicators
+
+
+def _wide(n_tickers=6, n_days=400, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range("2022-01-03", periods=n_days, name="Date")
+    values = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_days, n_tickers)), axis=0))
+    values[:30, 0] = np.nan      # 늦게 상장한 종목
+    values[200, 1::3] = np.nan   # 중간에 값이 빠진 날
+    return pd.DataFrame(values, index=index, columns=[f"T{i:03d}" for i in range(n_tickers)])
+
+
+class CountingEngine(IndicatorEngine):
+    """전체 재계산(fit)한 행렬 길이를 기록하는 엔진."""
+
+    def __init__(self, **params):
+        super().__init__(**params)
+        self.fits = []
+
+    def _fit(self, wide):
+        self.fits.append(len(wide))
+        super()._fit(wide)
+
+
+def _assert_matches_batch(result, view):
+    # 엔진이 이전에 무엇을 봤든, 결과는 `view`만으로 처음부터 계산한 값과 같아야 합니다.
+    expected = compute_indicators(view)
+    for name, frame in expected.frames.items():
+        pd.testing.assert_frame_equal(result.frames[name], frame, rtol=1e-9, check_freq=False)
+    pd.testing.assert_frame_equal(result.correlation, expected.correlation, atol=1e-12)
+
+
+def test_forward_moving_window_is_updated_incrementally():
+    wide = _wide()
+    engine = CountingEngine()
+    engine.sync(wide.iloc[:300])
+    for shift in (1, 2, 10):
+        view = wide.iloc[shift:300 + shift]
+        _assert_matches_batch(engine.sync(view), view)
+    assert engine.fits == [300]
+
+
+def test_revised_last_bar_is_replaced_without_refit():
+    wide = _wide()
+    partial = wide.iloc[:300].copy()
+    partial.iloc[-1] *= 1.01     # 장중에 받은 일부 봉
+    engine = CountingEngine()
+    engine.sync(partial)
+    stale = engine.sync(partial)
+    stale_last = stale.frames["sma_20"].iloc[-1].copy()
+
+    view = wide.iloc[1:302]     # 마지막 봉이 마감 값으로 바뀌고 새 봉 하나가 붙었습니다
+    _assert_matches_batch(engine.sync(view), view)
+    assert engine.fits == [300]
+    # 이전에 돌려준 결과는 되돌린 봉의 값을 그대로 유지합니다.
+    pd.testing.assert_series_equal(stale.frames["sma_20"].iloc[-1], stale_last)
+
+
+def test_updates_after_a_revision_can_be_revised_again():
+    wide = _wide()
+    engine = CountingEngine()
+    engine.sync(wide.iloc[:300])
+    for end in (301, 302):
+        partial = wide.iloc[:end].copy()
+        partial.iloc[-1] *= 0.98
+        engine.sync(partial)
+        _assert_matches_batch(engine.sync(wide.iloc[:end]), wide.iloc[:end])
+    assert engine.fits == [300]
+
+
+def test_earlier_start_or_long_gap_refits():
+    wide = _wide()
+    engine = CountingEngine()
+    engine.sync(wide.iloc[50:300])
+    view = wide.iloc[:300]      # 이력보다 앞에서 시작합니다
+    _assert_matches_batch(engine.sync(view), view)
+    view = wide.iloc[:300 + indicators.MAX_INCREMENTAL_ROWS + 1]
+    _assert_matches_batch(engine.sync(view), view)
+    assert engine.fits == [250, 300, len(view)]
+
+
+def test_drawdown_ignores_peaks_before_the_window():
+    # 구간 앞에서 최고점을 찍고 내려온 종목: 오래 돈 엔진도 새 엔진과 같은 낙폭을 보여야 합니다.
+    index = pd.bdate_range("2022-01-03", periods=600, name="Date")
+    prices = np.concatenate([np.linspace(100, 200, 300), np.linspace(190, 120, 300)])
+    wide = pd.DataFrame({"A": prices, "B": prices[::-1]}, index=index)
+    engine = CountingEngine()
+    engine.sync(wide.iloc[250:550])           # A의 최고점(299번째 봉)이 구간 안에 있습니다
+    for shift in range(1, 61):
+        result = engine.sync(wide.iloc[250 + shift:550 + shift])
+    fresh = IndicatorEngine().sync(wide.iloc[310:610])
+    assert result.frames["drawdown"]["A"].iloc[0] == 0.0
+    pd.testing.assert_frame_equal(result.frames["drawdown"], fresh.frames["drawdown"], check_freq=False)
+    assert engine.fits == [300]
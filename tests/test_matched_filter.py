@@ -0,0 +1,25 @@
+import numpy as np
+
+from matched_filter import search, search_stream, template_bank
+
+RATE = 1024
+
+
+def test_streamed_search_matches_in_memory_search():
+    rng = np.random.default_rng(0)
+    data = rng.normal(0, 1.0, 96 * RATE)
+    bank = template_bank(RATE, chirp_masses=[10.0, 20.0])
+    wave = bank[1].waveform / np.sqrt(np.sum(bank[1].waveform ** 2)) * 15
+    end = int(50.0 * RATE)
+    data[end - len(wave):end] += wave
+
+    def chunks():
+        # 청크 경계가 블록 경계와 맞지 않도록 홀수 길이로 나눕니다.
+        size = 7 * RATE + 13
+        return (data[i:i + size] for i in range(0, len(data), size))
+
+    expected = search(data, RATE, t0=100.0, templates=bank, block_seconds=16)
+    streamed = search_stream(chunks, RATE, t0=100.0, templates=bank, block_seconds=16)
+    assert [(t.time, t.chirp_mass) for t in streamed] == [(t.time, t.chirp_mass) for t in expected]
+    np.testing.assert_allclose([t.snr for t in streamed], [t.snr for t in expected], rtol=1e-9)
+    assert abs(expected[0].time - 150.0) < 0.01 and expected[0].chirp_mass == 20.0
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    metrics.reset()
+    yield
+    metrics.disable()
+    metrics.close_jsonl()
+    metrics.reset()
+
+
+def test_session_history_is_capped_to_recent_sessions(enabled, monkeypatch):
+    monkeypatch.setattr(metrics, "MAX_SESSIONS", 3)
+    metrics.enable()
+    for session in ("a", "b", "c", "a", "d"):
+        monkeypatch.setattr(metrics, "_session_id", lambda session=session: session)
+        with metrics.span("stage"):
+            pass
+    # 가장 오래 기록하지 않은 세션(b)부터 버립니다.
+    assert list(metrics._sessions) == ["c", "a", "d"]
+    assert len(metrics.session_events("a")) == 2
+    assert metrics.snapshot()["stage"]["count"] == 5
+
+
+def test_jsonl_is_written_and_closed(enabled, tmp_path):
+    path = tmp_path / "spans.jsonl"
+    metrics.enable(jsonl_path=str(path))
+    handle = metrics._jsonl
+    with metrics.span("stage") as s:
+        s.add(rows=3).cache(hit=True)
+    metrics.close_jsonl()
+    assert handle.closed and metrics._jsonl is None
+    with metrics.span("stage"):   # 닫은 뒤에도 기록은 계속됩니다
+        pass
+    event = json.loads(path.read_text().splitlines()[0])
+    assert event["stage"] == "stage" and event["rows"] == 3 and event["cache"] == "hit"
@@ -0,0 +1,36 @@
+import numpy as np
+
+from museum_catalog import MuseumCatalog
+
+
+def _catalog(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    museums = {
+        f"M{i}": {
+            "lat": float(rng.uniform(36, 60)), "lon": float(rng.uniform(-10, 30)),
+            "fields": [f"#t{j}" for j in rng.choice(10, 3, replace=False)],
+            "curriculum": [f"{rng.choice(['물리학I', '화학I', '지구과학I'])}-단원{rng.integers(3)}"],
+        }
+        for i in range(n)
+    }
+    return museums, MuseumCatalog(museums)
+
+
+def test_query_matches_brute_force():
+    museums, catalog = _catalog()
+    records = list(museums.values())
+    result = catalog.query(["#t1", "#t2"], ["화학I"], (48.86, 2.35), 800)
+    expected = [
+        i for i, r in enumerate(records)
+        if {"#t1", "#t2"} <= set(r["fields"])
+        and any(entry.startswith("화학I-") for entry in r["curriculum"])
+        and catalog.distances(48.86, 2.35, [i])[0] <= 800
+    ]
+    np.testing.assert_array_equal(result, expected)
+    assert catalog.query().tolist() == list(range(len(records)))
+
+
+def test_option_lists_are_built_once():
+    _, catalog = _catalog()
+    assert catalog.subjects == ["물리학I", "지구과학I", "화학I"]
+    assert catalog.tags == sorted(f"#t{j}" for j in range(10))
@@ -0,0 +1,64 @@
+import logging
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import prefetch
+from prefetch import PrefetchScheduler
+from price_store import MARKET_TZ, PriceStore
+from stock_fetch import FakePriceProvider
+
+
+def _scheduler(tmp_path, monkeypatch, provider):
+    monkeypatch.setattr(prefetch, "last_closed_session", lambda now=None: pd.Timestamp("2024-06-07"))
+    store = PriceStore(tmp_path, provider)
+    monkeypatch.setattr(prefetch, "PriceStore", lambda: store)
+    scheduler = PrefetchScheduler({"ASML": 1}, store=store)
+    scheduler.refresh_all()
+    monkeypatch.setattr(prefetch, "_scheduler", scheduler)
+    return scheduler
+
+
+def test_snapshot_serves_covered_ranges_without_requests(tmp_path, monkeypatch):
+    provider = FakePriceProvider(supports_batch=True)
+    _scheduler(tmp_path, monkeypatch, provider)
+    calls = provider.calls
+
+    frames, errors = prefetch.get_prices(["ASML"], "2024-01-02", "2024-06-08")
+    assert errors == {} and provider.calls == calls
+    assert frames["ASML"].index[0] == pd.Timestamp("2024-01-02")
+
+
+def test_snapshot_shorter_than_start_falls_back_to_store(tmp_path, monkeypatch):
+    # 스냅샷은 1년치만 있으므로 3년치를 요청하면 저장소에서 앞부분을 받아 와야 합니다.
+    provider = FakePriceProvider(supports_batch=True)
+    _scheduler(tmp_path, monkeypatch, provider)
+    calls = provider.calls
+
+    frames, errors = prefetch.get_prices(["ASML"], "2021-06-07", "2024-06-08")
+    assert errors == {} and provider.calls > calls
+    assert frames["ASML"].index[0] < pd.Timestamp("2021-06-10")
+
+
+def test_refresh_runs_after_close_plus_publish_delay():
+    # 2024-01-10(수) 15:00 → 같은 날 16:30, 금요일 17:00 → 다음 월요일 16:30
+    wed = datetime(2024, 1, 10, 15, 0, tzinfo=MARKET_TZ)
+    assert prefetch.next_market_close(wed) == datetime(2024, 1, 10, 16, 30, tzinfo=MARKET_TZ)
+    fri = datetime(2024, 1, 12, 17, 0, tzinfo=MARKET_TZ)
+    assert prefetch.next_market_close(fri) == datetime(2024, 1, 15, 16, 30, tzinfo=MARKET_TZ)
+
+
+def test_failed_refresh_is_logged_and_recorded(tmp_path, monkeypatch, caplog):
+    scheduler = PrefetchScheduler({"ASML": 1}, store=PriceStore(tmp_path, FakePriceProvider()),
+                                  interval=timedelta(hours=1))
+
+    def fail():
+        scheduler._stop.set()
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(scheduler, "refresh_all", fail)
+    with caplog.at_level(logging.ERROR, logger="prefetch"):
+        scheduler.start()
+        scheduler.stop(timeout=5)
+    assert isinstance(scheduler.last_error, RuntimeError)
+    assert any(r.exc_info and r.exc_info[1] is scheduler.last_error for r in caplog.records)
@@ -0,0 +1,50 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from price_matrix import cumulative_returns, log_returns, rebase, rolling_stats, to_wide
+
+
+def _wide(n_tickers, n_days=780, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range("2022-01-03", periods=n_days, name="Date")
+    values = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_days, n_tickers)), axis=0))
+    values[:30, 0] = np.nan   # 늦게 상장한 종목
+    return pd.DataFrame(values, index=index, columns=[f"T{i:03d}" for i in range(n_tickers)])
+
+
+def test_rebase_and_returns_match_pandas():
+    wide = _wide(5)
+    rebased = rebase(wide, base=100)
+    first = wide.apply(lambda s: s.dropna().iloc[0])
+    pd.testing.assert_frame_equal(rebased, wide / first * 100)
+    pd.testing.assert_frame_equal(cumulative_returns(wide), wide / first - 1)
+    pd.testing.assert_frame_equal(log_returns(wide), np.log(wide / wide.shift(1)))
+
+
+def test_rolling_stats_match_pandas():
+    wide = _wide(5)
+    mean, std = rolling_stats(wide, window=20)
+    pd.testing.assert_frame_equal(mean, wide.rolling(20).mean(), rtol=1e-9)
+    pd.testing.assert_frame_equal(std, wide.rolling(20).std(), rtol=1e-6)
+
+
+def test_to_wide_aligns_tickers():
+    wide = _wide(3)
+    frames = {t: pd.DataFrame({"Adj Close": wide[t].dropna()}) for t in wide.columns}
+    pd.testing.assert_frame_equal(to_wide(frames), wide, check_freq=False)
+
+
+def test_500_ticker_rerun_is_well_under_a_second():
+    # 500개 종목을 골라도 rerun마다 하는 행렬 계산(정규화, 수익률, 이동 통계)은 1초보다 훨씬 짧아야 합니다.
+    wide = _wide(500)
+    frames = {t: pd.DataFrame({"Adj Close": wide[t]}) for t in wide.columns}
+    to_wide(frames)
+    t0 = time.perf_counter()
+    matrix = to_wide(frames)
+    rebase(matrix)
+    cumulative_returns(matrix)
+    log_returns(matrix)
+    rolling_stats(matrix)
+    assert time.perf_counter() - t0 < 0.5
@@ -0,0 +1,154 @@
+from collections import OrderedDict
+
+import pandas as pd
+
+import price_store
+from price_store import PriceStore
+from stock_fetch import FakePriceProvider, fake_ohlcv
+
+
+class EmptyProvider(FakePriceProvider):
+    """휴장일처럼 항상 빈 응답을 돌려주는 공급자."""
+
+    def __init__(self):
+        super().__init__(supports_batch=True)
+
+    def download(self, tickers, start, end):
+        super().download([], start, end)
+        return {}
+
+
+def _seed(store, ticker, start, end):
+    frame = fake_ohlcv(ticker, start, end)
+    frame.attrs = {"coverage_start": pd.Timestamp(start).isoformat()}
+    store.save(ticker, frame)
+    return frame
+
+
+def test_partial_last_bar_is_refetched(tmp_path, monkeypatch):
+    # 2024-01-10(수) 장중에 저장된 일부 봉은 다음 갱신 때 다시 받아서 덮어써야 합니다.
+    monkeypatch.setattr(price_store, "last_closed_session", lambda now=None: pd.Timestamp("2024-01-09"))
+    provider = FakePriceProvider(supports_batch=True)
+    store = PriceStore(tmp_path, provider)
+    frame = _seed(store, "ASML", "2024-01-01", "2024-01-11")
+    frame.loc[pd.Timestamp("2024-01-10"), "Close"] = 1.0
+    store.save("ASML", frame)
+
+    assert store.refresh(["ASML"], "2024-01-01", "2024-01-11") == {}
+    assert provider.calls == 1
+    refreshed = store.load("ASML")
+    assert refreshed.index[-1] == pd.Timestamp("2024-01-10")
+    assert refreshed.loc[pd.Timestamp("2024-01-10"), "Close"] != 1.0
+
+
+def test_closed_last_bar_is_not_refetched(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_store, "last_closed_session", lambda now=None: pd.Timestamp("2024-01-10"))
+    provider = FakePriceProvider(supports_batch=True)
+    store = PriceStore(tmp_path, provider)
+    _seed(store, "ASML", "2024-01-01", "2024-01-11")
+
+    store.refresh(["ASML"], "2024-01-01", "2024-01-11")
+    assert provider.calls == 0
+
+
+def test_weekend_sends_no_request(tmp_path, monkeypatch):
+    # 금요일(2024-01-12)까지 저장되어 있으면 [토, 월) 구간에는 요청할 거래일이 없습니다.
+    monkeypatch.setattr(price_store, "last_closed_session", lambda now=None: pd.Timestamp("2024-01-12"))
+    provider = FakePriceProvider(supports_batch=True)
+    store = PriceStore(tmp_path, provider)
+    _seed(store, "ASML", "2024-01-01", "2024-01-13")
+    mtime = store._path("ASML").stat().st_mtime_ns
+
+    store.refresh(["ASML"], "2024-01-01", "2024-01-15")
+    assert provider.calls == 0
+    assert store._path("ASML").stat().st_mtime_ns == mtime
+
+
+def test_empty_holiday_response_is_not_saved_or_repeated(tmp_path, monkeypatch):
+    # 2024-01-15(월)은 휴장일: 빈 응답을 받으면 파일을 다시 쓰지 않고, 같은 요청도 되풀이하지 않습니다.
+    monkeypatch.setattr(price_store, "last_closed_session", lambda now=None: pd.Timestamp("2024-01-15"))
+    provider = EmptyProvider()
+    store = PriceStore(tmp_path, provider)
+    _seed(store, "ASML", "2024-01-01", "2024-01-13")
+    mtime = store._path("ASML").stat().st_mtime_ns
+
+    assert store.refresh(["ASML"], "2024-01-01", "2024-01-16") == {}
+    calls = provider.calls
+    for _ in range(3):
+        assert store.refresh(["ASML"], "2024-01-01", "2024-01-16") == {}
+    assert provider.calls == calls
+    assert store._path("ASML").stat().st_mtime_ns == mtime
+
+
+def test_empty_tail_markers_are_bounded(monkeypatch):
+    monkeypatch.setattr(price_store, "EMPTY_TAIL_ENTRIES", 2)
+    monkeypatch.setattr(price_store, "_empty_tail", OrderedDict())
+    for ticker in ("A", "B", "C"):
+        price_store._empty_tail_set(("root", ticker), ticker)
+    price_store._empty_tail_get(("root", "B"))
+    price_store._empty_tail_set(("root", "D"), "D")
+    assert list(price_store._empty_tail) == [("root", "B"), ("root", "D")]
+
+
+def test_last_closed_session():
+    ny = price_store.MARKET_TZ
+    assert price_store.last_closed_session(pd.Timestamp("2024-01-10 10:00", tz=ny)) == pd.Timestamp("2024-01-09")
+    assert price_store.last_closed_session(pd.Timestamp("2024-01-10 16:05", tz=ny)) == pd.Timestamp("2024-01-10")
+    assert price_store.last_closed_session(pd.Timestamp("2024-01-13 12:00", tz=ny)) == pd.Timestamp("2024-01-12")
+    assert price_store.last_closed_session(pd.Timestamp("2024-01-15 09:00", tz=ny)) == pd.Timestamp("2024-01-12")
+
+
+class SplitProvider(FakePriceProvider):
+    """`split`을 켜면 2:1 분할을 반영해 과거 봉까지 모두 절반 가격으로 돌려주는 공급자."""
+
+    def __init__(self):
+        super().__init__(supports_batch=True)
+        self.split = False
+        self.requests = []
+
+    def download(self, tickers, start, end):
+        self.requests.append((pd.Timestamp(start), pd.Timestamp(end)))
+        frames = super().download(tickers, start, end)
+        if self.split:
+            for frame in frames.values():
+                frame[["Open", "High", "Low", "Close", "Adj Close"]] /= 2
+        return frames
+
+
+def test_adjustment_change_refetches_full_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_store, "last_closed_session", lambda now=None: pd.Timestamp("2024-01-12"))
+    provider = SplitProvider()
+    store = PriceStore(tmp_path, provider)
+    store.refresh(["ASML"], "2024-01-01", "2024-01-11")
+
+    # 저장 뒤 분할이 있었습니다: 겹쳐 받은 마지막 봉(2024-01-10)이 달라지므로 전체를 다시 받습니다.
+    provider.split = True
+    assert store.refresh(["ASML"], "2024-01-01", "2024-01-13") == {}
+    assert provider.requests[-2:] == [(pd.Timestamp("2024-01-10"), pd.Timestamp("2024-01-13")),
+                                      (pd.Timestamp("2024-01-01"), pd.Timestamp("2024-01-13"))]
+    expected = provider.download(["ASML"], "2024-01-01", "2024-01-13")["ASML"]
+    pd.testing.assert_series_equal(store.load("ASML")["Close"], expected["Close"], check_freq=False)
+
+
+def test_backfill_with_changed_adjustment_refetches_full_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_store, "last_closed_session", lambda now=None: pd.Timestamp("2024-01-12"))
+    provider = SplitProvider()
+    store = PriceStore(tmp_path, provider)
+    store.refresh(["ASML"], "2024-01-08", "2024-01-13")
+
+    provider.split = True
+    store.refresh(["ASML"], "2024-01-01", "2024-01-13")
+    frame = store.load("ASML")
+    expected = provider.download(["ASML"], "2024-01-01", "2024-01-13")["ASML"]
+    pd.testing.assert_series_equal(frame["Close"], expected["Close"], check_freq=False)
+
+
+def test_unchanged_overlap_only_appends_new_bars(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_store, "last_closed_session", lambda now=None: pd.Timestamp("2024-01-12"))
+    provider = SplitProvider()
+    store = PriceStore(tmp_path, provider)
+    store.refresh(["ASML"], "2024-01-01", "2024-01-11")
+    store.refresh(["ASML"], "2024-01-01", "2024-01-13")
+    assert provider.requests == [(pd.Timestamp("2024-01-01"), pd.Timestamp("2024-01-11")),
+                                 (pd.Timestamp("2024-01-10"), pd.Timestamp("2024-01-13"))]
+    assert store.load("ASML").index[-1] == pd.Timestamp("2024-01-12")
@@ -0,0 +1,33 @@
+import numpy as np
+
+from spectral import SpectralService, compute_spectra
+
+RATE = 256
+
+
+def _requests(n, seconds=16):
+    rng = np.random.default_rng(0)
+    return [("H1", (i * seconds, (i + 1) * seconds), rng.normal(size=seconds * RATE)) for i in range(n)]
+
+
+def test_cache_is_bounded_by_bytes():
+    requests = _requests(4)
+    one = SpectralService().compute_many(requests[:1], RATE, 1, 0.5)[0].nbytes
+    service = SpectralService(max_bytes=int(one * 2.5), max_workers=1)
+    service.compute_many(requests, RATE, 1, 0.5)
+    assert service.size_bytes <= service.max_bytes
+    assert service.cached(service.key("H1", requests[0][1], 1, 0.5, "hann")) is None
+    assert service.cached(service.key("H1", requests[3][1], 1, 0.5, "hann")) is not None
+
+
+def test_pool_results_match_serial_and_pool_is_closed():
+    requests = _requests(3)
+    service = SpectralService(max_workers=2)
+    try:
+        results = service.compute_many(requests, RATE, 1, 0.5)
+    finally:
+        service.close()
+    assert service._pool is None
+    for (_, _, data), result in zip(requests, results):
+        expected = compute_spectra(data, RATE, 1, 0.5)
+        np.testing.assert_allclose(result.psd, expected.psd)
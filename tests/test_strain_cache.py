@@ -0,0 +1,139 @@
+import h5py
+import numpy as np
+import pytest
+
+import strain_cache
+from strain_cache import LocalHDF5Source, StrainCache, write_synthetic_files
+from streaming_spectrogram import iter_strain_chunks
+
+GPS = 1126259456   # 64초 청크 경계
+RATE = 256
+
+
+class RecordingSource(LocalHDF5Source):
+    """요청한 구간을 기록하는 로컬 원본."""
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.requests = []
+
+    def fetch(self, detector, start, end, sample_rate):
+        self.requests.append((start, end))
+        return super().fetch(detector, start, end, sample_rate)
+
+
+class ShortSource(LocalHDF5Source):
+    """데이터 구간 끝처럼 요청보다 짧은 배열을 돌려주는 원본."""
+
+    def fetch(self, detector, start, end, sample_rate):
+        return super().fetch(detector, start, end, sample_rate)[:-10]
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    write_synthetic_files(tmp_path / "source", "H1", GPS - 256, 1024, sample_rate=RATE)
+    return tmp_path / "source"
+
+
+def test_reads_match_source_for_unaligned_ranges(tmp_path, source_dir):
+    source = LocalHDF5Source(source_dir)
+    cache = StrainCache(tmp_path / "cache", source, sample_rate=RATE)
+    for start, end in ((GPS + 3.5, GPS + 70.25), (GPS - 100, GPS + 5), (GPS + 10, GPS + 11)):
+        np.testing.assert_array_equal(cache.get("H1", start, end), source.fetch("H1", start, end, RATE))
+
+
+def test_only_missing_gaps_are_fetched(tmp_path, source_dir):
+    source = RecordingSource(source_dir)
+    cache = StrainCache(tmp_path / "cache", source, sample_rate=RATE)
+
+    cache.get("H1", GPS + 64, GPS + 128)
+    cache.get("H1", GPS + 192, GPS + 256)
+    cache.get("H1", GPS, GPS + 320)      # 앞, 가운데, 뒤의 빈 구간만 받아야 합니다
+    cache.get("H1", GPS + 10, GPS + 300)  # 전부 캐시에 있음
+
+    assert source.requests == [
+        (GPS + 64, GPS + 128),
+        (GPS + 192, GPS + 256),
+        (GPS, GPS + 64),
+        (GPS + 128, GPS + 192),
+        (GPS + 256, GPS + 320),
+    ]
+
+
+def test_lru_eviction_keeps_recent_chunks(tmp_path, source_dir):
+    source = RecordingSource(source_dir)
+    cache = StrainCache(tmp_path / "cache", source, sample_rate=RATE)
+    cache.get("H1", GPS, GPS + 64)
+    chunk_bytes = cache.size_bytes()
+    cache.max_bytes = int(chunk_bytes * 2.5)   # 청크 2개까지
+
+    cache.get("H1", GPS + 64, GPS + 128)
+    cache.get("H1", GPS, GPS + 64)              # 첫 청크를 최근에 사용한 것으로 만듭니다
+    cache.get("H1", GPS + 128, GPS + 192)       # 새 청크를 쓰면서 가장 오래된 GPS+64 청크를 지웁니다
+    assert cache.size_bytes() <= cache.max_bytes
+
+    source.requests.clear()
+    cache.get("H1", GPS, GPS + 64)
+    cache.get("H1", GPS + 128, GPS + 192)
+    assert source.requests == []
+    cache.get("H1", GPS + 64, GPS + 128)
+    assert source.requests == [(GPS + 64, GPS + 128)]
+
+
+def test_reads_do_not_write_and_access_times_are_saved_on_evict(tmp_path, source_dir, monkeypatch):
+    cache = StrainCache(tmp_path / "cache", RecordingSource(source_dir), sample_rate=RATE)
+    cache.get("H1", GPS, GPS + 64)
+    path = cache._path("H1")
+    with h5py.File(path, "r") as f:
+        written = f[str(GPS)].attrs["last_access"]
+    mtime = path.stat().st_mtime_ns
+
+    monkeypatch.setattr(strain_cache.time, "time", lambda: written + 60)
+    cache.get("H1", GPS, GPS + 64)
+    assert path.stat().st_mtime_ns == mtime
+
+    cache.get("H1", GPS + 64, GPS + 128)        # 새 청크를 쓰면 정리하면서 사용 시각도 파일에 씁니다
+    with h5py.File(path, "r") as f:
+        assert f[str(GPS)].attrs["last_access"] == written + 60
+
+
+def test_chunks_written_by_a_request_larger_than_the_cap_are_kept(tmp_path, source_dir):
+    source = RecordingSource(source_dir)
+    cache = StrainCache(tmp_path / "cache", source, sample_rate=RATE, max_bytes=1)
+    data = cache.get("H1", GPS, GPS + 192)
+    assert len(data) == 192 * RATE
+    assert len(source.requests) == 1
+
+
+def test_short_fetch_is_rejected_and_not_stored(tmp_path, source_dir):
+    cache = StrainCache(tmp_path / "cache", ShortSource(source_dir), sample_rate=RATE)
+    with pytest.raises(ValueError):
+        cache.get("H1", GPS, GPS + 64)
+    assert cache.size_bytes() == 0
+
+
+def test_chunked_reads_after_prefill_make_no_more_requests(tmp_path, source_dir):
+    source = RecordingSource(source_dir)
+    cache = StrainCache(tmp_path / "cache", source, sample_rate=RATE, max_fetch_seconds=256)
+    chunks = list(iter_strain_chunks(cache, "H1", GPS, GPS + 640, chunk_seconds=64))
+    # 빈 구간 640초를 256초씩 나눠 세 번만 받고, 64초 조각 10개는 디스크에서 읽습니다.
+    assert source.requests == [(GPS, GPS + 256), (GPS + 256, GPS + 512), (GPS + 512, GPS + 640)]
+    np.testing.assert_array_equal(np.concatenate(chunks), source.fetch("H1", GPS, GPS + 640, RATE))
+
+
+class EvictingCache(StrainCache):
+    """받아 온 청크를 다시 읽기 전에 다른 세션이 모두 정리해 버리는 상황."""
+
+    def _fill_gaps(self, detector, missing):
+        super()._fill_gaps(detector, missing)
+        self.max_bytes = 0
+        self._evict()
+
+
+def test_chunks_evicted_before_the_read_are_served_from_source(tmp_path, source_dir):
+    source = RecordingSource(source_dir)
+    cache = EvictingCache(tmp_path / "cache", source, sample_rate=RATE)
+    data = cache.get("H1", GPS + 3.5, GPS + 70.25)
+    np.testing.assert_array_equal(data, source.fetch("H1", GPS + 3.5, GPS + 70.25, RATE))
+    # 채우기 한 번, 직접 읽기 한 번 (그리고 위의 비교용 요청)
+    assert source.requests == [(GPS, GPS + 128), (GPS + 3.5, GPS + 70.25), (GPS + 3.5, GPS + 70.25)]
@@ -0,0 +1,40 @@
+import numpy as np
+
+from spectral import compute_spectra
+from streaming_spectrogram import load_spectrogram, spectrogram_path, stream_psd, stream_spectrogram
+
+RATE = 512
+
+
+def _chunks(data, size):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def test_streaming_matches_batch_and_persists_frequencies(tmp_path):
+    data = np.random.default_rng(0).normal(size=40 * RATE)
+    out_path = spectrogram_path(tmp_path, "H1", 0, 40, RATE, 1, 0.5, freq_range=(20, 200))
+    # 청크 경계가 FFT 구간과 맞지 않도록 홀수 길이로 나눕니다.
+    matrix, times, freqs = stream_spectrogram(_chunks(data, 3 * RATE + 17), len(data), RATE, 1, 0.5, out_path,
+                                              freq_range=(20, 200))
+    batch = compute_spectra(data, RATE, 1, 0.5)
+    bins = (batch.frequencies >= 20) & (batch.frequencies <= 200)
+    np.testing.assert_allclose(matrix, np.sqrt(batch.spectrogram[:, bins]), rtol=1e-5)
+    np.testing.assert_array_equal(times, batch.times)
+
+    stored_matrix, stored_freqs = load_spectrogram(out_path)
+    np.testing.assert_array_equal(stored_freqs, batch.frequencies[bins])
+    np.testing.assert_array_equal(stored_matrix, matrix)
+
+
+def test_path_depends_on_sample_rate():
+    assert spectrogram_path("d", "H1", 0, 60, 4096, 1, 0.5) != spectrogram_path("d", "H1", 0, 60, 16384, 1, 0.5)
+    assert load_spectrogram(spectrogram_path("missing", "H1", 0, 60, 4096, 1, 0.5)) is None
+
+
+def test_stream_psd_matches_batch_welch():
+    data = np.random.default_rng(1).normal(size=30 * RATE)
+    freqs, psd = stream_psd(_chunks(data, 2 * RATE + 5), RATE, 2, 1)
+    batch = compute_spectra(data, RATE, 2, 1)
+    np.testing.assert_allclose(freqs, batch.frequencies)
+    np.testing.assert_allclose(psd, batch.psd, rtol=1e-10)
@@ -0,0 +1,85 @@
+import os
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from thumbnail_cache import LocalImageSource, ThumbnailCache
+
+URL = "https://upload.wikimedia.org/thumb/{}/1280px-Museum_{}.jpg"
+
+
+@pytest.fixture
+def source(tmp_path):
+    rng = np.random.default_rng(0)
+    directory = tmp_path / "remote"
+    directory.mkdir()
+    for i in range(4):
+        pixels = rng.integers(0, 256, (300, 400, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(directory / f"1280px-Museum_{i}.jpg", quality=90)
+    return LocalImageSource(directory)
+
+
+def _age(cache, url, seconds):
+    # 마지막 사용 시각(수정 시각)을 과거로 돌립니다.
+    for size in cache.sizes:
+        path = cache._lookup(url, cache.sizes[size])
+        os.utime(path, (time.time() - seconds, time.time() - seconds))
+
+
+def test_original_is_fetched_once_for_all_sizes(tmp_path, source):
+    cache = ThumbnailCache(tmp_path / "cache", source)
+    url = URL.format(0, 0)
+    popup, column = cache.get(url, "popup"), cache.get(url, "column")
+    assert source.calls == 1
+    assert Image.open(cache.path(url, "popup")).width == 200
+    assert Image.open(cache.path(url, "column")).width == 400   # 원본보다 크게 늘리지 않습니다
+    assert popup != column
+
+
+def test_failure_is_logged_and_not_retried_until_ttl(tmp_path, source, caplog):
+    cache = ThumbnailCache(tmp_path / "cache", source, retry_after=60)
+    url = URL.format(9, 9)   # 원본에 없는 이미지
+    assert cache.path(url) is None
+    assert "썸네일을 만들지 못했습니다" in caplog.text
+    assert cache.path(url) is None and cache.static_url(url) == url
+    assert source.calls == 1
+
+    marker = cache._failed_path(url)
+    os.utime(marker, (time.time() - 120, time.time() - 120))
+    assert cache.path(url) is None
+    assert source.calls == 2
+
+
+def test_pinned_thumbnails_survive_eviction(tmp_path, source):
+    cache = ThumbnailCache(tmp_path / "cache", source)
+    urls = [URL.format(i, i) for i in range(4)]
+    assert cache.prefetch(urls[:2], pin="map-a") == []
+    cache.prefetch(urls[2:3])
+    for url in urls[:3]:
+        _age(cache, url, 3600)
+    cache.max_bytes = 1   # 새 썸네일을 쓰면 고정되지 않은 오래된 묶음은 모두 지워집니다
+
+    cache.prefetch(urls[3:])
+    assert all(cache._lookup(url, 200) is not None for url in urls[:2])
+    assert cache._lookup(urls[2], 200) is None
+    assert cache._lookup(urls[3], 200) is not None
+
+
+def test_pins_are_released_for_maps_beyond_the_owner_limit(tmp_path, source):
+    cache = ThumbnailCache(tmp_path / "cache", source, max_pinned_owners=2)
+    urls = [URL.format(i, i) for i in range(4)]
+    cache.prefetch(urls[:1], pin="map-a")
+    cache.prefetch(urls[1:2], pin="map-b")
+    cache.pin("map-a", urls[:1])            # map-a를 다시 썼으므로 가장 오래 쓰지 않은 지도는 map-b
+    cache.prefetch(urls[2:3], pin="map-c")  # 지도 3개째: map-b의 고정이 풀립니다
+    assert len(cache.pinned()) == 2
+    for url in urls[:3]:
+        _age(cache, url, 3600)
+    cache.max_bytes = 1
+
+    cache.prefetch(urls[3:])
+    assert cache._lookup(urls[0], 200) is not None
+    assert cache._lookup(urls[1], 200) is None
+    assert cache._lookup(urls[2], 200) is not None
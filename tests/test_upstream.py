@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+from upstream import SingleFlight
+
+
+def test_waiters_get_their_own_exception_chained_to_the_leader_error():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    original = ValueError("short fetch")
+    errors = []
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise original
+
+    def wait():
+        try:
+            flights.do("key", fail)
+        except Exception as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=wait)
+    leader.start()
+    started.wait(5)
+    waiters = [threading.Thread(target=wait) for _ in range(2)]
+    for t in waiters:
+        t.start()
+    while flights.shared < 2:
+        threading.Event().wait(0.01)
+    release.set()
+    for t in [leader, *waiters]:
+        t.join(5)
+
+    assert errors.count(original) == 1   # 실행한 호출은 원래 예외를 그대로 받습니다
+    wrapped = [e for e in errors if e is not original]
+    assert len(wrapped) == 2 and wrapped[0] is not wrapped[1]
+    assert all(isinstance(e, RuntimeError) and e.__cause__ is original for e in wrapped)
+
+
+def test_results_are_shared_and_later_calls_run_again():
+    flights = SingleFlight()
+    assert flights.do("key", lambda: 1) == 1
+    assert flights.do("key", lambda: 2) == 2
+    assert flights.executed == 2 and flights.in_flight() == 0
+    with pytest.raises(KeyError):
+        flights.do("key", lambda: {}["missing"])
@@ -0,0 +1,338 @@
+"""
+박물관 이미지 썸네일 캐시.
+
+- 원본 이미지(위키미디어의 1280px 이미지 등)는 URL마다 한 번만 가져오고,
+  팝업 크기와 상세 목록(컬럼) 크기의 JPEG 썸네일을 한꺼번에 만들어 디스크에 저장합니다.
+- 썸네일 파일 이름은 원본 이미지 내용의 해시(SHA-256)와 너비로 정합니다 (content-addressed).
+  URL이 달라도 같은 이미지는 한 벌만 저장하고, URL -> 해시 대응은 `index/`에 따로 둡니다.
+- 전체 크기가 `max_bytes`를 넘으면 가장 오래 사용하지 않은 이미지의 썸네일부터 지웁니다 (LRU).
+  캐시된 지도 HTML이 가리키는 썸네일은 그 HTML의 캐시 키를 주인(owner)으로 삼아 `pin(owner, urls)`로 고정합니다.
+  고정은 최근에 쓴 `max_pinned_owners`개 주인의 것만 유지하므로(LRU), 지도 캐시(`st.cache_data(max_entries=...)`)와
+  같은 개수로 맞춰 두면 캐시에서 빠진 지도의 썸네일은 다시 정리 대상이 됩니다.
+- 원본을 가져오거나 썸네일을 만들지 못한 URL은 경고를 남기고 `index/`에 실패 표시 파일을 둡니다.
+  `retry_after`초가 지나기 전에는 같은 URL을 다시 요청하지 않습니다 (rerun마다 타임아웃을 기다리지 않도록).
+- 기본 저장 위치는 Streamlit 정적 파일 경로(static/) 아래이므로, 썸네일을 `app/static/...` 주소로
+  바로 보여줄 수 있습니다. 바이트(st.image)나 data URI(인라인 HTML)로도 꺼낼 수 있습니다.
+- 원본은 `fetch(url)` 메서드만 있으면 되므로, 오프라인에서는 `LocalImageSource`로
+  로컬 이미지 디렉터리를 원격 서버 대신 쓸 수 있습니다.
+"""
+import base64
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from lazy_imports import lazy_import
+from metrics import span
+from upstream import session, throttle
+
+Image = lazy_import("PIL.Image")
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = Path(__file__).parent
+DEFAULT_ROOT = Path(os.environ.get("THUMBNAIL_DIR", APP_DIR / "static" / "thumbnails"))
+# 실패한 URL을 다시 시도하기까지 기다리는 시간(초)
+RETRY_AFTER = float(os.environ.get("THUMBNAIL_RETRY_SECONDS", 600))
+
+# 크기 이름 -> 최대 너비(px). popup은 지도 팝업의 <img width="200">, column은 상세 목록의 왼쪽 컬럼.
+SIZES = {"popup": 200, "column": 480}
+JPEG_QUALITY = 80
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(key):
+    # 같은 URL을 여러 세션(스레드)이 동시에 처음 요청해도 원본은 한 번만 가져옵니다.
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+class HTTPImageSource:
+    """
+    HTTP(S)로 원본 이미지를 가져오는 원본. 위키미디어는 User-Agent가 없으면 요청을 거절합니다.
+    공용 HTTP 세션(연결 풀)과 `images` 토큰 버킷을 씁니다.
+    """
+
+    def __init__(self, timeout=10, user_agent="secondproject-museum-guide/1.0"):
+        self.timeout = timeout
+        self.user_agent = user_agent
+
+    def fetch(self, url):
+        throttle("images")
+        response = session().get(url, headers={"User-Agent": self.user_agent}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+
+class LocalImageSource:
+    """URL 경로의 마지막 부분(파일 이름)과 같은 이름의 파일을 로컬 디렉터리에서 읽는 원본."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.calls = 0
+        self._calls_lock = threading.Lock()
+
+    def fetch(self, url):
+        with self._calls_lock:
+            self.calls += 1
+        path = self.directory / unquote(urlparse(url).path.rsplit("/", 1)[-1])
+        if not path.is_file():
+            raise LookupError(f"{url}에 해당하는 이미지가 없습니다.")
+        return path.read_bytes()
+
+
+def default_source():
+    """기본 원본. 환경 변수 `IMAGE_SOURCE_DIR`가 있으면 원격 서버 대신 그 디렉터리의 이미지를 씁니다."""
+    directory = os.environ.get("IMAGE_SOURCE_DIR")
+    return LocalImageSource(directory) if directory else HTTPImageSource()
+
+
+def make_thumbnails(data, sizes=SIZES, quality=JPEG_QUALITY):
+    """원본 이미지 바이트에서 크기별 JPEG 썸네일 바이트를 만듭니다. 원본보다 크게 늘리지는 않습니다."""
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft("RGB", (max(sizes.values()), max(sizes.values())))  # JPEG는 디코딩 단계에서 미리 줄입니다
+        image = image.convert("RGB")
+        out = {}
+        for width in sorted(set(sizes.values()), reverse=True):
+            thumb = image.copy()
+            thumb.thumbnail((width, width * 4), Image.LANCZOS)
+            buf = io.BytesIO()
+            thumb.save(buf, format="JPEG", quality=quality, optimize=True, progressive=True)
+            out[width] = buf.getvalue()
+    return out
+
+
+class ThumbnailCache:
+    def __init__(self, root=DEFAULT_ROOT, source=None, sizes=SIZES, max_bytes=256 * 1024 ** 2,
+                 retry_after=RETRY_AFTER, max_pinned_owners=32):
+        self.root = Path(root)
+        self.index_dir = self.root / "index"
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.source = source or default_source()
+        self.sizes = dict(sizes)
+        self.max_bytes = max_bytes
+        self.retry_after = retry_after
+        self.max_pinned_owners = max_pinned_owners
+        self._pins = OrderedDict()   # 주인 -> 고정한 이미지 해시 집합 (최근에 쓴 주인이 뒤)
+        self._pinned_lock = threading.Lock()
+
+    def _index_path(self, url):
+        return self.index_dir / hashlib.sha1(url.encode()).hexdigest()
+
+    def _failed_path(self, url):
+        return self._index_path(url).with_suffix(".failed")
+
+    def _failed_recently(self, url):
+        try:
+            return time.time() - self._failed_path(url).stat().st_mtime < self.retry_after
+        except FileNotFoundError:
+            return False
+
+    def _thumb_path(self, digest, width):
+        return self.root / f"{digest}_{width}.jpg"
+
+    def _lookup(self, url, width):
+        try:
+            digest = self._index_path(url).read_text().strip()
+        except FileNotFoundError:
+            return None
+        path = self._thumb_path(digest, width)
+        return path if path.exists() else None
+
+    def _pin(self, owner, digests=()):
+        with self._pinned_lock:
+            self._pins.setdefault(owner, set()).update(digests)
+            self._pins.move_to_end(owner)
+            while len(self._pins) > self.max_pinned_owners:
+                self._pins.popitem(last=False)
+
+    def pin(self, owner, urls):
+        """
+        `owner`가 쓰는 URL들의 썸네일을 정리(evict) 대상에서 뺍니다. 이미 고정한 주인이면 최근 사용으로만 표시합니다.
+        고정한 주인이 `max_pinned_owners`개를 넘으면 가장 오래 쓰지 않은 주인의 고정이 풀립니다.
+        """
+        with self._pinned_lock:
+            if owner in self._pins:
+                self._pins.move_to_end(owner)
+                return
+        digests = set()
+        for url in urls:
+            try:
+                digests.add(self._index_path(url).read_text().strip())
+            except FileNotFoundError:
+                continue
+        self._pin(owner, digests)
+
+    def pinned(self):
+        """고정된 이미지 해시 전체."""
+        with self._pinned_lock:
+            return set().union(*self._pins.values())
+
+    def path(self, url, size="popup", pin=None):
+        """
+        썸네일 파일 경로. 처음이면 원본을 가져와 모든 크기를 만듭니다. 실패하면 None.
+        pin에 주인(owner)을 주면 이 이미지의 썸네일을 그 주인의 것으로 고정합니다 (`pin()` 참고).
+        """
+        width = self.sizes[size]
+        path = self._lookup(url, width)
+        if path is None:
+            with _lock_for(url):
+                path = self._lookup(url, width)
+                if path is None and not self._failed_recently(url):
+                    path = self._fill(url, width, pin)
+        if path is not None:
+            if pin is not None:
+                self._pin(pin, [path.stem.rsplit("_", 1)[0]])
+            # 파일 수정 시각을 마지막 사용 시각으로 씁니다 (LRU).
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                return None
+        return path
+
+    def _fill(self, url, width, pin=None):
+        try:
+            with span("thumbnail.fetch") as s:
+                data = self.source.fetch(url)
+                thumbs = make_thumbnails(data, self.sizes)
+                s.add(bytes=len(data))
+        except Exception:
+            # 페이지는 원본 URL로 대신 보여주므로 예외를 올리지 않고, 기록만 남기고 잠시 다시 시도하지 않습니다.
+            logger.warning("썸네일을 만들지 못했습니다: %s (%.0f초 동안 다시 시도하지 않음)", url, self.retry_after,
+                           exc_info=True)
+            self._failed_path(url).touch()
+            return None
+        self._failed_path(url).unlink(missing_ok=True)
+        digest = hashlib.sha256(data).hexdigest()
+        if pin is not None:
+            # 이 URL을 쓰는 지도가 다른 이미지를 채우는 동안 이 썸네일이 지워지지 않도록 쓰기 전에 고정합니다.
+            self._pin(pin, [digest])
+        for w, payload in thumbs.items():
+            target = self._thumb_path(digest, w)
+            tmp = target.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(payload)
+            os.replace(tmp, target)
+        index = self._index_path(url)
+        tmp = index.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_text(digest)
+        os.replace(tmp, index)
+        self._evict(keep=digest)
+        return self._thumb_path(digest, width)
+
+    def get(self, url, size="popup"):
+        """썸네일 JPEG 바이트. 실패하면 None."""
+        path = self.path(url, size)
+        try:
+            return path.read_bytes() if path is not None else None
+        except FileNotFoundError:
+            return None
+
+    def data_uri(self, url, size="popup"):
+        """HTML에 바로 넣을 수 있는 data URI. 실패하면 원래 URL을 돌려줍니다."""
+        payload = self.get(url, size)
+        if payload is None:
+            return url
+        return "data:image/jpeg;base64," + base64.b64encode(payload).decode()
+
+    def static_url(self, url, size="popup"):
+        """
+        Streamlit 정적 파일 경로(`server.enableStaticServing`) 기준의 썸네일 주소.
+        캐시가 앱의 static/ 아래에 있지 않거나 실패하면 원래 URL을 돌려줍니다.
+        """
+        path = self.path(url, size)
+        if path is None:
+            return url
+        try:
+            relative = path.resolve().relative_to((APP_DIR / "static").resolve())
+        except ValueError:
+            return url
+        return f"app/static/{relative.as_posix()}"
+
+    def prefetch(self, urls, max_workers=8, pin=None):
+        """
+        여러 URL의 썸네일을 스레드 풀로 미리 만듭니다. 반환값: 실패한 URL 목록
+        캐시해 둔 HTML이 썸네일 주소를 가리킨다면 pin에 그 HTML의 캐시 키를 주어 썸네일이 지워지지 않게 합니다.
+        """
+        urls = list(dict.fromkeys(urls))
+        size = next(iter(self.sizes))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(lambda u: self.path(u, size, pin), urls))
+        return [u for u, path in zip(urls, results) if path is None]
+
+    def size_bytes(self):
+        return sum(p.stat().st_size for p in self.root.glob("*.jpg"))
+
+    def _evict(self, keep=None):
+        # 같은 원본에서 나온 썸네일(모든 크기)을 한 묶음으로, 가장 오래 사용하지 않은 묶음부터 지웁니다.
+        # 방금 만든 묶음(keep)과 고정된 묶음은 지우지 않으므로, 고정된 썸네일이 많으면 max_bytes를 넘을 수 있습니다.
+        pinned = self.pinned()
+        groups = {}
+        for p in self.root.glob("*.jpg"):
+            try:
+                stat = p.stat()
+            except FileNotFoundError:
+                continue
+            digest = p.stem.rsplit("_", 1)[0]
+            size, last = groups.get(digest, (0, 0.0))
+            groups[digest] = (size + stat.st_size, max(last, stat.st_mtime))
+        total = sum(size for size, _ in groups.values())
+        for digest, (size, _) in sorted(groups.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            if digest == keep or digest in pinned:
+                continue
+            for width in set(self.sizes.values()):
+                self._thumb_path(digest, width).unlink(missing_ok=True)
+            total -= size
+
+
+if __name__ == "__main__":
+    # 로컬 이미지 디렉터리를 원격 서버 대신 써서 원본 요청 횟수, 전송량, 지연 시간을 측정합니다.
+    import tempfile
+
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    n = 200
+    with tempfile.TemporaryDirectory() as tmp:
+        images = Path(tmp) / "remote"
+        images.mkdir()
+        urls = []
+        original_bytes = 0
+        for i in range(n):
+            # 위키미디어 1280px 이미지 크기의 합성 사진 (부드러운 그라디언트 + 잡음)
+            y, x = np.mgrid[0:853, 0:1280]
+            pixels = np.stack([(x + i) % 256, (y + 2 * i) % 256, (x + y) % 256], axis=-1)
+            pixels = np.clip(pixels + rng.normal(0, 12, pixels.shape), 0, 255).astype(np.uint8)
+            Image.fromarray(pixels).save(images / f"1280px-Museum_{i}.jpg", quality=90)
+            original_bytes += (images / f"1280px-Museum_{i}.jpg").stat().st_size
+            urls.append(f"https://upload.wikimedia.org/thumb/{i}/1280px-Museum_{i}.jpg")
+
+        source = LocalImageSource(images)
+        cache = ThumbnailCache(Path(tmp) / "cache", source, max_bytes=4 * 1024 ** 2)
+
+        t0 = time.perf_counter()
+        failed = cache.prefetch(urls)
+        cold = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        served = sum(len(cache.get(u, "popup")) + len(cache.get(u, "column")) for u in urls[-20:])
+        warm = (time.perf_counter() - t0) / 40
+        calls_before = source.calls
+        for u in urls[-20:]:
+            cache.get(u, "column")
+
+        print(f"{n} originals: {original_bytes / 2**20:6.1f} MiB, cold thumbnailing {cold:5.2f} s, "
+              f"{len(failed)} failed")
+        print(f"warm lookup {warm * 1e6:7.1f} us, popup+column for 20 museums {served / 1024:6.1f} KiB "
+              f"(originals {original_bytes / n * 20 / 1024:7.1f} KiB)")
+        print(f"source fetches {source.calls} (+{source.calls - calls_before} on re-read), "
+              f"cache size {cache.size_bytes() / 2**20:.1f} MiB / cap {cache.max_bytes / 2**20:.0f} MiB")
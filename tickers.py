@@ -0,0 +1,21 @@
+"""
+주식 페이지와 백그라운드 사전 갱신(prefetch)이 함께 쓰는 종목 목록.
+"""
+# 현재 시점에서 글로벌 시가총액 상위 기업 (변동될 수 있음)
+# 실제 시총 상위 기업 목록은 수시로 변동되므로, 이 목록은 예시입니다.
+# 더 정확한 최신 목록을 원하시면 별도의 API나 웹 스크래핑이 필요합니다.
+TICKERS = {
+    "AAPL": "Apple",
+    "MSFT": "Microsoft",
+    "NVDA": "NVIDIA",
+    "GOOGL": "Alphabet (Google) A",
+    "AMZN": "Amazon",
+    "META": "Meta Platforms",
+    "TSLA": "Tesla",
+    "BRK-A": "Berkshire Hathaway A", # A주 (매우 비쌈)
+    "LLY": "Eli Lilly",
+    "AVGO": "Broadcom"
+}
+
+# 티커 -> 페이지에서 보여주는 기간(년). 백그라운드 갱신은 이 기간만큼 저장소를 채워 둡니다.
+UNIVERSE = {**{ticker: 3 for ticker in TICKERS}, "ASML": 20}
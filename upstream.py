@@ -0,0 +1,229 @@
+"""
+업스트림(yfinance, GWOSC, 위키미디어 이미지) 요청을 모든 세션이 함께 쓰는 공용 요청 계층.
+
+- `SingleFlight`: 같은 키의 요청이 동시에 들어오면 첫 요청(leader)만 실제로 실행하고,
+  나머지는 그 결과(또는 예외)를 기다렸다가 그대로 받습니다. 빈 캐시에 세션 수십 개가 한꺼번에
+  들어와도 업스트림에는 같은 요청이 한 번만 나갑니다.
+- `TokenBucket`: 업스트림마다 초당 요청 수(rate)와 순간 허용량(capacity)을 제한합니다.
+  토큰이 없으면 다음 토큰이 생길 때까지 기다립니다.
+- `session()`: 프로세스 전체가 함께 쓰는 `requests.Session` (호스트별 연결 풀 재사용).
+
+업스트림별 제한은 `RATE_LIMITS`에 있고, `RATE_LIMIT_<이름>="초당 요청 수/허용량"` 환경 변수로 바꿀 수 있습니다.
+"""
+import os
+import threading
+import time
+
+from lazy_imports import lazy_import
+from metrics import span
+
+requests = lazy_import("requests")
+requests_adapters = lazy_import("requests.adapters")
+
+# 업스트림 이름 -> (초당 요청 수, 순간 허용량)
+RATE_LIMITS = {
+    "yfinance": (2.0, 5),
+    "gwosc": (2.0, 4),
+    "images": (10.0, 20),
+}
+POOL_SIZE = 16
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """같은 키로 동시에 실행 중인 함수 호출을 하나로 합칩니다."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0    # 실제로 실행한 횟수
+        self.shared = 0      # 다른 호출의 결과를 받아 간 횟수
+
+    def do(self, key, fn):
+        """
+        `fn()`을 실행하고 결과를 돌려줍니다. 같은 키의 호출이 이미 실행 중이면 그 결과를 기다립니다.
+        결과 객체는 기다린 호출들이 함께 받으므로, 받은 쪽에서 고치지 말고 복사해서 써야 합니다.
+        실행한 호출이 실패하면 기다린 호출은 각자 새 `RuntimeError`를 받습니다 (원래 예외는 `__cause__`).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                # 예외 객체 하나를 여러 스레드에서 다시 던지면 traceback이 서로 덧붙으므로 호출마다 감쌉니다.
+                raise RuntimeError(f"같은 요청({key!r})을 실행한 호출이 실패했습니다: {call.error}") from call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # 끝난 호출은 바로 지워서, 이후의 요청은 (캐시를 확인한 뒤) 새로 실행되게 합니다.
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class TokenBucket:
+    """초당 `rate`개씩 토큰이 차고 최대 `capacity`개까지 쌓이는 토큰 버킷. 스레드 안전합니다."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """토큰이 있으면 가져가고 True, 없으면 기다리지 않고 False."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        """토큰을 가져갑니다. 부족하면 채워질 때까지 기다립니다. 반환값: 기다린 시간(초)"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+_limiters = {}
+_session = None
+_guard = threading.Lock()
+
+
+def limiter(name):
+    """업스트림 이름별 공용 토큰 버킷 (프로세스당 하나)."""
+    with _guard:
+        bucket = _limiters.get(name)
+        if bucket is None:
+            rate, capacity = RATE_LIMITS.get(name, (5.0, 5))
+            override = os.environ.get(f"RATE_LIMIT_{name.upper()}")
+            if override:
+                rate, _, capacity = override.partition("/")
+                rate, capacity = float(rate), float(capacity or 1)
+            bucket = _limiters[name] = TokenBucket(rate, capacity)
+        return bucket
+
+
+def throttle(name, tokens=1):
+    """업스트림 `name`의 토큰을 기다렸다가 가져갑니다. 기다린 경우에만 `upstream.wait` 단계로 기록합니다."""
+    bucket = limiter(name)
+    if bucket.try_acquire(tokens):
+        return 0.0
+    with span("upstream.wait"):
+        return bucket.acquire(tokens)
+
+
+def session():
+    """프로세스 전체가 함께 쓰는 HTTP 세션. 같은 호스트로 가는 요청은 연결을 재사용합니다."""
+    global _session
+    with _guard:
+        if _session is None:
+            s = requests.Session()
+            adapter = requests_adapters.HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+        return _session
+
+
+if __name__ == "__main__":
+    # 빈 캐시에 세션 100개가 동시에 들어올 때의 업스트림 요청 수 (가짜 공급자/로컬 원본이 호출 횟수를 셉니다)
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from pathlib import Path
+
+    import numpy as np
+
+    from price_store import PriceStore
+    from stock_fetch import FakePriceProvider, download_many
+    from strain_cache import LocalHDF5Source, StrainCache, write_synthetic_files
+    from tickers import TICKERS
+
+    sessions = 100
+    end = np.datetime64("today")
+    start = end - np.timedelta64(3 * 365, "D")
+
+    def load_test(label, fn, counter):
+        barrier = threading.Barrier(sessions)
+
+        def session_run(i):
+            barrier.wait()   # 모든 세션이 같은 순간에 요청을 보내도록 맞춥니다
+            t0 = time.perf_counter()
+            fn(i)
+            return time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            latencies = np.array(list(pool.map(session_run, range(sessions)))) * 1000
+        print(f"{label:>34}: {counter():3d} upstream calls for {sessions} sessions, "
+              f"wall {time.perf_counter() - t0:5.2f} s, p50 {np.percentile(latencies, 50):6.0f} ms, "
+              f"p99 {np.percentile(latencies, 99):6.0f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        # 1) 합치지 않고 세션마다 직접 요청하면 (예전 동작)
+        provider = FakePriceProvider(latency=0.3, supports_batch=True)
+        load_test("prices, no coalescing",
+                  lambda i: download_many(list(TICKERS), start, end, provider=provider), lambda: provider.calls)
+
+        # 2) 가격 저장소(single-flight)를 거치면
+        provider = FakePriceProvider(latency=0.3, supports_batch=True)
+        load_test("prices, single-flight",
+                  lambda i: PriceStore(tmp / "prices", provider).get(list(TICKERS), start, end),
+                  lambda: provider.calls)
+
+        # 3) 세션마다 다른 종목(10종류)을 요청하면 키가 10개로 나뉘고, 토큰 버킷이 요청 속도를 제한합니다
+        provider = FakePriceProvider(latency=0.05, supports_batch=True, limiter=TokenBucket(rate=5, capacity=2))
+        tickers = list(TICKERS)
+        load_test("prices, 10 keys, 5 req/s limit",
+                  lambda i: PriceStore(tmp / "prices_mixed", provider).get([tickers[i % 10]], start, end),
+                  lambda: provider.calls)
+
+        # 4) LIGO 페이지: 같은 이벤트 구간의 strain
+        write_synthetic_files(tmp / "strain_source", "H1", 1126259446 - 128, 256)
+        source = LocalHDF5Source(tmp / "strain_source")
+        load_test("strain, single-flight",
+                  lambda i: StrainCache(tmp / "strain", source).get("H1", 1126259446 - 32, 1126259446 + 32),
+                  lambda: source.calls)